@@ -3,6 +3,14 @@ from copy import deepcopy
 from glob import iglob as GLOBiglob
 from inspect import stack as INSPECTstack
 import json
+from multiprocessing import Pool as MULTIPROCESSINGpool
+from os import makedirs as OSmakedirs
+from os import remove as OSremove
+from os.path import dirname as OSpath__dirname
+from os.path import isdir as OSpath__isdir
+from os.path import isfile as OSpath__isfile
+from os.path import join as OSpath__join
+from shutil import copyfile as SHUTILcopyfile
 # from os import remove as OSremove
 
 # ENSO_metrics package functions:
@@ -12,9 +20,10 @@ from .EnsoMetricsLib import BiasPrLatRmse, BiasPrLonRmse, BiasPrRmse, BiasSshLat
     BiasMldLatRmse, BiasMldLonRmse, BiasMldRmse,\
     BiasSstLatRmse, BiasSstLonRmse, BiasSstSkLonRmse, BiasSstRmse, BiasTauxLatRmse, BiasTauxLonRmse, BiasTauxRmse,\
     BiasTauyLatRmse, BiasTauyLonRmse, BiasTauyRmse,\
-    EnsoAmpl, EnsoDiversity, EnsodSstOce, EnsoDuration, EnsoFbSshSst, EnsoFbSstLhf, EnsoFbSstLwr, EnsoFbSstShf,\
-    EnsoFbSstSwr, EnsoFbSstTaux, EnsoFbSstThf, EnsoFbTauxSsh, EnsoPrMap, EnsoPrMapDjf, EnsoPrMapJja, EnsoPrDjfTel,\
-    EnsoPrJjaTel, EnsoPrTsRmse, EnsoSeasonality, EnsoSlpMap, EnsoSlpMapDjf, EnsoSlpMapJja, EnsoSstDiversity,\
+    EnsoAmpl, EnsoDiversity, EnsodSstOce, EnsoDuration, EnsoFbSshSst, EnsoFbSstHeatFluxes, EnsoFbSstLhf, EnsoFbSstLwr,\
+    EnsoFbSstShf, EnsoFbSstSwr, EnsoFbSstTaux, EnsoFbSstThf, EnsoFbTauxSsh, EnsoPrMap, EnsoPrMapDjf, EnsoPrMapJja,\
+    EnsoPrDjfTel, EnsoPrJjaTel, EnsoPrTsRmse, EnsoSeasonality, EnsoSlpMap, EnsoSlpMapDjf, EnsoSlpMapJja,\
+    EnsoSstDiversity,\
     EnsoMldLonRmse, EnsoSstLonRmse, EnsoTauxLonRmse, EnsoTauyLonRmse,\
     EnsoSstMap, EnsoSstMapDjf, EnsoSstMapJja, EnsoSstSkew,\
     EnsoMldTsRmse, EnsoSstTsRmse, EnsoTauxTsRmse, EnsoTauyTsRmse, NinaPrMap,\
@@ -22,8 +31,13 @@ from .EnsoMetricsLib import BiasPrLatRmse, BiasPrLonRmse, BiasPrRmse, BiasSshLat
     NinoSlpMap, NinoSstDiv, NinoSstDiversity, NinoSstDivRmse, NinoSstDur, NinoSstLonRmse, NinoSstMap, NinoSstTsRmse,\
     SeasonalPrLatRmse, SeasonalPrLonRmse, SeasonalSshLatRmse, SeasonalSshLonRmse, SeasonalSstLatRmse,\
     SeasonalSstLonRmse, SeasonalTauxLatRmse, SeasonalTauxLonRmse
-from .EnsoToolsLib import math_metric_computation
+from .EnsoToolsLib import file_fingerprint, json_stream_close, json_stream_open, json_stream_write, \
+    math_metric_computation
+from .EnsoUvcdatToolsLib import CopyNetcdfToBuffer, FlushNetcdfBuffer, MergeArraySidecars, NetcdfBufferAdded, \
+    NetcdfBufferState, ReadHeader, ReadMetadata, RenameArrayPointers, SaveArraySidecar, StartArraySidecar, \
+    StartNetcdfBuffer, StartReferenceFields, StopReferenceFields
 from .KeyArgLib import default_arg_values
+from .version import __version__
 
 
 # sst only datasets (not good for surface temperature teleconnection)
@@ -58,7 +72,8 @@ sst_only = [
 #
 def ComputeCollection(metricCollection, dictDatasets, modelName, user_regridding={}, debug=False, dive_down=False,
                       netcdf=False, netcdf_name="", observed_fyear=None, observed_lyear=None, modeled_fyear=None,
-                      modeled_lyear=None, obs_interpreter=None):
+                      modeled_lyear=None, obs_interpreter=None, dive_down_recipe=False, reference_bundle=None,
+                      metric_cache=None, list_metrics=None, dive_down_json=None, dive_down_sidecar=None):
     """
     The ComputeCollection() function computes all the diagnostics / metrics associated with the given Metric Collection
 
@@ -140,6 +155,34 @@ def ComputeCollection(metricCollection, dictDatasets, modelName, user_regridding
         the only possibility is 'CMIP' to interpret all observational's variables as CMIP (datasets have been CMORized)
         default value = None, observational datasets are considered not CMORized and will be interpreted as defined in
         EnsoCollectionsLib.ReferenceObservations
+    :param dive_down_recipe: boolean or string, optional
+        default value = False no recipe is saved
+        If you want to save, in the metadata of each metric, the inputs needed to compute the dive down diagnostics
+        later (without recomputing the whole collection) set it to True
+        If a path_to/directory is given, the fields read for each metric (variable selected in the region, with checked
+        units and masked land / ocean, and its areacell) are also saved in this directory (listed in fields.json) and
+        ComputeCollectionDiveDown reads them instead of the files
+        see ComputeCollectionDiveDown
+    :param reference_bundle: dict, optional
+        precomputed observational diagnostics, see load_reference_bundle and BuildReferenceBundle
+        default value = None, all observational diagnostics are computed from the files
+    :param metric_cache: dict, optional
+        metrics already computed (by another Metric Collection) with the same parameters and datasets, filled with the
+        metrics computed here, see ComputeCollections
+        default value = None, all metrics are computed
+    :param list_metrics: list of strings, optional
+        list of metrics of the Metric Collection to compute
+        default value = None, all metrics are computed
+    :param dive_down_json: string, optional
+        path_to/filename of a json file in which the dive down values are written as the metrics are computed (they
+        are not kept in memory), used only if dive_down=True
+        the second output is then {'value': {}, 'metadata': ..., 'json_name': dive_down_json}
+        default value = None, the dive down values are returned
+    :param dive_down_sidecar: string, optional
+        path_to/filename of a npz file in which the dive down arrays (values and mask) are saved, used only if
+        dive_down=True, the dive down values then contain small pointers to the arrays instead of lists
+        see EnsoUvcdatToolsLib.ReadArraySidecar and EnsoUvcdatToolsLib.RehydrateArrays to read them
+        default value = None, the dive down arrays are saved as lists
 
     :return: MCvalues: dict
         name of the Metric Collection, Metrics, value, value_error, units, ...
@@ -192,8 +235,26 @@ def ComputeCollection(metricCollection, dictDatasets, modelName, user_regridding
     }
     dict_col_valu = dict()
     dict_col_dd_valu = dict()
+    if dive_down is True and isinstance(dive_down_json, str) is True:
+        dd_stream = json_stream_open(dive_down_json, "value")
+    else:
+        dd_stream = None
+    if dive_down is True and isinstance(dive_down_sidecar, str) is True:
+        StartArraySidecar(dive_down_sidecar)
+    # fields read for the dive down diagnostics (see ComputeCollectionDiveDown)
+    if isinstance(dive_down_recipe, str) is True:
+        dive_down_fields = {"directory": dive_down_recipe, "fields": dive_down_fields_load(dive_down_recipe)}
+    else:
+        dive_down_fields = None
     dict_m = dict_mc["metrics_list"]
-    list_metrics = sorted(list(dict_m.keys()), key=lambda v: v.upper())
+    list_metrics = sorted([met for met in list(dict_m.keys()) if list_metrics is None or met in list_metrics],
+                          key=lambda v: v.upper())
+    # the heat flux feedbacks are computed together (only their scalar diagnostic, not used if NetCDFs are saved)
+    if netcdf is False:
+        heat_flux_batch = {"datasets": dictDatasets, "metrics_list": dict_m, "metrics": list_metrics,
+                           "user_regridding": user_regridding, "results": dict()}
+    else:
+        heat_flux_batch = None
     for metric in list_metrics:
         try:  # try per metric
             print("\033[94m" + str().ljust(5) + "ComputeCollection: metric = " + str(metric) + "\033[0m")
@@ -370,10 +431,47 @@ def ComputeCollection(metricCollection, dictDatasets, modelName, user_regridding
                         if ff is None or vv is None:
                             print("\033[94m" + str().ljust(11) + "no observed " + str(vv) + " given" + "\033[0m")
             else:
-                valu, vame, dive, dime = ComputeMetric(
-                    metricCollection, metric, modelName, modelFile1, modelVarName1, obsNameVar1, obsFile1, obsVarName1,
-                    dict_regions[list_variables[0]], user_regridding=user_regridding, debug=debug, netcdf=netcdf,
-                    netcdf_name=netcdf_name, obs_interpreter=obs_interpreter, **arg_var2)
+                # metrics with the same parameters and datasets in another collection are not recomputed (unless
+                # NetCDFs are saved, their names depend on the collection)
+                cache_key = None
+                if metric_cache is not None and netcdf is False:
+                    cache_key = json.dumps(
+                        [metric, dict_mc["common_collection_parameters"], dict_m[metric], modelName, modelFile1,
+                         modelVarName1, obsNameVar1, obsFile1, obsVarName1, arg_var2, user_regridding,
+                         obs_interpreter], sort_keys=True, default=str)
+                if cache_key is not None and cache_key in list(metric_cache.keys()):
+                    print("\033[94m" + str().ljust(5) + "ComputeCollection: " + str(metricCollection) + ", metric "
+                          + str(metric) + " already computed" + "\033[0m")
+                    valu, vame, dive, dime = deepcopy(metric_cache[cache_key])
+                else:
+                    if dive_down_fields is not None:
+                        dive_down_fields["files"] = list(dive_down_files(modelFile1, obsFile1, arg_var2).keys())
+                    # the dive down NetCDFs of the metric are written at the end of the metric (opened once)
+                    if netcdf is True:
+                        StartNetcdfBuffer()
+                    try:
+                        valu, vame, dive, dime = ComputeMetric(
+                            metricCollection, metric, modelName, modelFile1, modelVarName1, obsNameVar1, obsFile1,
+                            obsVarName1, dict_regions[list_variables[0]], user_regridding=user_regridding,
+                            debug=debug, netcdf=netcdf, netcdf_name=netcdf_name, obs_interpreter=obs_interpreter,
+                            reference_bundle=reference_bundle, heat_flux_batch=heat_flux_batch,
+                            dive_down_fields=dive_down_fields, **arg_var2)
+                    finally:
+                        if netcdf is True:
+                            FlushNetcdfBuffer()
+                    if cache_key is not None:
+                        metric_cache[cache_key] = deepcopy([valu, vame, dive, dime])
+                del cache_key
+                if dive_down_recipe is True or dive_down_fields is not None:
+                    # inputs of ComputeMetric, to compute the dive down diagnostics later
+                    vame["dive_down_recipe"] = {
+                        "metricCollection": metricCollection, "metric": metric, "modelName": modelName,
+                        "modelFile1": modelFile1, "modelVarName1": modelVarName1, "obsNameVar1": obsNameVar1,
+                        "obsFile1": obsFile1, "obsVarName1": obsVarName1, "regionVar1": dict_regions[list_variables[0]],
+                        "user_regridding": user_regridding, "obs_interpreter": obs_interpreter,
+                        "arg_var2": deepcopy(arg_var2), "fingerprint": dive_down_files(modelFile1, obsFile1, arg_var2)}
+                    if dive_down_fields is not None:
+                        vame["dive_down_recipe"]["fields_directory"] = dive_down_fields["directory"]
                 keys1 = list(valu.keys())
                 keys2 = list(set([kk.replace("value", "").replace("__", "").replace("_error", "")
                                   for ll in list(valu[keys1[0]].keys()) for kk in list(valu[keys1[0]][ll].keys())]))
@@ -392,21 +490,897 @@ def ComputeCollection(metricCollection, dictDatasets, modelName, user_regridding
                         mm = dict((ii, vame["metric"][ii]) for ii in list(vame["metric"].keys()) if "units" not in ii)
                         mm["units"] = vame["metric"][kk + "__units"]
                         dict_col_meta["metrics"][metric + kk] = {"metric": mm, "diagnostic": vame["diagnostic"]}
-                        dict_col_dd_valu[metric + kk], dict_col_dd_meta["metrics"][metric + kk] = dive, dime
+                        if "dive_down_recipe" in list(vame.keys()):
+                            dict_col_meta["metrics"][metric + kk]["dive_down_recipe"] = vame["dive_down_recipe"]
+                        dict_col_dd_meta["metrics"][metric + kk] = dime
+                        if dd_stream is None:
+                            dict_col_dd_valu[metric + kk] = dive
+                        else:
+                            json_stream_write(dd_stream, metric + kk, dive)
                         del mm, dd
                 else:
                     dict_col_valu[metric], dict_col_meta["metrics"][metric] = valu, vame
-                    dict_col_dd_valu[metric], dict_col_dd_meta["metrics"][metric] = dive, dime
+                    dict_col_dd_meta["metrics"][metric] = dime
+                    if dd_stream is None:
+                        dict_col_dd_valu[metric] = dive
+                    else:
+                        json_stream_write(dd_stream, metric, dive)
         except Exception as e:
             print(e)
             pass
-    if dive_down is True:
+    if dive_down is True and isinstance(dive_down_sidecar, str) is True:
+        SaveArraySidecar()
+    if dive_down_fields is not None:
+        dive_down_fields_save(dive_down_fields["directory"], dive_down_fields["fields"])
+    if dd_stream is not None:
+        json_stream_close(dd_stream, {"metadata": dict_col_dd_meta})
+        return {"value": dict_col_valu, "metadata": dict_col_meta}, \
+               {"value": dict_col_dd_valu, "metadata": dict_col_dd_meta, "json_name": dive_down_json}
+    elif dive_down is True:
         return {"value": dict_col_valu, "metadata": dict_col_meta}, \
                {"value": dict_col_dd_valu, "metadata": dict_col_dd_meta}
     else:
         return {"value": dict_col_valu, "metadata": dict_col_meta}, {}
 
 
+def ComputeCollections(list_metricCollection, dictDatasets, modelName, user_regridding={}, debug=False,
+                       dive_down=False, netcdf=False, netcdf_name="", observed_fyear=None, observed_lyear=None,
+                       modeled_fyear=None, modeled_lyear=None, obs_interpreter=None, dive_down_recipe=False,
+                       reference_bundle=None):
+    """
+    The ComputeCollections() function computes several Metric Collections for the same model
+    A metric defined in several collections with the same parameters (e.g., EnsoAmpl, EnsoSeasonality in ENSO_perf and
+    ENSO_proc) is computed only once and its results are given to all these collections
+
+    Inputs:
+    ------
+    :param list_metricCollection: list of strings
+        names of Metric Collections, must be defined in EnsoCollectionsLib.defCollection()
+    see ComputeCollection for the other inputs
+    :param netcdf_name: string or dict, optional
+        default value = '' root name of the saved NetCDFs
+        if netcdf is True, a dict {metricCollection: netcdf_name} can be given to use a different name per collection
+        (metrics are then computed for each collection)
+
+    :return: dict_out: dict
+        outputs of ComputeCollection for each Metric Collection, as if they had been computed separately
+        dict_out = {'metricCollection1': ComputeCollection(metricCollection1, ...), ...}
+    """
+    metric_cache = dict()
+    dict_out = dict()
+    for mc in list_metricCollection:
+        print("\033[94m" + str().ljust(5) + "ComputeCollections: metricCollection = " + str(mc) + "\033[0m")
+        dict_out[mc] = ComputeCollection(
+            mc, dictDatasets, modelName, user_regridding=user_regridding, debug=debug, dive_down=dive_down,
+            netcdf=netcdf, netcdf_name=netcdf_name[mc] if isinstance(netcdf_name, dict) else netcdf_name,
+            observed_fyear=observed_fyear, observed_lyear=observed_lyear, modeled_fyear=modeled_fyear,
+            modeled_lyear=modeled_lyear, obs_interpreter=obs_interpreter, dive_down_recipe=dive_down_recipe,
+            reference_bundle=reference_bundle, metric_cache=metric_cache)
+    return dict_out
+
+
+def ComputeCollectionDiveDown(dict_collection, netcdf_name, list_metrics=None, list_models=None, debug=False):
+    """
+    The ComputeCollectionDiveDown() function computes the dive down diagnostics (and saves them in NetCDFs) of metrics
+    previously computed by ComputeCollection(..., dive_down_recipe=True)
+
+    Inputs:
+    ------
+    :param dict_collection: dict or list of dict
+        first output of ComputeCollection (dict with 'value' and 'metadata'), or list of such outputs (e.g., one per
+        model), computed with dive_down_recipe=True
+        if dive_down_recipe was a directory, the fields saved in it are read instead of the files (if the files did not
+        change)
+    :param netcdf_name: string
+        path_to/root name of the saved NetCDFs (the directory must exist)
+        the name of a metric will be append at the end of the root name
+        e.g., netcdf_name='/path/to/directory/USER_DATE_METRICCOLLECTION_MODEL'
+    :param list_metrics: list of strings, optional
+        list of metrics for which the dive down diagnostics must be computed
+        default value = None, all metrics with a recipe are computed
+    :param list_models: list of strings, optional
+        list of models for which the dive down diagnostics must be computed
+        default value = None, all models with a recipe are computed
+    :param debug: boolean, optional
+        default value = False debug mode not activated
+        If you want to activate the debug mode set it to True (prints regularly to see the progress of the calculation)
+
+    :return: dict_out: dict
+        dive down diagnostics by model, as given by ComputeCollection(..., dive_down=True), and the error raised by each
+        metric that could not be computed
+        dict_out = {'modelName': {'value': {'metric1': ..., ...}, 'metadata': {'metrics': {'metric1': ..., ...}},
+                                  'errors': {'metric2': 'error message', ...}}}
+    """
+    # the NetCDFs are always saved, their name is checked before computing anything
+    if isinstance(netcdf_name, str) is False or netcdf_name == "" or \
+            OSpath__isdir(OSpath__dirname(netcdf_name) or ".") is False:
+        list_strings = [
+            "ERROR" + EnsoErrorsWarnings.message_formating(INSPECTstack()) + ": netcdf_name",
+            str().ljust(5) + "netcdf_name must be path_to/root name of the NetCDFs, in an existing directory",
+            str().ljust(10) + "netcdf_name = " + str(netcdf_name)]
+        EnsoErrorsWarnings.my_error(list_strings)
+    if isinstance(dict_collection, dict):
+        dict_collection = [dict_collection]
+    # lists recipes (metrics with more than one value, e.g., EnsoPrMapCorr, EnsoPrMapRmse, EnsoPrMapStd share the same
+    # recipe, it is used only once)
+    list_recipes, list_done = list(), list()
+    for dict_col in dict_collection:
+        for met in sorted(list(dict_col["metadata"]["metrics"].keys()), key=lambda v: v.upper()):
+            try:
+                recipe = dict_col["metadata"]["metrics"][met]["dive_down_recipe"]
+            except:
+                continue
+            if list_metrics is not None and met not in list_metrics and recipe["metric"] not in list_metrics:
+                continue
+            if list_models is not None and recipe["modelName"] not in list_models:
+                continue
+            if [recipe["modelName"], recipe["metricCollection"], recipe["metric"]] not in list_done:
+                list_recipes.append(recipe)
+                list_done.append([recipe["modelName"], recipe["metricCollection"], recipe["metric"]])
+            del recipe
+    dict_out = dict()
+    for recipe in list_recipes:
+        modelName, metric = recipe["modelName"], recipe["metric"]
+        print("\033[94m" + str().ljust(5) + "ComputeCollectionDiveDown: metric = " + str(metric) + ", model = " +
+              str(modelName) + "\033[0m")
+        # checks that the files did not change since the recipe has been created
+        fingerprint = file_fingerprint(list(recipe["fingerprint"].keys()))
+        list_changed = [ff for ff in list(fingerprint.keys()) if fingerprint[ff] != recipe["fingerprint"][ff]]
+        if len(list_changed) > 0:
+            list_strings = [
+                "WARNING" + EnsoErrorsWarnings.message_formating(INSPECTstack()) + ": file(s) changed",
+                str().ljust(5) + str(len(list_changed)) + " file(s) changed since the scalar metric was computed",
+                str().ljust(10) + "dive down diagnostics may not correspond to the metric value: " + str(list_changed)]
+            EnsoErrorsWarnings.my_warning(list_strings)
+        if modelName not in list(dict_out.keys()):
+            dict_out[modelName] = {"value": dict(), "metadata": {"metrics": dict()}, "errors": dict()}
+        # fields saved by ComputeCollection (read only)
+        if "fields_directory" in list(recipe.keys()):
+            dive_down_fields = {"directory": recipe["fields_directory"],
+                                "fields": dive_down_fields_load(recipe["fields_directory"])}
+        else:
+            dive_down_fields = None
+        StartNetcdfBuffer()
+        try:  # try per metric
+            try:
+                _, _, dive, dime = ComputeMetric(
+                    recipe["metricCollection"], metric, modelName, recipe["modelFile1"], recipe["modelVarName1"],
+                    recipe["obsNameVar1"], recipe["obsFile1"], recipe["obsVarName1"], recipe["regionVar1"],
+                    user_regridding=recipe["user_regridding"], debug=debug, netcdf=True, netcdf_name=netcdf_name,
+                    obs_interpreter=recipe["obs_interpreter"], dive_down_fields=dive_down_fields,
+                    **recipe["arg_var2"])
+            finally:
+                FlushNetcdfBuffer()
+        except Exception as e:
+            print(e)
+            dict_out[modelName]["errors"][metric] = str(e)
+        else:
+            dict_out[modelName]["value"][metric] = dive
+            dict_out[modelName]["metadata"]["metrics"][metric] = dime
+        del dive_down_fields, fingerprint, list_changed, metric, modelName
+    return dict_out
+
+
+def PlanCollection(metricCollection, dictDatasets, modelName, user_regridding={}, observed_fyear=None,
+                   observed_lyear=None, modeled_fyear=None, modeled_lyear=None):
+    """
+    The PlanCollection() function estimates, without reading any data, what computing the given Metric Collection will
+    cost (dry run)
+    Only the headers of the files and the parameters of the collection (EnsoCollectionsLib.defCollection) are read
+
+    For each metric, the plan lists the nodes needed: reading of each file ('read', shared between metrics if the same
+    file, variable, region and period are read), regridding ('regrid'), preprocessing of each dataset ('preprocess') and
+    computation of the metric ('metric')
+    Each node has an estimate of the bytes read, the memory used and a relative computation cost (proportional to the
+    size of the arrays); these are orders of magnitude (the metrics sometimes read a larger region or make copies)
+    A metric is not computable if a file or variable of the model is missing (an observational dataset with a missing
+    file or variable is not used), the problems are listed in 'errors'
+
+    Inputs:
+    ------
+    :param metricCollection: string
+        name of a Metric Collection, must be defined in EnsoCollectionsLib.defCollection()
+    see ComputeCollection for the other inputs
+
+    :return plan: dict
+        plan = {
+            'arguments': {arguments of PlanCollection, used by ExecutePlan},
+            'nodes': {node_id: {'type': 'read', 'inputs': [node_id, ...], 'bytes_read': int, 'memory': int,
+                                'cost': float}, ...},  # 'read' nodes also have the 'shape' read
+            'tasks': {metric: {'nodes': [node_id, ...], 'computable': bool, 'errors': [str, ...], 'bytes_read': int,
+                               'peak_memory': int, 'cost': float}, ...},
+            'bytes_read': int, 'peak_memory': int, 'cost': float,
+        }
+    """
+    dict_mc = defCollection(metricCollection)
+    dict_nodes, dict_tasks, dict_errors = dict(), dict(), dict()
+    for metric in sorted(list(dict_mc["metrics_list"].keys()), key=lambda v: v.upper()):
+        # parameters as in ComputeMetric
+        keyarg = deepcopy(dict_mc["common_collection_parameters"])
+        keyarg.update(dict_mc["metrics_list"][metric])
+        list_variables = keyarg["variables"]
+        dict_regions = keyarg["regions"]
+        time_bounds_mod = keyarg["modeled_period"] if "modeled_period" in list(keyarg.keys()) else \
+            default_arg_values("time_bounds_mod")
+        if isinstance(modeled_fyear, int) is True and isinstance(modeled_lyear, int) is True:
+            time_bounds_mod = (str(modeled_fyear) + "-01-01 00:00:00", str(modeled_lyear) + "-12-31 23:59:60.0")
+        time_bounds_obs = keyarg["observed_period"] if "observed_period" in list(keyarg.keys()) else \
+            default_arg_values("time_bounds_obs")
+        if isinstance(observed_fyear, int) is True and isinstance(observed_lyear, int) is True:
+            time_bounds_obs = (str(observed_fyear) + "-01-01 00:00:00", str(observed_lyear) + "-12-31 23:59:60.0")
+        if metric in list(user_regridding.keys()):
+            regridding = user_regridding[metric]
+        elif "regridding" in list(user_regridding.keys()):
+            regridding = user_regridding["regridding"]
+        else:
+            regridding = keyarg["regridding"] if "regridding" in list(keyarg.keys()) else False
+        # datasets used by the metric
+        list_datasets = [["model", modelName, time_bounds_mod]]
+        list_datasets += [["observations", obs, time_bounds_obs]
+                          for obs in sorted(list(dictDatasets["observations"].keys()), key=lambda v: v.upper())]
+        task_nodes, dict_memory, list_errors = list(), dict(), list()
+        computable = True
+        for group, dataset, time_bounds in list_datasets:
+            try:
+                dict_dataset = dictDatasets[group][dataset]
+            except:
+                dict_dataset = dict()
+            if group == "observations" and list_variables[0] not in list(dict_dataset.keys()):
+                continue
+            list_inputs, memory, readable = list(), 0, True
+            for var in list_variables:
+                try:
+                    list_files = dict_dataset[var]["path + filename"]
+                    list_names = dict_dataset[var]["varname"]
+                except:
+                    list_files, list_names = [None], [None]
+                if isinstance(list_files, list) is False:
+                    list_files, list_names = [list_files], [list_names]
+                if None in list_files or "" in list_files:
+                    if group == "model":
+                        computable = False
+                    continue
+                for ff, vv in zip(list_files, list_names):
+                    node_id = "read|" + json.dumps([ff, vv, dict_regions[var], time_bounds])
+                    if node_id not in list(dict_nodes.keys()) and node_id not in list(dict_errors.keys()):
+                        header = ReadHeader(ff, vv, box=dict_regions[var], time_bounds=time_bounds)
+                        if header["error"] is not None:
+                            dict_errors[node_id] = header["error"]
+                        else:
+                            dict_nodes[node_id] = {
+                                "type": "read", "inputs": [], "shape": header["shape_selected"],
+                                "bytes_read": header["nbytes"], "memory": header["nbytes"],
+                                "cost": header["nbytes"] / 1e6}
+                        del header
+                    if node_id in list(dict_errors.keys()):
+                        # missing file or variable: the dataset cannot be used
+                        list_errors.append(dataset + ": " + dict_errors[node_id])
+                        readable = False
+                        continue
+                    list_inputs.append(node_id)
+                    memory += dict_nodes[node_id]["memory"]
+            if readable is False:
+                if group == "model":
+                    computable = False
+                continue
+            if len(list_inputs) == 0:
+                continue
+            task_nodes += list_inputs
+            if isinstance(regridding, dict) is True:
+                # regridded on a 1x1deg grid, the arrays are converted in float64
+                shape = dict_nodes[list_inputs[0]]["shape"]
+                region = ReferenceRegions(dict_regions[list_variables[0]])
+                npoints = (region["latitude"][1] - region["latitude"][0]) * \
+                    (region["longitude"][1] - region["longitude"][0])
+                regrid_memory = int(shape[0] * npoints * 8 * len(list_variables))
+                node_id = "regrid|" + metric + "|" + dataset
+                dict_nodes[node_id] = {"type": "regrid", "inputs": list_inputs, "bytes_read": 0,
+                                       "memory": memory + regrid_memory, "cost": 4 * (memory + regrid_memory) / 1e6}
+                task_nodes.append(node_id)
+                list_inputs, memory = [node_id], regrid_memory
+            # preprocessing (anomalies, detrending, smoothing...) makes a copy of the arrays
+            node_id = "preprocess|" + metric + "|" + dataset
+            dict_nodes[node_id] = {"type": "preprocess", "inputs": list_inputs, "bytes_read": 0, "memory": 2 * memory,
+                                   "cost": 2 * memory / 1e6}
+            task_nodes.append(node_id)
+            dict_memory[node_id] = 2 * memory
+        # the model and one observational dataset are in memory at the same time
+        list_pre = sorted(list(dict_memory.keys()))
+        memory_mod = dict_memory.get("preprocess|" + metric + "|" + modelName, 0)
+        memory_obs = [dict_memory[node_id] for node_id in list_pre if node_id != "preprocess|" + metric + "|" +
+                      modelName]
+        peak_memory = memory_mod + (max(memory_obs) if len(memory_obs) > 0 else 0)
+        node_id = "metric|" + metric
+        dict_nodes[node_id] = {"type": "metric", "inputs": list_pre, "bytes_read": 0, "memory": peak_memory,
+                               "cost": sum(dict_memory.values()) / 1e6}
+        task_nodes.append(node_id)
+        dict_tasks[metric] = {
+            "nodes": task_nodes, "computable": computable and len(memory_obs) > 0, "errors": list_errors,
+            "bytes_read": sum([dict_nodes[nn]["bytes_read"] for nn in task_nodes]),
+            "peak_memory": max([dict_nodes[nn]["memory"] for nn in task_nodes]),
+            "cost": sum([dict_nodes[nn]["cost"] for nn in task_nodes])}
+        del computable, dict_memory, dict_regions, keyarg, list_datasets, list_errors, list_pre, list_variables, \
+            memory_mod, memory_obs, peak_memory, regridding, task_nodes, time_bounds_mod, time_bounds_obs
+    plan = {
+        "arguments": {
+            "metricCollection": metricCollection, "modelName": modelName, "user_regridding": user_regridding,
+            "observed_fyear": observed_fyear, "observed_lyear": observed_lyear, "modeled_fyear": modeled_fyear,
+            "modeled_lyear": modeled_lyear},
+        "nodes": dict_nodes, "tasks": dict_tasks,
+        # a file read by several metrics is counted once (its header is read once)
+        "bytes_read": sum([dict_nodes[nn]["bytes_read"] for nn in list(dict_nodes.keys())]),
+        "peak_memory": max([0] + [dict_tasks[tt]["peak_memory"] for tt in list(dict_tasks.keys())]),
+        "cost": sum([dict_nodes[nn]["cost"] for nn in list(dict_nodes.keys())])}
+    return plan
+
+
+def ExecutePlan(plan, dictDatasets, max_memory=None, nbr_processes=1, debug=False, **kwargs):
+    """
+    The ExecutePlan() function computes the Metric Collection planned by PlanCollection
+
+    The metrics are computed by decreasing estimated peak memory, up to 'nbr_processes' metrics at the same time if the
+    sum of their estimated peak memory is lower than 'max_memory'
+    A metric whose estimated peak memory is larger than 'max_memory' is computed alone (a warning is printed)
+    The metrics that are not computable (see PlanCollection) are skipped (a warning with their errors is printed)
+    If 'dive_down_json' or 'dive_down_sidecar' is given, each metric writes its own file (named after the given file
+    and the metric) and the files are merged in the given one when all the metrics are computed
+
+    Inputs:
+    ------
+    :param plan: dict
+        plan of the Metric Collection, output of PlanCollection
+    :param dictDatasets: dict
+        dictionary given to PlanCollection
+    :param max_memory: integer, optional
+        maximum memory (in bytes) used by the metrics computed at the same time
+        default value = None, no limit
+    :param nbr_processes: integer, optional
+        maximum number of metrics computed at the same time
+        default value = 1, metrics are computed successively
+    :param debug: boolean, optional
+        default value = False debug mode not activated
+        If you want to activate the debug mode set it to True (prints regularly to see the progress of the calculation)
+    :param kwargs: keyword arguments given to ComputeCollection (dive_down, netcdf, netcdf_name, obs_interpreter,...)
+
+    :return: same as ComputeCollection
+    """
+    arguments = plan["arguments"]
+    # metrics that cannot be computed
+    list_skipped = sorted([metric for metric in list(plan["tasks"].keys()) if plan["tasks"][metric]["computable"] is
+                           not True], key=lambda v: v.upper())
+    if len(list_skipped) > 0:
+        list_strings = ["WARNING" + EnsoErrorsWarnings.message_formating(INSPECTstack()) + ": metrics not computable"]
+        for metric in list_skipped:
+            list_strings.append(str().ljust(5) + str(metric) + ": " +
+                                str("; ".join(plan["tasks"][metric].get("errors", [])) or "no observation"))
+        EnsoErrorsWarnings.my_warning(list_strings)
+    # dive down files written by each metric, merged at the end
+    dive_down_json, dive_down_sidecar = kwargs.pop("dive_down_json", None), kwargs.pop("dive_down_sidecar", None)
+    if kwargs.get("dive_down") is not True:
+        dive_down_json, dive_down_sidecar = None, None
+    # batches of metrics computed at the same time (first fit by decreasing memory)
+    list_tasks = sorted([metric for metric in list(plan["tasks"].keys()) if metric not in list_skipped],
+                        key=lambda v: (-plan["tasks"][v]["peak_memory"], v.upper()))
+    list_batches, list_memory = list(), list()
+    for metric in list_tasks:
+        memory = plan["tasks"][metric]["peak_memory"]
+        if max_memory is not None and memory > max_memory:
+            list_strings = [
+                "WARNING" + EnsoErrorsWarnings.message_formating(INSPECTstack()) + ": memory",
+                str().ljust(5) + str(metric) + " estimated peak memory (" + str(memory) + " bytes) larger than " +
+                "max_memory (" + str(max_memory) + " bytes)", str().ljust(10) + "it is computed alone"]
+            EnsoErrorsWarnings.my_warning(list_strings)
+            list_batches.append([metric])
+            list_memory.append(memory)
+            continue
+        for ii in range(len(list_batches)):
+            if len(list_batches[ii]) < nbr_processes and \
+                    (max_memory is None or list_memory[ii] + memory <= max_memory):
+                list_batches[ii].append(metric)
+                list_memory[ii] += memory
+                break
+        else:
+            list_batches.append([metric])
+            list_memory.append(memory)
+    # computes the metrics
+    list_results, list_done = list(), list()
+    for batch, memory in zip(list_batches, list_memory):
+        print("\033[94m" + str().ljust(5) + "ExecutePlan: metrics = " + str(batch) + ", estimated memory = " +
+              str(memory) + " bytes" + "\033[0m")
+        list_arguments = list()
+        for metric in batch:
+            dict_task = dict(arguments, **kwargs)
+            if dive_down_json is not None:
+                dict_task["dive_down_json"] = plan_task_file(dive_down_json, metric, ".json")
+            if dive_down_sidecar is not None:
+                dict_task["dive_down_sidecar"] = plan_task_file(dive_down_sidecar, metric, ".npz")
+            list_arguments.append([arguments["metricCollection"], dictDatasets, arguments["modelName"], metric, debug,
+                                   dict_task])
+            del dict_task
+        list_done += batch
+        if len(batch) > 1:
+            pool = MULTIPROCESSINGpool(len(batch))
+            list_results += pool.map(compute_collection_task, list_arguments)
+            pool.close()
+            pool.join()
+            del pool
+        else:
+            list_results += [compute_collection_task(list_arguments[0])]
+    # gathers the results as ComputeCollection
+    dict_out = list_results[0] if len(list_results) > 0 else \
+        [{"value": {}, "metadata": {"metrics": {}}},
+         {"value": {}, "metadata": {"metrics": {}}} if kwargs.get("dive_down") is True else {}]
+    for results in list_results[1:]:
+        for d1, d2 in zip(dict_out, results):
+            if len(d2) > 0:
+                d1["value"].update(d2["value"])
+                d1["metadata"]["metrics"].update(d2["metadata"]["metrics"])
+    # merges the dive down files written by each metric
+    if dive_down_sidecar is not None:
+        list_sidecars = [plan_task_file(dive_down_sidecar, metric, ".npz") for metric in list_done]
+        dive_down_sidecar, dict_prefix = MergeArraySidecars(list_sidecars, dive_down_sidecar)
+        dict_out[1]["value"] = RenameArrayPointers(dict_out[1]["value"], dive_down_sidecar, dict_prefix)
+    if dive_down_json is not None:
+        stream = json_stream_open(dive_down_json, "value")
+        for metric in list_done:
+            with open(plan_task_file(dive_down_json, metric, ".json")) as ff:
+                dict_task = json.load(ff)["value"]
+            for key in sorted(list(dict_task.keys()), key=lambda v: v.upper()):
+                value = dict_task.pop(key)
+                if dive_down_sidecar is not None:
+                    value = RenameArrayPointers(value, dive_down_sidecar, dict_prefix)
+                json_stream_write(stream, key, value)
+                del value
+            del dict_task
+            OSremove(plan_task_file(dive_down_json, metric, ".json"))
+        json_stream_close(stream, {"metadata": dict_out[1]["metadata"]})
+        dict_out[1]["json_name"] = dive_down_json
+    if dive_down_sidecar is not None:
+        for name in list_sidecars:
+            if OSpath__isfile(name) is True:
+                OSremove(name)
+    return dict_out[0], dict_out[1]
+
+
+def plan_task_file(file_name, metric, extension):
+    """
+    #################################################################################
+    Description:
+    Name of the file written by one metric (see ExecutePlan): the metric is added before the extension
+    #################################################################################
+    """
+    if file_name.endswith(extension) is True:
+        file_name = file_name[:-len(extension)]
+    return file_name + "_" + str(metric) + extension
+
+
+def compute_collection_task(list_arguments):
+    """
+    #################################################################################
+    Description:
+    Computes one metric of a Metric Collection, see ExecutePlan
+    Takes all the arguments in one list to be usable with multiprocessing.Pool.map
+    #################################################################################
+
+    :param list_arguments: list
+        [metricCollection, dictDatasets, modelName, metric, debug, keyword arguments of ComputeCollection (dict)]
+    :return: output of ComputeCollection
+    """
+    metricCollection, dictDatasets, modelName, metric, debug, kwargs = list_arguments
+    kwargs = dict((key, kwargs[key]) for key in list(kwargs.keys()) if key not in ["metricCollection", "modelName"])
+    return list(ComputeCollection(metricCollection, dictDatasets, modelName, debug=debug, list_metrics=[metric],
+                                  **kwargs))
+
+
+def PreflightCollection(metricCollection, dictDatasets, modelName, nbr_processes=1, observed_fyear=None,
+                        observed_lyear=None, modeled_fyear=None, modeled_lyear=None):
+    """
+    The PreflightCollection() function checks, before any computation, that the datasets allow computing the metrics of
+    the given Metric Collection
+    Only the metadata of the files are read (see EnsoUvcdatToolsLib.ReadMetadata), all files are read at the same time
+    using 'nbr_processes' processes
+
+    A dataset cannot be used for a metric if a file is missing, a variable is not in its file, has no units, no time
+    axis or no horizontal grid, or if the period to use (defined in EnsoCollectionsLib.defCollection or by the user) is
+    shorter than 'min_time_steps' (areacell and landmask files are optional, they are read but never make a dataset
+    unusable)
+    A metric is skipped if the model cannot be used or if no observational dataset can be used for one of its variables
+    The metrics that are not skipped can be given to ComputeCollection (list_metrics=preflight['metrics_to_compute'])
+
+    Inputs:
+    ------
+    :param metricCollection: string
+        name of a Metric Collection, must be defined in EnsoCollectionsLib.defCollection()
+    :param nbr_processes: integer, optional
+        number of processes used to read the metadata
+        default value = 1
+    see ComputeCollection for the other inputs
+
+    :return preflight: dict
+        preflight = {
+            'files': {'path_to_file/filename': {'varname': metadata}, ...},
+            'metrics': {metric: {'skipped': bool, 'reasons': ['...', ...],
+                                 'observations': {variable: [usable obsName1, ...]}}, ...},
+            'metrics_to_compute': [metric, ...],
+        }
+    """
+    dict_mc = defCollection(metricCollection)
+    # list of all files to read
+    list_datasets = [["model", modelName]]
+    list_datasets += [["observations", obs]
+                      for obs in sorted(list(dictDatasets["observations"].keys()), key=lambda v: v.upper())]
+    list_read = list()
+    for group, dataset in list_datasets:
+        try:
+            dict_dataset = dictDatasets[group][dataset]
+        except:
+            dict_dataset = dict()
+        for var in sorted(list(dict_dataset.keys()), key=lambda v: v.upper()):
+            list_read += [[ff, vv, tt] for ff, vv, tt in preflight_files(dict_dataset[var])
+                          if ff is not None and vv is not None]
+    list_read = sorted([json.loads(tt) for tt in set([json.dumps(tt) for tt in list_read])])
+    # reads the metadata
+    if nbr_processes > 1 and len(list_read) > 1:
+        pool = MULTIPROCESSINGpool(min(nbr_processes, len(list_read)))
+        list_metadata = pool.starmap(ReadMetadata, list_read)
+        pool.close()
+        pool.join()
+        del pool
+    else:
+        list_metadata = [ReadMetadata(ff, vv, time_axis=tt) for ff, vv, tt in list_read]
+    dict_files = dict()
+    for (ff, vv, tt), metadata in zip(list_read, list_metadata):
+        if ff not in list(dict_files.keys()):
+            dict_files[ff] = dict()
+        dict_files[ff][vv] = metadata
+    # checks each metric
+    dict_metrics = dict()
+    for metric in sorted(list(dict_mc["metrics_list"].keys()), key=lambda v: v.upper()):
+        keyarg = deepcopy(dict_mc["common_collection_parameters"])
+        keyarg.update(dict_mc["metrics_list"][metric])
+        min_time_steps = keyarg["min_time_steps"] if "min_time_steps" in list(keyarg.keys()) else None
+        time_bounds_mod = keyarg["modeled_period"] if "modeled_period" in list(keyarg.keys()) else None
+        if isinstance(modeled_fyear, int) is True and isinstance(modeled_lyear, int) is True:
+            time_bounds_mod = (str(modeled_fyear) + "-01", str(modeled_lyear) + "-12")
+        time_bounds_obs = keyarg["observed_period"] if "observed_period" in list(keyarg.keys()) else None
+        if isinstance(observed_fyear, int) is True and isinstance(observed_lyear, int) is True:
+            time_bounds_obs = (str(observed_fyear) + "-01", str(observed_lyear) + "-12")
+        reasons, model_ok, dict_obs = list(), True, dict((var, list()) for var in keyarg["variables"])
+        for group, dataset in list_datasets:
+            try:
+                dict_dataset = dictDatasets[group][dataset]
+            except:
+                dict_dataset = dict()
+            time_bounds = time_bounds_mod if group == "model" else time_bounds_obs
+            for var in keyarg["variables"]:
+                if var not in list(dict_dataset.keys()):
+                    if group == "model":
+                        reasons.append(dataset + ": no " + var + " given")
+                        model_ok = False
+                    continue
+                reasons_var = list()
+                for ff, vv, required in preflight_files(dict_dataset[var]):
+                    if ff is None or vv is None:
+                        reasons_var.append(dataset + ": no " + str(vv) + " given")
+                        continue
+                    metadata = dict_files[ff][vv]
+                    if required is False:
+                        # areacell and landmask are optional: the metric is computed without them
+                        continue
+                    if metadata["error"] is not None:
+                        reasons_var.append(dataset + ": " + metadata["error"])
+                    elif metadata["units"] is None and metadata["time_first"] is not None:
+                        reasons_var.append(dataset + ": no units for " + vv + " in " + ff)
+                    elif metadata["time_first"] is not None and min_time_steps is not None:
+                        # number of months in the period to use
+                        first, last = metadata["time_first"], metadata["time_last"]
+                        if time_bounds is not None:
+                            first = max(first, str(time_bounds[0])[:7])
+                            last = min(last, str(time_bounds[1])[:7])
+                        nbr_months = 12 * (int(last[:4]) - int(first[:4])) + int(last[5:7]) - int(first[5:7]) + 1
+                        if nbr_months < min_time_steps:
+                            reasons_var.append(
+                                dataset + ": too short time period for " + vv + " (" + str(max(nbr_months, 0)) +
+                                " < " + str(min_time_steps) + " months)")
+                        del first, last, nbr_months
+                reasons += reasons_var
+                if len(reasons_var) > 0 and group == "model":
+                    model_ok = False
+                elif len(reasons_var) == 0 and group == "observations":
+                    dict_obs[var].append(dataset)
+                del reasons_var
+            del time_bounds
+        for var in keyarg["variables"]:
+            if len(dict_obs[var]) == 0:
+                reasons.append("no usable observational dataset for " + var)
+        skipped = model_ok is False or min([len(dict_obs[var]) for var in keyarg["variables"]]) == 0
+        dict_metrics[metric] = {"skipped": skipped, "reasons": reasons, "observations": dict_obs}
+        if skipped is True:
+            print("\033[94m" + str().ljust(5) + "PreflightCollection: " + str(metricCollection) + ", metric " +
+                  str(metric) + " will be skipped" + "\033[0m")
+            for rr in reasons:
+                print("\033[94m" + str().ljust(11) + rr + "\033[0m")
+        del dict_obs, keyarg, min_time_steps, model_ok, reasons, skipped, time_bounds_mod, time_bounds_obs
+    return {"files": dict_files, "metrics": dict_metrics,
+            "metrics_to_compute": [met for met in sorted(list(dict_metrics.keys()), key=lambda v: v.upper())
+                                   if dict_metrics[met]["skipped"] is False]}
+
+
+def preflight_files(dict_var):
+    """
+    Lists the files of one variable of a dataset (see PreflightCollection), the given dictionary is not modified
+
+    :param dict_var: dict
+        dictionary of the variable in dictDatasets ('path + filename', 'varname', 'path + filename_area', ...)
+    :return list_files: list
+        [[path_to_file/filename, variable name, required], ...], required is False for the areacell and landmask
+        files (None or missing ones are not listed), True for the variable files (None ones are listed)
+    """
+    list_files = list()
+    for key1, key2, required in [["path + filename", "varname", True], ["path + filename_area", "areaname", False],
+                                 ["path + filename_landmask", "landmaskname", False]]:
+        if key1 not in list(dict_var.keys()):
+            continue
+        files = dict_var[key1]
+        names = dict_var[key2] if key2 in list(dict_var.keys()) else None
+        if isinstance(files, list) is False:
+            files, names = [files], [names]
+        elif isinstance(names, list) is False:
+            names = [names] * len(files)
+        for ff, vv in zip(files, names):
+            if required is True or (ff is not None and vv is not None):
+                list_files.append([ff, vv, required])
+    return list_files
+
+
+def BuildReferenceBundle(metricCollection, dictDatasets, modelName, bundle_name, user_regridding={}, debug=False,
+                         observed_fyear=None, observed_lyear=None, obs_interpreter=None, update_bundle=None,
+                         portable=False):
+    """
+    The BuildReferenceBundle() function computes the observational diagnostics of the given Metric Collection(s) and
+    saves them in a "reference bundle" (json file) that can be given to ComputeCollection (see load_reference_bundle),
+    observational diagnostics found in the bundle are then not recomputed
+    The observational fields read (selected in the region, with checked units and masked land / ocean, and their
+    areacell) are saved next to the bundle ('bundle_name'_fields directory, see StartReferenceFields) and are read
+    instead of the files by all the metrics, including those comparing directly the model and the observations
+
+    Only the diagnostics computed separately for the model and the observations (e.g., EnsoAmpl, EnsoSeasonality,
+    EnsoFbSstTaux) are saved, diagnostics comparing directly the model and the observations (e.g., BiasSstLonRmse) are
+    always computed
+    The bundle is tied to the package version (the diagnostics may change with the code) and each diagnostic and
+    field to the collection, metric, parameters and the path, size and modification time of the observational files
+    used (name and size only if portable is True)
+
+    Inputs:
+    ------
+    :param metricCollection: string or list of strings
+        name of a Metric Collection, must be defined in EnsoCollectionsLib.defCollection()
+    :param dictDatasets: dict
+        dictionary containing all information needed to compute the Metric Collection for one model and observations
+        see ComputeCollection
+    :param modelName: string
+        name of the model in dictDatasets used to run the Metric Collection (its diagnostics are not saved)
+    :param bundle_name: string
+        path_to/filename of the reference bundle (without '.json')
+    :param user_regridding: dict, optional
+        regridding parameters selected by the user, see ComputeCollection
+    :param debug: boolean, optional
+        default value = False debug mode not activated
+        If you want to activate the debug mode set it to True (prints regularly to see the progress of the calculation)
+    :param observed_fyear: integer, optional
+        first year to use for observational datasets, given to overrule value defined in EnsoCollectionsLib.py
+        default value = None, 'observed_period' defined in EnsoCollectionsLib.defCollection is used
+    :param observed_lyear: integer, optional
+        last year to use for observational datasets, given to overrule value defined in EnsoCollectionsLib.py
+        default value = None, 'observed_period' defined in EnsoCollectionsLib.defCollection is used
+    :param obs_interpreter: string, optional
+        special variable interpreter for all observational datasets, see ComputeCollection
+    :param update_bundle: dict, optional
+        reference bundle (see load_reference_bundle) to complete, its diagnostics and fields are kept
+        default value = None, a new bundle is created
+    :param portable: boolean, optional
+        default value = False, the observational files are identified by their path, size and modification time
+        If True, they are identified by their name and size only, so that the bundle can be shipped with the package
+        and used with copies of the observational files (a regenerated file with the same name and size is not
+        detected)
+
+    :return bundle: dict
+        reference bundle {'version': package version, 'portable': portable, 'entries': {key: {'fingerprint': ...,
+        'diagnostic': ...}}, 'fields': {key: {'file': ..., ...}}}
+    """
+    if isinstance(metricCollection, str):
+        metricCollection = [metricCollection]
+    fields_directory = bundle_name + "_fields"
+    if OSpath__isdir(fields_directory) is False:
+        OSmakedirs(fields_directory)
+    if update_bundle is None:
+        bundle = {"version": __version__, "entries": dict(), "fields": dict()}
+    else:
+        bundle = deepcopy(update_bundle)
+        bundle.setdefault("fields", dict())
+        # fields of the given bundle saved elsewhere
+        if bundle.get("fields_directory", fields_directory) != fields_directory:
+            for key in list(bundle["fields"].keys()):
+                SHUTILcopyfile(OSpath__join(bundle["fields_directory"], bundle["fields"][key]["file"]),
+                               OSpath__join(fields_directory, bundle["fields"][key]["file"]))
+    bundle["portable"] = portable
+    bundle["fields_directory"] = fields_directory
+    # observational files whose fields are saved
+    bundle["fields_files"] = list()
+    for dataset in list(dictDatasets["observations"].keys()):
+        for var in list(dictDatasets["observations"][dataset].keys()):
+            bundle["fields_files"] += [ff[0] for ff in preflight_files(dictDatasets["observations"][dataset][var])]
+    bundle["update"] = True
+    try:
+        for mc in metricCollection:
+            print("\033[94m" + str().ljust(5) + "BuildReferenceBundle: metricCollection = " + str(mc) + "\033[0m")
+            ComputeCollection(
+                mc, dictDatasets, modelName, user_regridding=user_regridding, debug=debug,
+                observed_fyear=observed_fyear, observed_lyear=observed_lyear, obs_interpreter=obs_interpreter,
+                reference_bundle=bundle)
+    finally:
+        StopReferenceFields()
+        del bundle["update"], bundle["fields_files"]
+    # save as json file (without the path of the fields, set by load_reference_bundle)
+    with open(bundle_name + ".json", "w") as outfile:
+        json.dump(dict((key, bundle[key]) for key in list(bundle.keys()) if key != "fields_directory"), outfile,
+                  sort_keys=True)
+    return bundle
+
+
+def load_reference_bundle(bundle_name):
+    """
+    #################################################################################
+    Description:
+    Reads a reference bundle created by BuildReferenceBundle
+    Its observational fields are read in the 'bundle_name'_fields directory next to it
+    A bundle created with another version of the package is not used (a warning is printed and None is returned)
+    #################################################################################
+
+    :param bundle_name: string
+        path_to/filename of the reference bundle (with or without '.json')
+    :return bundle: dict or None
+        reference bundle, to give to ComputeCollection (or ComputeMetric)
+    """
+    if bundle_name[-5:] != ".json":
+        bundle_name = bundle_name + ".json"
+    with open(bundle_name) as ff:
+        bundle = json.load(ff)
+    if bundle["version"] != __version__:
+        list_strings = [
+            "WARNING" + EnsoErrorsWarnings.message_formating(INSPECTstack()) + ": reference bundle version",
+            str().ljust(5) + "reference bundle computed with version " + str(bundle["version"]) + " of the package",
+            str().ljust(10) + "current version is " + str(__version__) + ", the bundle is not used"]
+        EnsoErrorsWarnings.my_warning(list_strings)
+        bundle = None
+    else:
+        bundle["fields_directory"] = bundle_name[:-5] + "_fields"
+    return bundle
+
+
+def reference_bundle_key(metricCollection, metric, dataset, keyarg):
+    """
+    #################################################################################
+    Description:
+    Key of an observational diagnostic in a reference bundle: collection, metric, dataset and parameters (the keyargs
+    used only for the model are excluded)
+    #################################################################################
+    """
+    dict_arg = dict((key, str(keyarg[key])) for key in list(keyarg.keys()) if "mod" not in key.split("_"))
+    return json.dumps([metricCollection, metric, dataset, dict_arg], sort_keys=True)
+
+
+def reference_bundle_read(bundle, key, fingerprint, netcdf_name=None):
+    """
+    #################################################################################
+    Description:
+    Returns the observational diagnostic saved in the reference bundle if it has been computed with the same files,
+    None otherwise
+    If netcdf_name is given, the dive down NetCDF variables saved when the diagnostic was computed are copied in the
+    NetCDF buffer for netcdf_name (see CopyNetcdfToBuffer), None is returned if they cannot be copied
+    #################################################################################
+    """
+    if bundle is None or key not in list(bundle["entries"].keys()):
+        return None
+    if bundle["entries"][key]["fingerprint"] != fingerprint:
+        return None
+    if netcdf_name is not None:
+        dict_netcdf = bundle["entries"][key].get("netcdf")
+        if dict_netcdf is None or \
+                CopyNetcdfToBuffer(dict_netcdf["files"], dict_netcdf["netcdf_name"], netcdf_name) is not True:
+            return None
+    print("\033[94m" + str().ljust(5) + "ComputeMetric: " + str(json.loads(key)[2]) + " read in reference bundle" +
+          "\033[0m")
+    return deepcopy(bundle["entries"][key]["diagnostic"])
+
+
+def reference_bundle_write(bundle, key, fingerprint, diagnostic, netcdf_files=None, netcdf_name=None):
+    """
+    #################################################################################
+    Description:
+    Saves the observational diagnostic in the reference bundle if it is being built (see BuildReferenceBundle)
+    The diagnostic is saved as it will be read from the json file
+    If netcdf_files is given (see NetcdfBufferAdded), the dive down NetCDF variables saved with netcdf_name are recorded
+    to be copied when the diagnostic is read with another netcdf_name
+    #################################################################################
+    """
+    if bundle is None or bundle.get("update") is not True:
+        return
+    bundle["entries"][key] = {
+        "fingerprint": fingerprint,
+        "diagnostic": json.loads(json.dumps(diagnostic, default=lambda x: x.tolist() if hasattr(x, "tolist") else
+                                            str(x)))}
+    if netcdf_files is not None:
+        bundle["entries"][key]["netcdf"] = {"files": netcdf_files, "netcdf_name": netcdf_name}
+    return
+
+
+def dive_down_files(modelFile1, obsFile1, arg_var2):
+    """
+    #################################################################################
+    Description:
+    Fingerprint of the files read by ComputeMetric (see EnsoToolsLib.file_fingerprint), saved with the dive down recipe
+    #################################################################################
+    """
+    list_files = [modelFile1, obsFile1]
+    for key in ["modelFile2", "obsFile2", "modelFileArea1", "modelFileLandmask1", "obsFileArea1", "obsFileLandmask1",
+                "modelFileArea2", "modelFileLandmask2", "obsFileArea2", "obsFileLandmask2"]:
+        if key in list(arg_var2.keys()):
+            list_files.append(arg_var2[key])
+    return file_fingerprint(list_files)
+
+
+def dive_down_fields_load(directory):
+    """
+    #################################################################################
+    Description:
+    Reads the list of the fields saved for the dive down diagnostics in the given directory (fields.json), the
+    directory is created if it does not exist
+    #################################################################################
+    """
+    if OSpath__isdir(directory) is False:
+        OSmakedirs(directory)
+    if OSpath__isfile(OSpath__join(directory, "fields.json")) is False:
+        return dict()
+    with open(OSpath__join(directory, "fields.json")) as ff:
+        fields = json.load(ff)
+    return fields
+
+
+def dive_down_fields_save(directory, fields):
+    """
+    #################################################################################
+    Description:
+    Saves the list of the fields saved for the dive down diagnostics in the given directory (fields.json)
+    #################################################################################
+    """
+    with open(OSpath__join(directory, "fields.json"), "w") as ff:
+        json.dump(fields, ff, indent=4, sort_keys=True)
+    return
+
+
+def reference_fields_start(bundle, dive_down_fields=None):
+    """
+    #################################################################################
+    Description:
+    Reads the observational fields saved with the reference bundle instead of the files (see StartReferenceFields),
+    saves the new ones if the bundle is being built (see BuildReferenceBundle)
+    If fields are saved for the dive down diagnostics (see ComputeCollection), they are used instead of the bundle
+    ones and the fields read from the given files are added (if dive_down_fields contains 'files')
+    The files are read again if no bundle (or a bundle without fields) is given
+    #################################################################################
+    """
+    if dive_down_fields is not None:
+        StartReferenceFields(dive_down_fields["directory"], dive_down_fields["fields"],
+                             update=dive_down_fields.get("files") is not None, list_files=dive_down_fields.get("files"))
+    elif bundle is None or "fields" not in list(bundle.keys()) or "fields_directory" not in list(bundle.keys()):
+        StopReferenceFields()
+    else:
+        StartReferenceFields(bundle["fields_directory"], bundle["fields"], update=bundle.get("update") is True,
+                             list_files=bundle.get("fields_files"), portable=bundle.get("portable", False) is True)
+    return
+
+
 def group_json_obs(pattern, json_name_out, metric_name):
     list_files = sorted(list(GLOBiglob(pattern)), key=lambda v: v.upper())
     for file1 in list_files:
@@ -449,7 +1423,31 @@ def save_json_obs(dict_in, json_name):
 
 def ComputeCollection_ObsOnly(metricCollection, dictDatasets, user_regridding={}, debug=False, dive_down=False,
                               netcdf=False, netcdf_name="", observed_fyear=None, observed_lyear=None,
-                              modeled_fyear=None, modeled_lyear=None, obs_interpreter=None):
+                              modeled_fyear=None, modeled_lyear=None, obs_interpreter=None, nbr_processes=1):
+    """
+    The ComputeCollection_ObsOnly() function computes all the diagnostics / metrics associated with the given Metric
+    Collection, using successively each observational dataset as model and comparing it with all the other
+    observational datasets
+
+    The diagnostics of the observational datasets are computed once per metric (with the first datasets used as model)
+    and reused for all the other datasets (see reference bundle in ComputeMetric), the datasets used as model can be
+    computed in parallel
+    If netcdf is True, the dive down variables of the reused diagnostics are copied from the NetCDFs of the first two
+    datasets
+    All the results are saved in one json file (netcdf_name with 'OBSNAME' replaced by 'observation')
+
+    Inputs:
+    ------
+    see ComputeCollection, except:
+    :param netcdf_name: string
+        path_to/filename of the files, must contain 'OBSNAME' (replaced by the name of the dataset)
+    :param nbr_processes: integer, optional
+        number of processes used to compute the datasets used as model
+        default value = 1, all the datasets are computed successively
+
+    :return: dict
+        values and metadata of all the datasets used as model (and dive-down values and metadata if dive_down is True)
+    """
     dict_mc = defCollection(metricCollection)
     dict_col_meta = {
         "name": dict_mc["long_name"], "description_of_the_collection": dict_mc["description"], "metrics": {},
@@ -533,21 +1531,13 @@ def ComputeCollection_ObsOnly(metricCollection, dictDatasets, user_regridding={}
                     except:
                         obsInterpreter2.append(obs)
         # observations as model
-        print(obsNameVar1)
-        print(obsNameVar2)
+        list_tasks = list()
         for ii in range(len(obsFileArea1)):
             modelName = obsNameVar1[ii]
-            modelFile1 = obsFile1[ii]
-            modelVarName1 = obsVarName1[ii]
-            modelFileArea1 = obsFileArea1[ii]
-            modelAreaName1 = obsAreaName1[ii]
-            modelFileLandmask1 = obsFileLandmask1[ii]
-            modelLandmaskName1 = obsLandmaskName1[ii]
-            modelInterpreter1 = obsInterpreter1[ii]
             arg_var2 = {
-                "modelFileArea1": modelFileArea1, "modelAreaName1": modelAreaName1,
-                "modelFileLandmask1": modelFileLandmask1, "modelLandmaskName1": modelLandmaskName1,
-                "modelInterpreter1": modelInterpreter1, "obsFileArea1": obsFileArea1, "obsAreaName1": obsAreaName1,
+                "modelFileArea1": obsFileArea1[ii], "modelAreaName1": obsAreaName1[ii],
+                "modelFileLandmask1": obsFileLandmask1[ii], "modelLandmaskName1": obsLandmaskName1[ii],
+                "modelInterpreter1": obsInterpreter1[ii], "obsFileArea1": obsFileArea1, "obsAreaName1": obsAreaName1,
                 "obsFileLandmask1": obsFileLandmask1, "obsLandmaskName1": obsLandmaskName1,
                 "obsInterpreter1": obsInterpreter1, "observed_fyear": observed_fyear, "observed_lyear": observed_lyear,
                 "modeled_fyear": modeled_fyear, "modeled_lyear": modeled_lyear}
@@ -578,86 +1568,122 @@ def ComputeCollection_ObsOnly(metricCollection, dictDatasets, user_regridding={}
                     arg_var2["obsFileLandmask2"] = obsFileLandmask2
                     arg_var2["obsLandmaskName2"] = obsLandmaskName2
                     arg_var2["obsInterpreter2"] = obsInterpreter2
+                if "EnsoSstMap" in metric and modelName2 in sst_only:
+                    continue
                 if netcdf is True:
                     netcdf_name_out = netcdf_name.replace("OBSNAME", modelName2)
                 else:
                     netcdf_name_out = ""
-                json_name_out = netcdf_name.replace("OBSNAME", "tmp1_" + modelName2 + "_" + metric)
-                if ("EnsoSstMap" in metric and modelName2 in sst_only) or \
-                        len(list(GLOBiglob(json_name_out + ".json"))) == 1:
-                    pass
-                else:
-                    print(modelName2 + "_as_model")
-                    valu, vame, dive, dime = ComputeMetric(
-                        metricCollection, metric, modelName2, modelFile1, modelVarName1, obsNameVar1,
-                        obsFile1, obsVarName1, dict_regions[list_variables[0]], user_regridding=user_regridding,
-                        debug=debug, netcdf=netcdf, netcdf_name=netcdf_name_out, obs_interpreter=obs_interpreter,
-                        **arg_var2)
-                    keys1 = list(valu.keys())
-                    keys2 = list(set([kk.replace("value", "").replace("__", "").replace("_error", "")
-                                      for ll in list(valu[keys1[0]].keys()) for kk in list(valu[keys1[0]][ll].keys())]))
-                    if len(keys2) > 1:
-                        for kk in keys2:
-                            mm1, dd1 = dict(), dict()
-                            keys3 = list(valu["metric"].keys())
-                            for ll in keys3:
-                                mm1[ll] = {"value": valu["metric"][ll][kk + "__value"],
-                                           "value_error": valu["metric"][ll][kk + "__value_error"]}
-                            keys3 = list(valu["diagnostic"].keys())
-                            for ll in keys3:
-                                dd1[ll] = {"value": valu["diagnostic"][ll][kk + "__value"],
-                                           "value_error": valu["diagnostic"][ll][kk + "__value_error"]}
-                            mm2 = dict(
-                                (ll, vame["metric"][ll]) for ll in list(vame["metric"].keys()) if "units" not in ll)
-                            mm2["units"] = vame["metric"][kk + "__units"]
-                            dict1 = {"metric": mm1, "diagnostic": dd1}
-                            dict2 = {"metric": mm2, "diagnostic": vame["diagnostic"]}
-                            try:
-                                dict_col_valu[modelName2]
-                            except:
-                                dict_col_valu[modelName2] = {metric + kk: dict1}
-                                dict_col_meta[modelName2] = {"metrics": {metric + kk: dict2}}
-                                dict_col_dd_valu[modelName2] = {metric + kk: dive}
-                                dict_col_dd_meta[modelName2] = {"metrics": {metric + kk: dime}}
-                            else:
-                                dict_col_valu[modelName2][metric + kk] = dict1
-                                dict_col_meta[modelName2]["metrics"][metric + kk] = dict2
-                                dict_col_dd_valu[modelName2][metric + kk] = dive
-                                dict_col_dd_meta[modelName2]["metrics"][metric + kk] = dime
-                            del dd1, dict1, dict2, keys3, mm1, mm2
-                    else:
+                list_tasks.append(
+                    [metricCollection, metric, modelName2, obsFile1[ii], obsVarName1[ii], obsNameVar1, obsFile1,
+                     obsVarName1, dict_regions[list_variables[0]], user_regridding, debug, netcdf, netcdf_name_out,
+                     obs_interpreter, deepcopy(arg_var2)])
+                del modelName2, netcdf_name_out
+            del arg_var2, modelName, nbr
+        if len(list_tasks) > 0:
+            # the first two datasets compute (and save in the bundle) the diagnostics of all the observations, the
+            # others compute only their own diagnostic and read the observations in the bundle
+            bundle = {"version": __version__, "entries": dict(), "update": True}
+            list_results = [compute_metric_obs_only(task + [bundle]) for task in list_tasks[:2]]
+            bundle["update"] = False
+            list_tasks = [task + [bundle] for task in list_tasks[2:]]
+            if nbr_processes > 1 and len(list_tasks) > 1:
+                pool = MULTIPROCESSINGpool(min(nbr_processes, len(list_tasks)))
+                list_results += pool.map(compute_metric_obs_only, list_tasks)
+                pool.close()
+                pool.join()
+                del pool
+            else:
+                list_results += [compute_metric_obs_only(task) for task in list_tasks]
+            for modelName2, valu, vame, dive, dime in list_results:
+                keys1 = list(valu.keys())
+                keys2 = list(set([kk.replace("value", "").replace("__", "").replace("_error", "")
+                                  for ll in list(valu[keys1[0]].keys()) for kk in list(valu[keys1[0]][ll].keys())]))
+                if len(keys2) > 1:
+                    for kk in keys2:
+                        mm1, dd1 = dict(), dict()
+                        keys3 = list(valu["metric"].keys())
+                        for ll in keys3:
+                            mm1[ll] = {"value": valu["metric"][ll][kk + "__value"],
+                                       "value_error": valu["metric"][ll][kk + "__value_error"]}
+                        keys3 = list(valu["diagnostic"].keys())
+                        for ll in keys3:
+                            dd1[ll] = {"value": valu["diagnostic"][ll][kk + "__value"],
+                                       "value_error": valu["diagnostic"][ll][kk + "__value_error"]}
+                        mm2 = dict((ll, vame["metric"][ll]) for ll in list(vame["metric"].keys()) if "units" not in ll)
+                        mm2["units"] = vame["metric"][kk + "__units"]
+                        dict1 = {"metric": mm1, "diagnostic": dd1}
+                        dict2 = {"metric": mm2, "diagnostic": vame["diagnostic"]}
                         try:
                             dict_col_valu[modelName2]
                         except:
-                            dict_col_valu[modelName2] = {metric: valu}
-                            dict_col_meta[modelName2] = {"metrics": {metric: vame}}
-                            dict_col_dd_valu[modelName2] = {metric: dive}
-                            dict_col_dd_meta[modelName2] = {"metrics": {metric: dime}}
+                            dict_col_valu[modelName2] = {metric + kk: dict1}
+                            dict_col_meta[modelName2] = {"metrics": {metric + kk: dict2}}
+                            dict_col_dd_valu[modelName2] = {metric + kk: dive}
+                            dict_col_dd_meta[modelName2] = {"metrics": {metric + kk: dime}}
                         else:
-                            dict_col_valu[modelName2][metric] = valu
-                            dict_col_meta[modelName2]["metrics"][metric] = vame
-                            dict_col_dd_valu[modelName2][metric] = dive
-                            dict_col_dd_meta[modelName2]["metrics"][metric] = dime
-                    # save json
-                    dict_out = {modelName2: {
-                        "r1i1p1": {"value": dict_col_valu[modelName2], "metadata": dict_col_meta[modelName2]}}}
-                    save_json_obs(dict_out, json_name_out)
-                    del dict_out, dime, dive, keys1, keys2, valu
-                del json_name_out, modelName2, netcdf_name_out
-            del arg_var2, modelName, modelFile1, modelVarName1, modelFileArea1, modelAreaName1, modelFileLandmask1, \
-                modelLandmaskName1, modelInterpreter1, nbr
-        # read all jsons and group them
-        pattern = netcdf_name.replace("OBSNAME", "tmp1_*_" + metric + ".json")
-        json_name_out = netcdf_name.replace("OBSNAME", "tmp2_" + metric)
-        group_json_obs(pattern, json_name_out, metric)
-        del dict_regions, json_name_out, list_variables, obsAreaName1, obsAreaName2, obsFile1, obsFile2, obsFileArea1, \
-            obsFileArea2, obsFileLandmask1, obsFileLandmask2, obsInterpreter1, obsInterpreter2, obsLandmaskName1,\
-            obsLandmaskName2, obsNameVar1, obsNameVar2, obsVarName1, obsVarName2, pattern
-    # read all jsons and group them
-    pattern = netcdf_name.replace("OBSNAME", "tmp2_*.json")
-    json_name_out = netcdf_name.replace("OBSNAME", "observation")
-    group_json_obs(pattern, json_name_out, "all")
-    return
+                            dict_col_valu[modelName2][metric + kk] = dict1
+                            dict_col_meta[modelName2]["metrics"][metric + kk] = dict2
+                            dict_col_dd_valu[modelName2][metric + kk] = dive
+                            dict_col_dd_meta[modelName2]["metrics"][metric + kk] = dime
+                        del dd1, dict1, dict2, keys3, mm1, mm2
+                else:
+                    try:
+                        dict_col_valu[modelName2]
+                    except:
+                        dict_col_valu[modelName2] = {metric: valu}
+                        dict_col_meta[modelName2] = {"metrics": {metric: vame}}
+                        dict_col_dd_valu[modelName2] = {metric: dive}
+                        dict_col_dd_meta[modelName2] = {"metrics": {metric: dime}}
+                    else:
+                        dict_col_valu[modelName2][metric] = valu
+                        dict_col_meta[modelName2]["metrics"][metric] = vame
+                        dict_col_dd_valu[modelName2][metric] = dive
+                        dict_col_dd_meta[modelName2]["metrics"][metric] = dime
+                del dime, dive, keys1, keys2, modelName2, valu, vame
+            del bundle, list_results
+        del dict_regions, list_tasks, list_variables, obsAreaName1, obsAreaName2, obsFile1, obsFile2, obsFileArea1, \
+            obsFileArea2, obsFileLandmask1, obsFileLandmask2, obsInterpreter1, obsInterpreter2, obsLandmaskName1, \
+            obsLandmaskName2, obsNameVar1, obsNameVar2, obsVarName1, obsVarName2
+    # save all results in one json
+    dict_out = dict((dataset, {"r1i1p1": {"value": dict_col_valu[dataset], "metadata": dict_col_meta[dataset]}})
+                    for dataset in list(dict_col_valu.keys()))
+    save_json_obs(dict_out, netcdf_name.replace("OBSNAME", "observation"))
+    if dive_down is True:
+        return {"value": dict_col_valu, "metadata": dict_col_meta}, \
+               {"value": dict_col_dd_valu, "metadata": dict_col_dd_meta}
+    else:
+        return {"value": dict_col_valu, "metadata": dict_col_meta}
+
+
+def compute_metric_obs_only(list_arguments):
+    """
+    #################################################################################
+    Description:
+    Computes one metric for one observational dataset (used as model), see ComputeCollection_ObsOnly
+    Takes all the arguments in one list to be usable with multiprocessing.Pool.map
+    #################################################################################
+
+    :param list_arguments: list
+        [metricCollection, metric, modelName, modelFile1, modelVarName1, obsNameVar1, obsFile1, obsVarName1,
+        regionVar1, user_regridding, debug, netcdf, netcdf_name, obs_interpreter, other keyword arguments (dict),
+        reference_bundle]
+    :return: [modelName, values, metadata, dive-down values, dive-down metadata]
+    """
+    metricCollection, metric, modelName, modelFile1, modelVarName1, obsNameVar1, obsFile1, obsVarName1, regionVar1, \
+        user_regridding, debug, netcdf, netcdf_name, obs_interpreter, kwargs, reference_bundle = list_arguments
+    print("\033[94m" + str().ljust(5) + "ComputeCollection_ObsOnly: " + str(modelName) + " as model" + "\033[0m")
+    if netcdf is True:
+        StartNetcdfBuffer()
+    try:
+        valu, vame, dive, dime = ComputeMetric(
+            metricCollection, metric, modelName, modelFile1, modelVarName1, obsNameVar1, obsFile1, obsVarName1,
+            regionVar1, user_regridding=user_regridding, debug=debug, netcdf=netcdf, netcdf_name=netcdf_name,
+            obs_interpreter=obs_interpreter, reference_bundle=reference_bundle, **kwargs)
+    finally:
+        if netcdf is True:
+            FlushNetcdfBuffer()
+    return [modelName, valu, vame, dive, dime]
 
 # ---------------------------------------------------------------------------------------------------------------------#
 
@@ -709,6 +1735,109 @@ dict_twoVar = {
     "EnsoFbSstThf": EnsoFbSstThf, "EnsoFbTauxSsh": EnsoFbTauxSsh, "EnsodSstOce": EnsodSstOce,
 }
 
+# heat flux feedbacks that can be computed together by EnsoFbSstHeatFluxes (see heat_flux_diagnostic)
+dict_heat_flux = {
+    "EnsoFbSstLhf": "lhf", "EnsoFbSstLwr": "lwr", "EnsoFbSstShf": "shf", "EnsoFbSstSwr": "swr", "EnsoFbSstThf": "thf",
+}
+
+
+def heat_flux_key(metric, list_arguments, dataset, keyarg):
+    """
+    #################################################################################
+    Description:
+    Key of a heat flux feedback diagnostic in a heat flux batch: metric, dataset, files and parameters (the keyargs
+    specific to the metric are excluded)
+    #################################################################################
+    """
+    return json.dumps([metric, dataset, list_arguments, heat_flux_parameters(keyarg)], sort_keys=True, default=str)
+
+
+def heat_flux_parameters(dict_metric):
+    """
+    #################################################################################
+    Description:
+    Parameters of a metric (of the collection or keyargs), without its variables, regions and observations
+    #################################################################################
+    """
+    return dict((arg, dict_metric[arg]) for arg in list(dict_metric.keys())
+                if arg not in ["obs_name", "regions", "variables"])
+
+
+def heat_flux_diagnostic(heat_flux_batch, metric, list_arguments, dataset, flux_dataset, keyarg, debug=False):
+    """
+    #################################################################################
+    Description:
+    Diagnostic of a heat flux feedback (EnsoFbSstLhf, EnsoFbSstLwr, EnsoFbSstShf, EnsoFbSstSwr, EnsoFbSstThf) without
+    dive down
+    The first heat flux feedback computed for a dataset computes with EnsoFbSstHeatFluxes (SST read once) all the heat
+    flux feedbacks of the collection using the same SST and parameters, the others take their diagnostic in the batch
+    #################################################################################
+
+    :param heat_flux_batch: dict or None
+        {'datasets': dictDatasets, 'metrics_list': metrics of the collection, 'metrics': metrics to compute,
+        'user_regridding': user_regridding, 'results': {}} (see ComputeCollection)
+    :param metric: string
+        name of the metric in the collection
+    :param list_arguments: list
+        [sstfile, sstname, sstareafile, sstareaname, sstlandmaskfile, sstlandmaskname, sstbox, fluxfile, fluxname,
+        fluxareafile, fluxareaname, fluxlandmaskfile, fluxlandmaskname, fluxbox] (as given to EnsoFbSstLhf)
+    :param dataset: string
+        name of the dataset (e.g., 'model', 'obs1_obs2')
+    :param flux_dataset: list
+        ['model', modelName] or ['observations', obsName], where the other heat fluxes are found in dictDatasets
+    :param keyarg: dict
+        keyargs of the metric
+    :return: dict or None
+        output of the heat flux feedback, None if heat_flux_batch is None or if metric is not a heat flux feedback
+    """
+    if heat_flux_batch is None or metric not in list(dict_heat_flux.keys()):
+        return None
+    key = heat_flux_key(metric, list_arguments, dataset, keyarg)
+    if key not in list(heat_flux_batch["results"].keys()):
+        dict_m = heat_flux_batch["metrics_list"]
+        dict_regridding = heat_flux_batch["user_regridding"]
+        dict_flux, dict_keys = dict(), dict()
+        for met in heat_flux_batch["metrics"]:
+            if met not in list(dict_heat_flux.keys()) or \
+                    dict_m[met]["regions"][dict_m[met]["variables"][0]] != list_arguments[6] or \
+                    heat_flux_parameters(dict_m[met]) != heat_flux_parameters(dict_m[metric]) or \
+                    dict_regridding.get(met) != dict_regridding.get(metric):
+                continue
+            if met == metric:
+                flux_arguments = list(list_arguments[7:])
+            else:
+                var = dict_m[met]["variables"][1]
+                try:
+                    dict_var = heat_flux_batch["datasets"][flux_dataset[0]][flux_dataset[1]][var]
+                    flux_arguments = [dict_var["path + filename"], dict_var["varname"]]
+                except:
+                    continue
+                if "path + filename_area" in list(dict_var.keys()):
+                    flux_arguments += [dict_var["path + filename_area"], dict_var["areaname"]]
+                else:
+                    flux_arguments += [None, None]
+                if "path + filename_landmask" in list(dict_var.keys()):
+                    flux_arguments += [dict_var["path + filename_landmask"], dict_var["landmaskname"]]
+                else:
+                    flux_arguments += [None, None]
+                flux_arguments.append(dict_m[met]["regions"][var])
+                del dict_var, var
+            dict_flux[dict_heat_flux[met]] = {
+                "file": flux_arguments[0], "name": flux_arguments[1], "areafile": flux_arguments[2],
+                "areaname": flux_arguments[3], "landmaskfile": flux_arguments[4], "landmaskname": flux_arguments[5],
+                "box": flux_arguments[6]}
+            dict_keys[dict_heat_flux[met]] = heat_flux_key(met, list(list_arguments[:7]) + flux_arguments, dataset,
+                                                           keyarg)
+            del flux_arguments
+        print("\033[94m" + str().ljust(5) + "ComputeMetric: heat flux feedbacks " + str(sorted(dict_flux.keys())) +
+              " = " + str(dataset) + "\033[0m")
+        dict_out = EnsoFbSstHeatFluxes(*list_arguments[:7], dict_flux=dict_flux, dataset=dataset, debug=debug, **keyarg)
+        for flux in list(dict_out.keys()):
+            heat_flux_batch["results"][dict_keys[flux]] = dict_out[flux]
+        del dict_flux, dict_keys, dict_m, dict_out, dict_regridding
+    # each diagnostic is used once
+    return heat_flux_batch["results"].pop(key)
+
 
 def ComputeMetric(metricCollection, metric, modelName, modelFile1, modelVarName1, obsNameVar1, obsFile1, obsVarName1,
                   regionVar1, modelFileArea1="", modelAreaName1="", modelFileLandmask1="", modelLandmaskName1="",
@@ -718,7 +1847,8 @@ def ComputeMetric(metricCollection, metric, modelName, modelFile1, modelVarName1
                   obsVarName2="", obsFileArea2="", obsAreaName2="", obsFileLandmask2="", obsLandmaskName2="",
                   regionVar2="", obsInterpreter2=None, user_regridding={}, debug=False, netcdf=False, netcdf_name="",
                   observed_fyear=None, observed_lyear=None, modeled_fyear=None, modeled_lyear=None,
-                  obs_interpreter=None):
+                  obs_interpreter=None, reference_bundle=None, heat_flux_batch=None,
+                  dive_down_fields=None):
     """
     :param metricCollection: string
         name of a Metric Collection, must be defined in EnsoCollectionsLib.defCollection()
@@ -855,9 +1985,28 @@ def ComputeMetric(metricCollection, metric, modelName, modelFile1, modelVarName1
         the only possibility is 'CMIP' to interpret all observational's variables as CMIP (datasets have been CMORized)
         default value = None, observational datasets are considered not CMORized and will be interpreted as defined in
         EnsoCollectionsLib.ReferenceObservations
+    :param reference_bundle: dict, optional
+        precomputed observational diagnostics (see load_reference_bundle), an observational diagnostic is taken from
+        the bundle (without reading the observations) if it has been computed with the same parameters and files (if
+        NetCDFs are saved, its dive down variables are copied from the NetCDFs written when it was computed, see
+        ComputeCollection_ObsOnly)
+        the observational fields saved with the bundle are read instead of the files (see reference_fields_start)
+        default value = None, all observational diagnostics are computed from the files
+    :param heat_flux_batch: dict, optional
+        if given, the heat flux feedbacks (EnsoFbSstLhf, EnsoFbSstLwr, EnsoFbSstShf, EnsoFbSstSwr, EnsoFbSstThf) of
+        the collection are computed together (see heat_flux_diagnostic), not used if netcdf is True
+        default value = None, the metric is computed alone
+    :param dive_down_fields: dict, optional
+        fields saved for the dive down diagnostics {'directory': path_to/directory, 'fields': fields.json content,
+        'files': files whose fields are saved (optional)}, see ComputeCollection(..., dive_down_recipe=directory) and
+        ComputeCollectionDiveDown
+        default value = None, the fields are not saved
 
     :return:
     """
+    # observational fields saved with the reference bundle, or fields saved for the dive down diagnostics
+    reference_fields_start(reference_bundle, dive_down_fields=dive_down_fields)
+    bundle_portable = reference_bundle.get("portable", False) is True if reference_bundle is not None else False
     tmp_metric = deepcopy(metric)
     metric = metric.replace("_1", "").replace("_2", "").replace("_3", "").replace("_4", "").replace("_5", "")
     if metric.split("_")[-1] in list(ReferenceRegions().keys()):
@@ -1087,11 +2236,17 @@ def ComputeMetric(metricCollection, metric, modelName, modelFile1, modelVarName1
                 # computes diagnostic that needs two variables
                 print("\033[94m" + str().ljust(5) + "ComputeMetric: twoVarmetric = " + str(modelName) + "\033[0m")
                 keyarg["project_interpreter_var2"] = keyarg["project_interpreter_mod_var2"]
-                diagnostic1 = dict_twoVar[metric](
-                    modelFile1, modelVarName1, modelFileArea1, modelAreaName1, modelFileLandmask1, modelLandmaskName1,
-                    regionVar1, modelFile2, modelVarName2, modelFileArea2, modelAreaName2, modelFileLandmask2,
-                    modelLandmaskName2, regionVar2, dataset=modelName, debug=debug, netcdf=netcdf,
-                    netcdf_name=netcdf_name, metname=tmp_metric, **keyarg)
+                diagnostic1 = None if netcdf is True else heat_flux_diagnostic(
+                    heat_flux_batch, tmp_metric,
+                    [modelFile1, modelVarName1, modelFileArea1, modelAreaName1, modelFileLandmask1, modelLandmaskName1,
+                     regionVar1, modelFile2, modelVarName2, modelFileArea2, modelAreaName2, modelFileLandmask2,
+                     modelLandmaskName2, regionVar2], modelName, ["model", modelName], keyarg, debug=debug)
+                if diagnostic1 is None:
+                    diagnostic1 = dict_twoVar[metric](
+                        modelFile1, modelVarName1, modelFileArea1, modelAreaName1, modelFileLandmask1,
+                        modelLandmaskName1, regionVar1, modelFile2, modelVarName2, modelFileArea2, modelAreaName2,
+                        modelFileLandmask2, modelLandmaskName2, regionVar2, dataset=modelName, debug=debug,
+                        netcdf=netcdf, netcdf_name=netcdf_name, metname=tmp_metric, **keyarg)
             else:
                 diagnostic1 = None
                 list_strings = ["ERROR" + EnsoErrorsWarnings.message_formating(INSPECTstack()) + ": metric",
@@ -1132,12 +2287,25 @@ def ComputeMetric(metricCollection, metric, modelName, modelFile1, modelVarName1
                 if metric in list(dict_oneVar.keys()):
                     output_name = deepcopy(obsNameVar1[ii])
                     if output_name != modelName:
-                        print("\033[94m" + str().ljust(5) + "ComputeMetric: oneVarmetric = " + str(output_name) +
-                              "\033[0m")
-                        diag_obs[output_name] = dict_oneVar[metric](
-                            obsFile1[ii], obsVarName1[ii], obsFileArea1[ii], obsAreaName1[ii], obsFileLandmask1[ii],
-                            obsLandmaskName1[ii], regionVar1, dataset=output_name, debug=debug, netcdf=netcdf,
-                            netcdf_name=netcdf_name, metname=tmp_metric, **keyarg)
+                        bundle_key = reference_bundle_key(metricCollection, tmp_metric, output_name, keyarg)
+                        bundle_fp = file_fingerprint(
+                            [obsFile1[ii], obsFileArea1[ii], obsFileLandmask1[ii]], portable=bundle_portable)
+                        diag_obs[output_name] = reference_bundle_read(
+                            reference_bundle, bundle_key, bundle_fp,
+                            netcdf_name=netcdf_name if netcdf is True else None)
+                        if diag_obs[output_name] is None:
+                            buffer_state = NetcdfBufferState() if netcdf is True else None
+                            print("\033[94m" + str().ljust(5) + "ComputeMetric: oneVarmetric = " + str(output_name) +
+                                  "\033[0m")
+                            diag_obs[output_name] = dict_oneVar[metric](
+                                obsFile1[ii], obsVarName1[ii], obsFileArea1[ii], obsAreaName1[ii], obsFileLandmask1[ii],
+                                obsLandmaskName1[ii], regionVar1, dataset=output_name, debug=debug, netcdf=netcdf,
+                                netcdf_name=netcdf_name, metname=tmp_metric, **keyarg)
+                            reference_bundle_write(
+                                reference_bundle, bundle_key, bundle_fp, diag_obs[output_name],
+                                netcdf_files=NetcdfBufferAdded(buffer_state), netcdf_name=netcdf_name)
+                            del buffer_state
+                        del bundle_fp, bundle_key
                     del output_name
                 elif metric in list(dict_twoVar.keys()):
                     for jj in range(len(obsNameVar2)):
@@ -1145,14 +2313,36 @@ def ComputeMetric(metricCollection, metric, modelName, modelFile1, modelVarName1
                         keyarg["project_interpreter_var2"] = \
                             "CMIP" if obs_interpreter == "CMIP" else deepcopy(obsInterpreter2[jj])
                         if output_name != modelName:
-                            print("\033[94m" + str().ljust(5) + "ComputeMetric: twoVarmetric = " + str(output_name) +
-                                  "\033[0m")
-                            diag_obs[output_name] = dict_twoVar[metric](
-                                obsFile1[ii], obsVarName1[ii], obsFileArea1[ii], obsAreaName1[ii], obsFileLandmask1[ii],
-                                obsLandmaskName1[ii], regionVar1, obsFile2[jj], obsVarName2[jj], obsFileArea2[jj],
-                                obsAreaName2[jj], obsFileLandmask2[jj], obsLandmaskName2[jj], regionVar2,
-                                dataset=output_name, debug=debug, netcdf=netcdf, netcdf_name=netcdf_name,
-                                metname=tmp_metric, **keyarg)
+                            bundle_key = reference_bundle_key(metricCollection, tmp_metric, output_name, keyarg)
+                            bundle_fp = file_fingerprint(
+                                [obsFile1[ii], obsFileArea1[ii], obsFileLandmask1[ii], obsFile2[jj], obsFileArea2[jj],
+                                 obsFileLandmask2[jj]], portable=bundle_portable)
+                            diag_obs[output_name] = reference_bundle_read(
+                                reference_bundle, bundle_key, bundle_fp,
+                                netcdf_name=netcdf_name if netcdf is True else None)
+                            if diag_obs[output_name] is None:
+                                buffer_state = NetcdfBufferState() if netcdf is True else None
+                                print("\033[94m" + str().ljust(5) + "ComputeMetric: twoVarmetric = " +
+                                      str(output_name) + "\033[0m")
+                                diag_obs[output_name] = None if netcdf is True else heat_flux_diagnostic(
+                                    heat_flux_batch, tmp_metric,
+                                    [obsFile1[ii], obsVarName1[ii], obsFileArea1[ii], obsAreaName1[ii],
+                                     obsFileLandmask1[ii], obsLandmaskName1[ii], regionVar1, obsFile2[jj],
+                                     obsVarName2[jj], obsFileArea2[jj], obsAreaName2[jj], obsFileLandmask2[jj],
+                                     obsLandmaskName2[jj], regionVar2], output_name,
+                                    ["observations", obsNameVar2[jj]], keyarg, debug=debug)
+                                if diag_obs[output_name] is None:
+                                    diag_obs[output_name] = dict_twoVar[metric](
+                                        obsFile1[ii], obsVarName1[ii], obsFileArea1[ii], obsAreaName1[ii],
+                                        obsFileLandmask1[ii], obsLandmaskName1[ii], regionVar1, obsFile2[jj],
+                                        obsVarName2[jj], obsFileArea2[jj], obsAreaName2[jj], obsFileLandmask2[jj],
+                                        obsLandmaskName2[jj], regionVar2, dataset=output_name, debug=debug,
+                                        netcdf=netcdf, netcdf_name=netcdf_name, metname=tmp_metric, **keyarg)
+                                reference_bundle_write(
+                                    reference_bundle, bundle_key, bundle_fp, diag_obs[output_name],
+                                    netcdf_files=NetcdfBufferAdded(buffer_state), netcdf_name=netcdf_name)
+                                del buffer_state
+                            del bundle_fp, bundle_key
                         del output_name
                         del keyarg["project_interpreter_var2"]
                 del keyarg["project_interpreter_var1"]
@@ -1247,5 +2437,6 @@ def ComputeMetric(metricCollection, metric, modelName, modelFile1, modelVarName1
                 "metric": {"name": metric, "method": description_metric, "datasets": datasets, "units": units},
                 "diagnostic": dict_diagnostic_metadata,
             }
+    StopReferenceFields()
     return dict_metrics, dict_metadata, dict_dive_down, dict_dive_down_metadata
 # ---------------------------------------------------------------------------------------------------------------------#
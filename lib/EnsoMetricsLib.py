@@ -13,9 +13,9 @@ from .EnsoUvcdatToolsLib import ArrayListAx, ArrayToList, AverageMeridional, Ave
     Composite, ComputeInterannualAnomalies, ComputePDF, Concatenate, Correlation, DetectEvents, DurationAllEvent,\
     DurationEvent, Event_selection, fill_dict_teleconnection, FindXYMinMaxInTs, get_year_by_year,\
     LinearRegressionAndNonlinearity, LinearRegressionTsAgainstMap, LinearRegressionTsAgainstTs, MinMax, MyEmpty,\
-    OperationMultiply, PreProcessTS, Read_data_mask_area, Read_data_mask_area_multifile, Regrid, RmsAxis,\
-    RmsHorizontal, RmsMeridional, RmsZonal, SaveNetcdf, SeasonalMean, SkewnessTemporal, SlabOcean, Smoothing, Std,\
-    StdMonthly, TimeBounds, TsToMap, TwoVarRegrid
+    OperationMultiply, PreProcessTS, Read_data_mask_area, Read_data_mask_area_multifile, Read_mask_area, Regrid,\
+    RmsAxis, RmsHorizontal, RmsMeridional, RmsZonal, SaveNetcdf, SeasonalMean, SkewnessTemporal, SlabOcean, Smoothing,\
+    Std, StdMonthly, TimeBounds, TsToMap, TwoVarRegrid
 from .KeyArgLib import default_arg_values
 
 
@@ -6676,6 +6676,187 @@ def EnsoFbSstThf(sstfile, sstname, sstareafile, sstareaname, sstlandmaskfile, ss
     return alphaThfMetric
 
 
+def EnsoFbSstHeatFluxes(sstfile, sstname, sstareafile, sstareaname, sstlandmaskfile, sstlandmaskname, sstbox,
+                        dict_flux, dataset='', debug=False, **kwargs):
+    """
+    The EnsoFbSstHeatFluxes() function computes the regression of several heat flux anomalies (lhf, lwr, shf, swr, thf)
+    over 'sstbox' sstA in one call (the scalar value of EnsoFbSstLhf, EnsoFbSstLwr, EnsoFbSstShf, EnsoFbSstSwr and
+    EnsoFbSstThf, without dive down)
+    SST is read once and, for all the fluxes using the same time period, preprocessed once and its moments (all
+    values, sstA>0 and sstA<0) are computed once for all the regressions
+
+    Inputs:
+    ------
+    :param sstfile: string
+        path_to/filename of the file (NetCDF) of SST
+    :param sstname: string
+        name of SST variable (tos, ts) in 'sstfile'
+    :param sstareafile: string
+        path_to/filename of the file (NetCDF) of the areacell for SST
+    :param sstareaname: string
+        name of areacell variable (areacella, areacello) in 'sstareafile'
+    :param sstlandmaskfile: string
+        path_to/filename of the file (NetCDF) of the landmask for SST
+    :param sstlandmaskname: string
+        name of landmask variable (sftlf, lsmask, landmask) in 'sstlandmaskfile'
+    :param sstbox: string
+        name of box (nino3') for SST
+    :param dict_flux: dict
+        dictionary of the fluxes to regress over sstA, the keys must be in 'lhf', 'lwr', 'shf', 'swr', 'thf' and each
+        value is a dictionary with 'file', 'name', 'areafile', 'areaname', 'landmaskfile', 'landmaskname' and 'box' (as
+        the flux arguments of EnsoFbSstLhf)
+        e.g., dict_flux={'lhf': {'file': lhffile, 'name': 'hfls', 'areafile': '', 'areaname': '', 'landmaskfile': '',
+                                 'landmaskname': '', 'box': 'nino3'}}
+    :param dataset: string, optional
+        name of current dataset (e.g., 'model', 'obs', ...)
+    :param debug: bolean, optional
+        default value = False debug mode not activated
+        If want to activate the debug mode set it to True (prints regularly to see the progress of the calculation)
+    usual kwargs:
+    :param detrending: dict, optional
+        see EnsoUvcdatToolsLib.Detrend for options
+        the aim if to specify if the trend must be removed
+        detrending method can be specified
+        default value is False
+    :param frequency: string, optional
+        time frequency of the datasets
+        e.g., frequency='monthly'
+        default value is None
+    :param min_time_steps: int, optional
+        minimum number of time steps for the metric to make sens
+        e.g., for 30 years of monthly data mintimesteps=360
+        default value is None
+    :param normalization: boolean, optional
+        True to normalize by the standard deviation (needs the frequency to be defined), if you don't want it pass
+        anything but true
+        default value is False
+    :param smoothing: dict, optional
+        see EnsoUvcdatToolsLib.Smoothing for options
+        the aim if to specify if variables are smoothed (running mean)
+        smoothing axis, window and method can be specified
+        default value is False
+    :param time_bounds: tuple, optional
+        tuple of the first and last dates to extract from the files (strings)
+        e.g., time_bounds=('1979-01-01T00:00:00', '2017-01-01T00:00:00')
+        default value is None
+
+    Output:
+    ------
+    :return dict_metric: dict
+        one entry per flux in 'dict_flux', each entry being the output of the corresponding metric (e.g., EnsoFbSstLhf):
+        name, value, value_error, units, method, nyears, time_frequency, time_period, ref, nonlinearity,
+        nonlinearity_error
+
+    Method:
+    -------
+        uses tools from uvcdat library
+
+    """
+    # test given kwargs
+    needed_kwarg = ['detrending', 'frequency', 'min_time_steps', 'normalization', 'smoothing', 'time_bounds']
+    for arg in needed_kwarg:
+        try:
+            kwargs[arg]
+        except:
+            kwargs[arg] = default_arg_values(arg)
+
+    # Define metric attributes
+    dict_name = {'lhf': 'Lhf-Sst feedback (alpha_lh)', 'lwr': 'Lwr-Sst feedback (alpha_lh)',
+                 'shf': 'Shf-Sst feedback (alpha_lh)', 'swr': 'Swr-Sst feedback (alpha_lh)',
+                 'thf': 'Thf-Sst feedback (alpha)'}
+    dict_metname = {'lhf': 'EnsoFbSstLhf', 'lwr': 'EnsoFbSstLwr', 'shf': 'EnsoFbSstShf', 'swr': 'EnsoFbSstSwr',
+                    'thf': 'EnsoFbSstThf'}
+    Units = 'W/m2/C'
+    Method_NL = 'The nonlinearity is the regression computed when sstA<0 minus the regression computed when sstA>0'
+    Ref = 'Using CDAT regression calculation'
+    metric = 'EnsoFbSstHeatFluxes'
+    unknown = sorted([flux for flux in list(dict_flux.keys()) if flux not in list(dict_name.keys())])
+    if len(unknown) > 0:
+        list_strings = ["ERROR" + EnsoErrorsWarnings.message_formating(INSPECTstack()) + ": flux",
+                        str().ljust(5) + "unknown flux(es): " + str(unknown),
+                        str().ljust(10) + "known fluxes: " + str(sorted(dict_name.keys()))]
+        EnsoErrorsWarnings.my_error(list_strings)
+
+    # Read SST once
+    if debug is True:
+        EnsoErrorsWarnings.debug_mode('\033[92m', metric, 10)
+    sst_read, sst_areacell, keyerror_sst = Read_data_mask_area(
+        sstfile, sstname, 'temperature', metric, sstbox, file_area=sstareafile, name_area=sstareaname,
+        file_mask=sstlandmaskfile, name_mask=sstlandmaskname, maskland=True, maskocean=False, debug=debug, **kwargs)
+
+    # Read and preprocess fluxes, gathered by time period (the same preprocessed SST is used for a given period)
+    dict_metric, dict_period = dict(), dict()
+    for flux in sorted(dict_flux.keys()):
+        dict_ff = dict_flux[flux]
+        Method = 'Regression of ' + dict_ff['box'] + ' ' + flux + 'A over ' + sstbox + ' sstA'
+        if flux in ['lhf', 'shf']:
+            tab, tab_areacell, keyerror2 = Read_data_mask_area(
+                dict_ff['file'], dict_ff['name'], 'heat flux', dict_metname[flux], dict_ff['box'],
+                file_area=dict_ff['areafile'], name_area=dict_ff['areaname'], file_mask=dict_ff['landmaskfile'],
+                name_mask=dict_ff['landmaskname'], maskland=True, maskocean=False, debug=debug, **kwargs)
+        else:
+            tab, tab_areacell, keyerror2 = Read_data_mask_area_multifile(
+                dict_ff['file'], dict_ff['name'], 'heat flux', flux, dict_metname[flux], dict_ff['box'],
+                file_area=dict_ff['areafile'], name_area=dict_ff['areaname'], file_mask=dict_ff['landmaskfile'],
+                name_mask=dict_ff['landmaskname'], maskland=True, maskocean=False, debug=debug,
+                interpreter='project_interpreter_var2', **kwargs)
+        # Checks if the same time period is used for both variables and if the minimum number of time steps is
+        # respected
+        sst, tab, keyerror3 = CheckTime(
+            deepcopy(sst_read), tab, metric_name=dict_metname[flux], debug=debug, **kwargs)
+        # Number of years
+        yearN = int(round(sst.shape[0] / 12))
+        # Time period
+        actualtimebounds = TimeBounds(sst)
+        dict_metric[flux] = {
+            'name': dict_name[flux], 'value': None, 'value_error': None, 'units': Units, 'method': Method,
+            'method_nonlinearity': Method_NL, 'nyears': yearN, 'time_frequency': kwargs['frequency'],
+            'time_period': actualtimebounds, 'ref': Ref, 'nonlinearity': None, 'nonlinearity_error': None,
+            'keyerror': '', 'dive_down_diag': {'value': None, 'axis': None}}
+        if keyerror_sst is not None or keyerror2 is not None or keyerror3 is not None:
+            dict_metric[flux]['keyerror'] = add_up_errors([keyerror_sst, keyerror2, keyerror3])
+            continue
+        # Preprocess flux (computes anomalies, normalizes, detrends TS, smooths TS, averages horizontally)
+        tab, _, keyerror2 = PreProcessTS(
+            tab, '', areacell=tab_areacell, average='horizontal', compute_anom=True, region=dict_ff['box'], **kwargs)
+        del tab_areacell
+        if keyerror2 is not None:
+            dict_metric[flux]['keyerror'] = add_up_errors([keyerror2])
+            continue
+        if str(actualtimebounds) not in list(dict_period.keys()):
+            dict_period[str(actualtimebounds)] = {'sst': sst, 'flux': list()}
+        dict_period[str(actualtimebounds)]['flux'].append([flux, tab])
+        del sst, tab
+
+    # Regressions of all the fluxes using the same time period at once
+    for period in sorted(dict_period.keys()):
+        list_flux = [flux for flux, _ in dict_period[period]['flux']]
+        # Preprocess SST (computes anomalies, normalizes, detrends TS, smooths TS, averages horizontally)
+        sst, info, keyerror1 = PreProcessTS(
+            dict_period[period]['sst'], '', areacell=sst_areacell, average='horizontal', compute_anom=True,
+            region=sstbox, **kwargs)
+        if keyerror1 is not None:
+            for flux in list_flux:
+                dict_metric[flux]['keyerror'] = add_up_errors([keyerror1])
+            continue
+        if debug is True:
+            dict_debug = {'axes1': '(sst) ' + str([ax.id for ax in sst.getAxisList()]),
+                          'shape1': '(sst) ' + str(sst.shape), 'time1': '(sst) ' + str(TimeBounds(sst)),
+                          'line1': 'fluxes: ' + str(list_flux)}
+            EnsoErrorsWarnings.debug_mode('\033[92m', 'after PreProcessTS', 15, **dict_debug)
+        # Computes the linear regression for all points, for SSTA >=0 and for SSTA<=0 (for all fluxes at once)
+        list_alpha = LinearRegressionAndNonlinearity(
+            [tab for _, tab in dict_period[period]['flux']], sst, return_stderr=True, return_intercept=True)
+        for flux, (alpha, alphaPos, alphaNeg) in zip(list_flux, list_alpha):
+            dict_metric[flux]['value'], dict_metric[flux]['value_error'] = alpha[0], alpha[1]
+            dict_metric[flux]['method'] = dict_metric[flux]['method'] + info
+            # Non linearities
+            dict_metric[flux]['nonlinearity'] = alphaNeg[0] - alphaPos[0]
+            dict_metric[flux]['nonlinearity_error'] = alphaNeg[1] + alphaPos[1]
+        del list_alpha, sst
+    return dict_metric
+
+
 def EnsoAmpl(sstfile, sstname, sstareafile, sstareaname, sstlandmaskfile, sstlandmaskname, sstbox, dataset='',
              debug=False, netcdf=False, netcdf_name='', metname='', **kwargs):
     """
@@ -6806,38 +6987,29 @@ def EnsoAmpl(sstfile, sstname, sstareafile, sstareaname, sstlandmaskfile, sstlan
             dive_down_diag = {'value': None, 'axis': None}
             if netcdf is True:
                 # additional diagnostic
-                # Read file and select the right region
-                sst1, sst_areacell1, keyerror1 = Read_data_mask_area(
+                # Read file and select the right region (equatorial_pacific is included in
+                # equatorial_pacific_LatExt2, so it is selected afterwards from the same data)
+                sst1, sst_areacell1, keyerror = Read_data_mask_area(
                     sstfile, sstname, 'temperature', metric, 'equatorial_pacific_LatExt2', file_area=sstareafile,
                     name_area=sstareaname, file_mask=sstlandmaskfile, name_mask=sstlandmaskname, maskland=True,
                     maskocean=False, debug=debug, **kwargs)
-                sst2, sst_areacell2, keyerror2 = Read_data_mask_area(
-                    sstfile, sstname, 'temperature', metric, 'equatorial_pacific', file_area=sstareafile,
-                    name_area=sstareaname, file_mask=sstlandmaskfile, name_mask=sstlandmaskname, maskland=True,
-                    maskocean=False, debug=debug, **kwargs)
-                if keyerror1 is not None or keyerror2 is not None:
-                    keyerror = add_up_errors([keyerror1, keyerror2])
-                else:
+                if keyerror is None:
                     # Preprocess variables (computes anomalies, normalizes, detrends TS, smoothes TS, ...)
-                    sst1, _, keyerror1 = PreProcessTS(
+                    sst1, _, keyerror = PreProcessTS(
                         sst1, '', areacell=sst_areacell1, compute_anom=True, region="equatorial_pacific_LatExt2",
                         **kwargs)
-                    sst2, _, keyerror2 = PreProcessTS(
-                        sst2, '', areacell=sst_areacell2, compute_anom=True, region="equatorial_pacific", **kwargs)
-                    del sst_areacell1, sst_areacell2
-                    if keyerror1 is not None or keyerror2 is not None:
-                        keyerror = add_up_errors([keyerror1, keyerror2])
-                    else:
+                    del sst_areacell1
+                    if keyerror is None:
                         if debug is True:
                             dict_debug = {'axes1': '(sst1) ' + str([ax.id for ax in sst1.getAxisList()]),
-                                          'axes2': '(sst2) ' + str([ax.id for ax in sst2.getAxisList()]),
-                                          'shape1': '(sst1) ' + str(sst1.shape), 'shape2': '(sst2) ' + str(sst2.shape),
-                                          'time1': '(sst1) ' + str(TimeBounds(sst1)),
-                                          'time2': '(sst2) ' + str(TimeBounds(sst2))}
+                                          'shape1': '(sst1) ' + str(sst1.shape),
+                                          'time1': '(sst1) ' + str(TimeBounds(sst1))}
                             EnsoErrorsWarnings.debug_mode('\033[92m', 'after PreProcessTS', 10, **dict_debug)
-                        # std
+                        # std (computed point by point, so the equatorial_pacific map is a subset of the larger one)
                         sst1 = Std(sst1)
-                        sst2 = Std(sst2)
+                        dictreg = ReferenceRegions('equatorial_pacific')
+                        sst2 = sst1(latitude=dictreg['latitude'], longitude=dictreg['longitude'])
+                        del dictreg
                         # Regridding
                         if 'regridding' not in list(kwargs.keys()):
                             kwargs['regridding'] = {'regridder': 'cdms', 'regridTool': 'esmf', 'regridMethod': 'linear',
@@ -7579,12 +7751,17 @@ def EnsodSstOce(sstfile, sstname, sstareafile, sstareaname, sstlandmaskfile, sst
     # Read file and select the right region
     if debug is True:
         EnsoErrorsWarnings.debug_mode('\033[92m', metric, 10)
-    enso, enso_areacell, keyerror1 = Read_data_mask_area(
-        sstfile, sstname, 'temperature', metric, region_ev, file_area=sstareafile, name_area=sstareaname,
-        file_mask=sstlandmaskfile, name_mask=sstlandmaskname, maskland=True, maskocean=False, debug=debug, **kwargs)
     sst, sst_areacell, keyerror2 = Read_data_mask_area(
         sstfile, sstname, 'temperature', metric, sstbox, file_area=sstareafile, name_area=sstareaname,
         file_mask=sstlandmaskfile, name_mask=sstlandmaskname, maskland=True, maskocean=False, debug=debug, **kwargs)
+    if region_ev == sstbox:
+        # same file and same region, no need to read it twice
+        enso, enso_areacell, keyerror1 = deepcopy(sst), deepcopy(sst_areacell), deepcopy(keyerror2)
+    else:
+        enso, enso_areacell, keyerror1 = Read_data_mask_area(
+            sstfile, sstname, 'temperature', metric, region_ev, file_area=sstareafile, name_area=sstareaname,
+            file_mask=sstlandmaskfile, name_mask=sstlandmaskname, maskland=True, maskocean=False, debug=debug,
+            **kwargs)
     thf, thf_areacell, keyerror3 = Read_data_mask_area_multifile(
         thffile, thfname, 'heat flux', 'thf', metric, thfbox, file_area=thfareafile, name_area=thfareaname,
         file_mask=thflandmaskfile, name_mask=thflandmaskname, maskland=True, maskocean=False, debug=debug,
@@ -9004,6 +9181,8 @@ def EnsoPrMap(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlandmas
                                   'time1': '(mod) ' + str(TimeBounds(pr_mod)),
                                   'time2': '(obs) ' + str(TimeBounds(pr_obs))}
                     EnsoErrorsWarnings.debug_mode('\033[92m', 'after SeasonalMean', 15, **dict_debug)
+                # seasonal anomalies on the native grids, kept for the dive down (only the landmask differs)
+                pr_mod_sea, pr_obs_sea = pr_mod, pr_obs
 
                 # ------------------------------------------------
                 # 3. Regression map
@@ -9066,116 +9245,91 @@ def EnsoPrMap(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlandmas
                     dive_down_diag = {'model': None, 'observations': None, 'axisLat': None, 'axisLon': None}
 
                     if netcdf is True:
-                        # read
-                        pr_mod, pr_mod_areacell, keyerror_mod1 = Read_data_mask_area(
-                            prfilemod, prnamemod, 'precipitations', metric, prbox, file_area=prareafilemod,
+                        # mask ocean on the seasonal anomalies computed above (preprocessing is done point by point,
+                        # so masking afterwards gives the same field as re-reading and re-processing the files)
+                        pr_mod, _, keyerror_mod = Read_mask_area(
+                            pr_mod_sea, prnamemod, prfilemod, 'precipitations', prbox, file_area=prareafilemod,
                             name_area=prareanamemod, file_mask=prlandmaskfilemod, name_mask=prlandmasknamemod,
-                            maskland=False, maskocean=True, time_bounds=kwargs['time_bounds_mod'], debug=debug,
-                            **kwargs)
-                        pr_obs, pr_obs_areacell, keyerror_obs1 = Read_data_mask_area(
-                            prfileobs, prnameobs, 'precipitations', metric, prbox, file_area=prareafileobs,
+                            maskland=False, maskocean=True, debug=debug, **kwargs)
+                        pr_obs, _, keyerror_obs = Read_mask_area(
+                            pr_obs_sea, prnameobs, prfileobs, 'precipitations', prbox, file_area=prareafileobs,
                             name_area=prareanameobs, file_mask=prlandmaskfileobs, name_mask=prlandmasknameobs,
-                            maskland=False, maskocean=True, time_bounds=kwargs['time_bounds_obs'], debug=debug,
-                            **kwargs)
-                        sst_mod, pr_mod, keyerror_mod2 = CheckTime(
-                            sst_mod, pr_mod, metric_name=metric, debug=debug, **kwargs)
-                        sst_obs, pr_obs, keyerror_obs2 = CheckTime(
-                            sst_obs, pr_obs, metric_name=metric, debug=debug, **kwargs)
-                        if keyerror_mod1 is not None or keyerror_obs1 is not None or \
-                                (keyerror_mod2 is not None or keyerror_obs2 is not None):
-                            keyerror = add_up_errors([keyerror_mod1, keyerror_mod2, keyerror_obs1, keyerror_obs2])
+                            maskland=False, maskocean=True, debug=debug, **kwargs)
+                        del pr_mod_sea, pr_obs_sea
+                        if keyerror_mod is not None or keyerror_obs is not None:
+                            keyerror = add_up_errors([keyerror_mod, keyerror_obs])
                         else:
-                            # process
-                            pr_mod, _, keyerror_mod = PreProcessTS(
-                                pr_mod, '', areacell=pr_mod_areacell, compute_anom=False, region=prbox, **kwargs)
-                            pr_obs, _, keyerror_obs = PreProcessTS(
-                                pr_obs, '', areacell=pr_obs_areacell, compute_anom=False, region=prbox, **kwargs)
-                            del pr_mod_areacell, pr_obs_areacell
-                            if keyerror_mod is not None or keyerror_obs is not None:
-                                keyerror = add_up_errors([keyerror_mod, keyerror_obs])
-                            else:
-                                if debug is True:
-                                    dict_debug = {'axes1': '(mod) ' + str([ax.id for ax in pr_mod.getAxisList()]),
-                                                  'axes2': '(obs) ' + str([ax.id for ax in pr_obs.getAxisList()]),
-                                                  'shape1': '(mod) ' + str(pr_mod.shape),
-                                                  'shape2': '(obs) ' + str(pr_obs.shape),
-                                                  'time1': '(mod) ' + str(TimeBounds(pr_mod)),
-                                                  'time2': '(obs) ' + str(TimeBounds(pr_obs))}
-                                    EnsoErrorsWarnings.debug_mode(
-                                        '\033[92m', 'divedown after PreProcessTS', 15, **dict_debug)
-                                # anomalies
-                                pr_mod = SeasonalMean(pr_mod, season_ev, compute_anom=True)
-                                pr_obs = SeasonalMean(pr_obs, season_ev, compute_anom=True)
-                                if debug is True:
-                                    dict_debug = {'axes1': '(mod) ' + str([ax.id for ax in pr_mod.getAxisList()]),
-                                                  'axes2': '(obs) ' + str([ax.id for ax in pr_obs.getAxisList()]),
-                                                  'shape1': '(mod) ' + str(pr_mod.shape),
-                                                  'shape2': '(obs) ' + str(pr_obs.shape),
-                                                  'time1': '(mod) ' + str(TimeBounds(pr_mod)),
-                                                  'time2': '(obs) ' + str(TimeBounds(pr_obs))}
-                                    EnsoErrorsWarnings.debug_mode(
-                                        '\033[92m', 'divedown after SeasonalMean', 15, **dict_debug)
-                                # regridding
-                                if isinstance(kwargs['regridding'], dict):
-                                    pr_mod, pr_obs, _ = TwoVarRegrid(
-                                        pr_mod, pr_obs, '', region=prbox, **kwargs['regridding'])
-                                    if debug is True:
-                                        dict_debug = {'axes1': '(mod) ' + str([ax.id for ax in pr_mod.getAxisList()]),
-                                                      'axes2': '(obs) ' + str([ax.id for ax in pr_obs.getAxisList()]),
-                                                      'shape1': '(mod) ' + str(pr_mod.shape),
-                                                      'shape2': '(obs) ' + str(pr_obs.shape)}
-                                        EnsoErrorsWarnings.debug_mode(
-                                            '\033[92m', 'divedown after TwoVarRegrid', 15, **dict_debug)
-                                # regression
-                                pr_mod = LinearRegressionTsAgainstMap(pr_mod, enso_mod, return_stderr=False)
-                                pr_obs = LinearRegressionTsAgainstMap(pr_obs, enso_obs, return_stderr=False)
+                            if debug is True:
+                                dict_debug = {'axes1': '(mod) ' + str([ax.id for ax in pr_mod.getAxisList()]),
+                                              'axes2': '(obs) ' + str([ax.id for ax in pr_obs.getAxisList()]),
+                                              'shape1': '(mod) ' + str(pr_mod.shape),
+                                              'shape2': '(obs) ' + str(pr_obs.shape),
+                                              'time1': '(mod) ' + str(TimeBounds(pr_mod)),
+                                              'time2': '(obs) ' + str(TimeBounds(pr_obs))}
+                                EnsoErrorsWarnings.debug_mode(
+                                    '\033[92m', 'divedown after Read_mask_area', 15, **dict_debug)
+                            # regridding
+                            if isinstance(kwargs['regridding'], dict):
+                                pr_mod, pr_obs, _ = TwoVarRegrid(
+                                    pr_mod, pr_obs, '', region=prbox, **kwargs['regridding'])
                                 if debug is True:
                                     dict_debug = {'axes1': '(mod) ' + str([ax.id for ax in pr_mod.getAxisList()]),
                                                   'axes2': '(obs) ' + str([ax.id for ax in pr_obs.getAxisList()]),
                                                   'shape1': '(mod) ' + str(pr_mod.shape),
                                                   'shape2': '(obs) ' + str(pr_obs.shape)}
                                     EnsoErrorsWarnings.debug_mode(
-                                        '\033[92m', 'divedown after LinearRegressionTsAgainstMap', 15, **dict_debug)
-                                list_region = ["africaSE", "americaN", "americaS", "asiaS", "oceania"]
-                                list_met_name = ["RMSE_" + dataset2, "RMSE_error_" + dataset2, "CORR_" + dataset2,
-                                                 "CORR_error_" + dataset2, "STD_" + dataset2, "STD_error_" + dataset2]
-                                # Metrics ENSO regression regional
-                                dict_metric, dict_nc = dict(), dict()
-                                nbr = 3
-                                for ii, reg in enumerate(list_region):
-                                    # select region
-                                    dictreg = ReferenceRegions(reg)
-                                    tmp1 = pr_mod(longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                    tmp2 = pr_obs(longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                    dict_metric, dict_nc = fill_dict_teleconnection(
-                                        tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod, actualtimebounds_obs,
-                                        yearN_mod, yearN_obs, nbr, "reg_pr_over_sst_djf_map_" + reg + "__", reg, Units,
-                                        centered_rmse=centered_rmse, biased_rmse=biased_rmse, dict_metric=dict_metric,
-                                        dict_nc=dict_nc)
-                                    nbr += 2
-                                    del dictreg, tmp1, tmp2
-                                if ".nc" in netcdf_name:
-                                    file_name = deepcopy(netcdf_name).replace(".nc", "_" + metname + ".nc")
-                                else:
-                                    file_name = deepcopy(netcdf_name) + "_" + metname + ".nc"
-                                dict1 = {'units': Units, 'number_of_years_used': yearN_mod,
-                                         'time_period': str(actualtimebounds_mod), 'spatialSTD_' + dataset1: std_mod}
-                                dict2 = {'units': Units, 'number_of_years_used': yearN_obs,
-                                         'time_period': str(actualtimebounds_obs), 'spatialSTD_' + dataset2: std_obs}
-                                dict3 = {'metric_name': Name, 'metric_valueRMSE_' + dataset2: prRmse,
-                                         'metric_valueRMSE_error_' + dataset2: prRmseErr,
-                                         'metric_valueCORR_' + dataset2: prCorr,
-                                         'metric_valueCORR_error_' + dataset2: prCorrErr,
-                                         'metric_valueSTD_' + dataset2: prStd,
-                                         'metric_valueSTD_error_' + dataset2: prStdErr, 'metric_method': Method,
-                                         'metric_reference': Ref, 'frequency': kwargs['frequency']}
-                                dict3.update(dict_metric)
-                                SaveNetcdf(
-                                    file_name, var1=pr_mod_slope, var1_attributes=dict1,
-                                    var1_name='reg_pr_over_sst_map__' + dataset1, var2=pr_obs_slope,
-                                    var2_attributes=dict2, var2_name='reg_pr_over_sst_map__' + dataset2,
-                                    global_attributes=dict3,  **dict_nc)
-                                del dict1, dict2, dict3, dict_metric, dict_nc, file_name, list_met_name, list_region
+                                        '\033[92m', 'divedown after TwoVarRegrid', 15, **dict_debug)
+                            # regression
+                            pr_mod = LinearRegressionTsAgainstMap(pr_mod, enso_mod, return_stderr=False)
+                            pr_obs = LinearRegressionTsAgainstMap(pr_obs, enso_obs, return_stderr=False)
+                            if debug is True:
+                                dict_debug = {'axes1': '(mod) ' + str([ax.id for ax in pr_mod.getAxisList()]),
+                                              'axes2': '(obs) ' + str([ax.id for ax in pr_obs.getAxisList()]),
+                                              'shape1': '(mod) ' + str(pr_mod.shape),
+                                              'shape2': '(obs) ' + str(pr_obs.shape)}
+                                EnsoErrorsWarnings.debug_mode(
+                                    '\033[92m', 'divedown after LinearRegressionTsAgainstMap', 15, **dict_debug)
+                            list_region = ["africaSE", "americaN", "americaS", "asiaS", "oceania"]
+                            list_met_name = ["RMSE_" + dataset2, "RMSE_error_" + dataset2, "CORR_" + dataset2,
+                                             "CORR_error_" + dataset2, "STD_" + dataset2, "STD_error_" + dataset2]
+                            # Metrics ENSO regression regional
+                            list_pairs = list()
+                            for ii, reg in enumerate(list_region):
+                                # select region
+                                dictreg = ReferenceRegions(reg)
+                                tmp1 = pr_mod(longitude=dictreg["longitude"], latitude=dictreg["latitude"])
+                                tmp2 = pr_obs(longitude=dictreg["longitude"], latitude=dictreg["latitude"])
+                                list_pairs.append({
+                                    "tab1": tmp1, "tab2": tmp2, "var_name": "reg_pr_over_sst_djf_map_" + reg + "__",
+                                    "add_name": reg, "units": Units})
+                                del dictreg, tmp1, tmp2
+                            # rmse, correlation and standard deviations of all the maps computed at once
+                            dict_metric, dict_nc = fill_dict_teleconnection(
+                                list_pairs, dataset1, dataset2, actualtimebounds_mod, actualtimebounds_obs, yearN_mod,
+                                yearN_obs, 3, centered_rmse=centered_rmse, biased_rmse=biased_rmse)
+                            del list_pairs
+                            if ".nc" in netcdf_name:
+                                file_name = deepcopy(netcdf_name).replace(".nc", "_" + metname + ".nc")
+                            else:
+                                file_name = deepcopy(netcdf_name) + "_" + metname + ".nc"
+                            dict1 = {'units': Units, 'number_of_years_used': yearN_mod,
+                                     'time_period': str(actualtimebounds_mod), 'spatialSTD_' + dataset1: std_mod}
+                            dict2 = {'units': Units, 'number_of_years_used': yearN_obs,
+                                     'time_period': str(actualtimebounds_obs), 'spatialSTD_' + dataset2: std_obs}
+                            dict3 = {'metric_name': Name, 'metric_valueRMSE_' + dataset2: prRmse,
+                                     'metric_valueRMSE_error_' + dataset2: prRmseErr,
+                                     'metric_valueCORR_' + dataset2: prCorr,
+                                     'metric_valueCORR_error_' + dataset2: prCorrErr,
+                                     'metric_valueSTD_' + dataset2: prStd,
+                                     'metric_valueSTD_error_' + dataset2: prStdErr, 'metric_method': Method,
+                                     'metric_reference': Ref, 'frequency': kwargs['frequency']}
+                            dict3.update(dict_metric)
+                            SaveNetcdf(
+                                file_name, var1=pr_mod_slope, var1_attributes=dict1,
+                                var1_name='reg_pr_over_sst_map__' + dataset1, var2=pr_obs_slope,
+                                var2_attributes=dict2, var2_name='reg_pr_over_sst_map__' + dataset2,
+                                global_attributes=dict3,  **dict_nc)
+                            del dict1, dict2, dict3, dict_metric, dict_nc, file_name, list_met_name, list_region
     if prCorr is not None:
         prCorr = 1 - prCorr
     # Create output
@@ -9662,20 +9816,15 @@ def EnsoPrMapDjf(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstland
                                             [keyerror_mod1, keyerror_mod2, keyerror_obs1, keyerror_obs2])
                                     else:
                                         # Metrics ENSO events global
-                                        dict_metric, dict_nc = dict(), dict()
-                                        nbr = 3
+                                        list_pairs = list()
                                         for jj, (evname, tab1, tab2, ev1, ev2) in enumerate(
                                                 zip(["nino", "nina"], [nino_mod, nina_mod], [nino_obs, nina_obs],
                                                     [nino_mod_years, nina_mod_years],
                                                     [nino_obs_years, nina_obs_years])):
-                                            dict_metric, dict_nc = fill_dict_teleconnection(
-                                                tab1, tab2, dataset1, dataset2, actualtimebounds_mod,
-                                                actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                "pr_" + evname + "_djf_map__", evname, "mm/day",
-                                                centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                dict_metric=dict_metric, dict_nc=dict_nc, ev_name=evname, events1=ev1,
-                                                events2=ev2)
-                                            nbr += 2
+                                            list_pairs.append({
+                                                "tab1": tab1, "tab2": tab2, "var_name": "pr_" + evname + "_djf_map__",
+                                                "add_name": evname, "units": "mm/day", "ev_name": evname,
+                                                "events1": ev1, "events2": ev2})
                                         list_region = ["africaSE", "americaN", "americaS", "asiaS", "oceania"]
                                         for ii, reg in enumerate(list_region):
                                             # select region
@@ -9684,13 +9833,10 @@ def EnsoPrMapDjf(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstland
                                                 longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                             tmp2 = pr_obs_land_slope(
                                                 longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                            dict_metric, dict_nc = fill_dict_teleconnection(
-                                                tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod,
-                                                actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                "reg_pr_over_sst_djf_map_" + reg + "__", reg, Units,
-                                                centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                dict_metric=dict_metric, dict_nc=dict_nc)
-                                            nbr += 2
+                                            list_pairs.append({
+                                                "tab1": tmp1, "tab2": tmp2,
+                                                "var_name": "reg_pr_over_sst_djf_map_" + reg + "__", "add_name": reg,
+                                                "units": Units})
                                             for jj, (evname, tab1, tab2, ev1, ev2) in enumerate(
                                                     zip(["nino", "nina"], [nino_mod_land, nina_mod_land],
                                                         [nino_obs_land, nina_obs_land],
@@ -9700,15 +9846,18 @@ def EnsoPrMapDjf(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstland
                                                     longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                                 tmp2 = tab2(
                                                     longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                                dict_metric, dict_nc = fill_dict_teleconnection(
-                                                    tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod,
-                                                    actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                    "pr_" + evname + "_djf_map_" + reg + "__", evname + "_" + reg,
-                                                    "mm/day", centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                    dict_metric=dict_metric, dict_nc=dict_nc, ev_name=evname,
-                                                    events1=ev1, events2=ev2)
-                                                nbr += 2
+                                                list_pairs.append({
+                                                    "tab1": tmp1, "tab2": tmp2,
+                                                    "var_name": "pr_" + evname + "_djf_map_" + reg + "__",
+                                                    "add_name": evname + "_" + reg, "units": "mm/day",
+                                                    "ev_name": evname, "events1": ev1, "events2": ev2})
                                             del dictreg, tmp1, tmp2
+                                        # rmse, correlation and standard deviations of all the maps computed at once
+                                        dict_metric, dict_nc = fill_dict_teleconnection(
+                                            list_pairs, dataset1, dataset2, actualtimebounds_mod, actualtimebounds_obs,
+                                            yearN_mod, yearN_obs, 3, centered_rmse=centered_rmse,
+                                            biased_rmse=biased_rmse)
+                                        del list_pairs
                                         if ".nc" in netcdf_name:
                                             file_name = deepcopy(netcdf_name).replace(".nc", "_" + metname + ".nc")
                                         else:
@@ -10219,20 +10368,15 @@ def EnsoPrMapJja(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstland
                                             [keyerror_mod1, keyerror_mod2, keyerror_obs1, keyerror_obs2])
                                     else:
                                         # Metrics ENSO events global
-                                        dict_metric, dict_nc = dict(), dict()
-                                        nbr = 3
+                                        list_pairs = list()
                                         for jj, (evname, tab1, tab2, ev1, ev2) in enumerate(
                                                 zip(["nino", "nina"], [nino_mod, nina_mod], [nino_obs, nina_obs],
                                                     [nino_mod_years, nina_mod_years],
                                                     [nino_obs_years, nina_obs_years])):
-                                            dict_metric, dict_nc = fill_dict_teleconnection(
-                                                tab1, tab2, dataset1, dataset2, actualtimebounds_mod,
-                                                actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                "pr_" + evname + "_jja_map__", evname, "mm/day",
-                                                centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                dict_metric=dict_metric, dict_nc=dict_nc, ev_name=evname, events1=ev1,
-                                                events2=ev2)
-                                            nbr += 2
+                                            list_pairs.append({
+                                                "tab1": tab1, "tab2": tab2, "var_name": "pr_" + evname + "_jja_map__",
+                                                "add_name": evname, "units": "mm/day", "ev_name": evname,
+                                                "events1": ev1, "events2": ev2})
                                         list_region = ["africaSE", "americaN", "americaS", "asiaS", "oceania"]
                                         for ii, reg in enumerate(list_region):
                                             # select region
@@ -10241,13 +10385,10 @@ def EnsoPrMapJja(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstland
                                                 longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                             tmp2 = pr_obs_land_slope(
                                                 longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                            dict_metric, dict_nc = fill_dict_teleconnection(
-                                                tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod,
-                                                actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                "reg_pr_over_sst_jja_map_" + reg + "__", reg, Units,
-                                                centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                dict_metric=dict_metric, dict_nc=dict_nc)
-                                            nbr += 2
+                                            list_pairs.append({
+                                                "tab1": tmp1, "tab2": tmp2,
+                                                "var_name": "reg_pr_over_sst_jja_map_" + reg + "__", "add_name": reg,
+                                                "units": Units})
                                             for jj, (evname, tab1, tab2, ev1, ev2) in enumerate(
                                                     zip(["nino", "nina"], [nino_mod_land, nina_mod_land],
                                                         [nino_obs_land, nina_obs_land],
@@ -10257,15 +10398,18 @@ def EnsoPrMapJja(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstland
                                                     longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                                 tmp2 = tab2(
                                                     longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                                dict_metric, dict_nc = fill_dict_teleconnection(
-                                                    tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod,
-                                                    actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                    "pr_" + evname + "_jja_map_" + reg + "__", evname + "_" + reg,
-                                                    "mm/day", centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                    dict_metric=dict_metric, dict_nc=dict_nc, ev_name=evname,
-                                                    events1=ev1, events2=ev2)
-                                                nbr += 2
+                                                list_pairs.append({
+                                                    "tab1": tmp1, "tab2": tmp2,
+                                                    "var_name": "pr_" + evname + "_jja_map_" + reg + "__",
+                                                    "add_name": evname + "_" + reg, "units": "mm/day",
+                                                    "ev_name": evname, "events1": ev1, "events2": ev2})
                                             del dictreg, tmp1, tmp2
+                                        # rmse, correlation and standard deviations of all the maps computed at once
+                                        dict_metric, dict_nc = fill_dict_teleconnection(
+                                            list_pairs, dataset1, dataset2, actualtimebounds_mod, actualtimebounds_obs,
+                                            yearN_mod, yearN_obs, 3, centered_rmse=centered_rmse,
+                                            biased_rmse=biased_rmse)
+                                        del list_pairs
                                         if ".nc" in netcdf_name:
                                             file_name = deepcopy(netcdf_name).replace(".nc", "_" + metname + ".nc")
                                         else:
@@ -11806,37 +11950,29 @@ def EnsoSstSkew(sstfile, sstname, sstareafile, sstareaname, sstlandmaskfile, sst
 
             if netcdf is True:
                 # additional diagnostic
-                # Read file and select the right region
-                sst1, sst_areacell1, keyerror1 = Read_data_mask_area(
+                # Read file and select the right region (equatorial_pacific is included in
+                # equatorial_pacific_LatExt2, so it is selected afterwards from the same data)
+                sst1, sst_areacell1, keyerror = Read_data_mask_area(
                     sstfile, sstname, 'temperature', metric, 'equatorial_pacific_LatExt2', file_area=sstareafile,
                     name_area=sstareaname, file_mask=sstlandmaskfile, name_mask=sstlandmaskname, maskland=True,
                     maskocean=False, debug=debug, **kwargs)
-                sst2, sst_areacell2, keyerror2 = Read_data_mask_area(
-                    sstfile, sstname, 'temperature', metric, 'equatorial_pacific', file_area=sstareafile,
-                    name_area=sstareaname, file_mask=sstlandmaskfile, name_mask=sstlandmaskname, maskland=True,
-                    maskocean=False, debug=debug, **kwargs)
-                if keyerror1 is not None or keyerror2 is not None:
-                    keyerror = add_up_errors([keyerror1, keyerror2])
-                else:
+                if keyerror is None:
                     # Preprocess variables (computes anomalies, normalizes, detrends TS, smoothes TS, ...)
-                    sst1, _, keyerror1 = PreProcessTS(sst1, '', areacell=sst_areacell1, compute_anom=True,
-                                                      region="equatorial_pacific_LatExt2", **kwargs)
-                    sst2, _, keyerror2 = PreProcessTS(sst2, '', areacell=sst_areacell2, compute_anom=True,
-                                                      region="equatorial_pacific", **kwargs)
-                    del sst_areacell1, sst_areacell2
-                    if keyerror1 is not None or keyerror2 is not None:
-                        keyerror = add_up_errors([keyerror1, keyerror2])
-                    else:
+                    sst1, _, keyerror = PreProcessTS(sst1, '', areacell=sst_areacell1, compute_anom=True,
+                                                     region="equatorial_pacific_LatExt2", **kwargs)
+                    del sst_areacell1
+                    if keyerror is None:
                         if debug is True:
                             dict_debug = {'axes1': '(sst1) ' + str([ax.id for ax in sst1.getAxisList()]),
-                                          'axes2': '(sst2) ' + str([ax.id for ax in sst2.getAxisList()]),
-                                          'shape1': '(sst1) ' + str(sst1.shape), 'shape2': '(sst2) ' + str(sst2.shape),
-                                          'time1': '(sst1) ' + str(TimeBounds(sst1)),
-                                          'time2': '(sst2) ' + str(TimeBounds(sst2))}
+                                          'shape1': '(sst1) ' + str(sst1.shape),
+                                          'time1': '(sst1) ' + str(TimeBounds(sst1))}
                             EnsoErrorsWarnings.debug_mode('\033[92m', 'after PreProcessTS', 10, **dict_debug)
-                        # std
+                        # skewness (computed point by point, so the equatorial_pacific map is a subset of the larger
+                        # one)
                         sst1 = SkewnessTemporal(sst1)
-                        sst2 = SkewnessTemporal(sst2)
+                        dictreg = ReferenceRegions('equatorial_pacific')
+                        sst2 = sst1(latitude=dictreg['latitude'], longitude=dictreg['longitude'])
+                        del dictreg
                         # Regridding
                         if 'regridding' not in list(kwargs.keys()):
                             kwargs['regridding'] = {'regridder': 'cdms', 'regridTool': 'esmf', 'regridMethod': 'linear',
@@ -12276,20 +12412,22 @@ def EnsoSlpMap(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlandma
                                         '\033[92m', 'divedown after LinearRegressionTsAgainstMap', 15, **dict_debug)
                                 list_region = ["africaSE", "americaN", "americaS", "asiaS", "oceania"]
                                 # Metrics ENSO regression regional
-                                dict_metric, dict_nc = dict(), dict()
-                                nbr = 3
+                                list_pairs = list()
                                 for ii, reg in enumerate(list_region):
                                     # select region
                                     dictreg = ReferenceRegions(reg)
                                     tmp1 = slp_mod(longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                     tmp2 = slp_obs(longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                    dict_metric, dict_nc = fill_dict_teleconnection(
-                                        tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod, actualtimebounds_obs,
-                                        yearN_mod, yearN_obs, nbr, "reg_slp_over_sst_djf_map_" + reg + "__", reg, Units,
-                                        centered_rmse=centered_rmse, biased_rmse=biased_rmse, dict_metric=dict_metric,
-                                        dict_nc=dict_nc)
-                                    nbr += 2
+                                    list_pairs.append({
+                                        "tab1": tmp1, "tab2": tmp2,
+                                        "var_name": "reg_slp_over_sst_djf_map_" + reg + "__", "add_name": reg,
+                                        "units": Units})
                                     del dictreg, tmp1, tmp2
+                                # rmse, correlation and standard deviations of all the maps computed at once
+                                dict_metric, dict_nc = fill_dict_teleconnection(
+                                    list_pairs, dataset1, dataset2, actualtimebounds_mod, actualtimebounds_obs,
+                                    yearN_mod, yearN_obs, 3, centered_rmse=centered_rmse, biased_rmse=biased_rmse)
+                                del list_pairs
                                 if ".nc" in netcdf_name:
                                     file_name = deepcopy(netcdf_name).replace(".nc", "_" + metname + ".nc")
                                 else:
@@ -12796,20 +12934,15 @@ def EnsoSlpMapDjf(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlan
                                             [keyerror_mod1, keyerror_mod2, keyerror_obs1, keyerror_obs2])
                                     else:
                                         # Metrics ENSO events global
-                                        dict_metric, dict_nc = dict(), dict()
-                                        nbr = 3
+                                        list_pairs = list()
                                         for jj, (evname, tab1, tab2, ev1, ev2) in enumerate(
                                                 zip(["nino", "nina"], [nino_mod, nina_mod], [nino_obs, nina_obs],
                                                     [nino_mod_years, nina_mod_years],
                                                     [nino_obs_years, nina_obs_years])):
-                                            dict_metric, dict_nc = fill_dict_teleconnection(
-                                                tab1, tab2, dataset1, dataset2, actualtimebounds_mod,
-                                                actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                "slp_" + evname + "_djf_map__", evname, "hPa",
-                                                centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                dict_metric=dict_metric, dict_nc=dict_nc, ev_name=evname, events1=ev1,
-                                                events2=ev2)
-                                            nbr += 2
+                                            list_pairs.append({
+                                                "tab1": tab1, "tab2": tab2,
+                                                "var_name": "slp_" + evname + "_djf_map__", "add_name": evname,
+                                                "units": "hPa", "ev_name": evname, "events1": ev1, "events2": ev2})
                                         list_region = ["africaSE", "americaN", "americaS", "asiaS", "oceania"]
                                         for ii, reg in enumerate(list_region):
                                             # select region
@@ -12818,13 +12951,10 @@ def EnsoSlpMapDjf(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlan
                                                 longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                             tmp2 = slp_obs_land_slope(
                                                 longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                            dict_metric, dict_nc = fill_dict_teleconnection(
-                                                tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod,
-                                                actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                "reg_slp_over_sst_djf_map_" + reg + "__", reg, Units,
-                                                centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                dict_metric=dict_metric, dict_nc=dict_nc)
-                                            nbr += 2
+                                            list_pairs.append({
+                                                "tab1": tmp1, "tab2": tmp2,
+                                                "var_name": "reg_slp_over_sst_djf_map_" + reg + "__", "add_name": reg,
+                                                "units": Units})
                                             for jj, (evname, tab1, tab2, ev1, ev2) in enumerate(
                                                     zip(["nino", "nina"], [nino_mod_land, nina_mod_land],
                                                         [nino_obs_land, nina_obs_land],
@@ -12834,15 +12964,18 @@ def EnsoSlpMapDjf(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlan
                                                     longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                                 tmp2 = tab2(
                                                     longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                                dict_metric, dict_nc = fill_dict_teleconnection(
-                                                    tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod,
-                                                    actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                    "slp_" + evname + "_djf_map_" + reg + "__", evname + "_" + reg,
-                                                    "hPa/day", centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                    dict_metric=dict_metric, dict_nc=dict_nc, ev_name=evname,
-                                                    events1=ev1, events2=ev2)
-                                                nbr += 2
+                                                list_pairs.append({
+                                                    "tab1": tmp1, "tab2": tmp2,
+                                                    "var_name": "slp_" + evname + "_djf_map_" + reg + "__",
+                                                    "add_name": evname + "_" + reg, "units": "hPa/day",
+                                                    "ev_name": evname, "events1": ev1, "events2": ev2})
                                             del dictreg, tmp1, tmp2
+                                        # rmse, correlation and standard deviations of all the maps computed at once
+                                        dict_metric, dict_nc = fill_dict_teleconnection(
+                                            list_pairs, dataset1, dataset2, actualtimebounds_mod, actualtimebounds_obs,
+                                            yearN_mod, yearN_obs, 3, centered_rmse=centered_rmse,
+                                            biased_rmse=biased_rmse)
+                                        del list_pairs
                                         if ".nc" in netcdf_name:
                                             file_name = deepcopy(netcdf_name).replace(".nc", "_" + metname + ".nc")
                                         else:
@@ -13346,20 +13479,15 @@ def EnsoSlpMapJja(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlan
                                             [keyerror_mod1, keyerror_mod2, keyerror_obs1, keyerror_obs2])
                                     else:
                                         # Metrics ENSO events global
-                                        dict_metric, dict_nc = dict(), dict()
-                                        nbr = 3
+                                        list_pairs = list()
                                         for jj, (evname, tab1, tab2, ev1, ev2) in enumerate(
                                                 zip(["nino", "nina"], [nino_mod, nina_mod], [nino_obs, nina_obs],
                                                     [nino_mod_years, nina_mod_years],
                                                     [nino_obs_years, nina_obs_years])):
-                                            dict_metric, dict_nc = fill_dict_teleconnection(
-                                                tab1, tab2, dataset1, dataset2, actualtimebounds_mod,
-                                                actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                "slp_" + evname + "_jja_map__", evname, "hPa",
-                                                centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                dict_metric=dict_metric, dict_nc=dict_nc, ev_name=evname, events1=ev1,
-                                                events2=ev2)
-                                            nbr += 2
+                                            list_pairs.append({
+                                                "tab1": tab1, "tab2": tab2,
+                                                "var_name": "slp_" + evname + "_jja_map__", "add_name": evname,
+                                                "units": "hPa", "ev_name": evname, "events1": ev1, "events2": ev2})
                                         list_region = ["africaSE", "americaN", "americaS", "asiaS", "oceania"]
                                         for ii, reg in enumerate(list_region):
                                             # select region
@@ -13368,13 +13496,10 @@ def EnsoSlpMapJja(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlan
                                                 longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                             tmp2 = slp_obs_land_slope(
                                                 longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                            dict_metric, dict_nc = fill_dict_teleconnection(
-                                                tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod,
-                                                actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                "reg_slp_over_sst_jja_map_" + reg + "__", reg, Units,
-                                                centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                dict_metric=dict_metric, dict_nc=dict_nc)
-                                            nbr += 2
+                                            list_pairs.append({
+                                                "tab1": tmp1, "tab2": tmp2,
+                                                "var_name": "reg_slp_over_sst_jja_map_" + reg + "__", "add_name": reg,
+                                                "units": Units})
                                             for jj, (evname, tab1, tab2, ev1, ev2) in enumerate(
                                                     zip(["nino", "nina"], [nino_mod_land, nina_mod_land],
                                                         [nino_obs_land, nina_obs_land],
@@ -13384,15 +13509,18 @@ def EnsoSlpMapJja(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlan
                                                     longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                                 tmp2 = tab2(
                                                     longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                                dict_metric, dict_nc = fill_dict_teleconnection(
-                                                    tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod,
-                                                    actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                    "slp_" + evname + "_jja_map_" + reg + "__", evname + "_" + reg,
-                                                    "hPa", centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                    dict_metric=dict_metric, dict_nc=dict_nc, ev_name=evname,
-                                                    events1=ev1, events2=ev2)
-                                                nbr += 2
+                                                list_pairs.append({
+                                                    "tab1": tmp1, "tab2": tmp2,
+                                                    "var_name": "slp_" + evname + "_jja_map_" + reg + "__",
+                                                    "add_name": evname + "_" + reg, "units": "hPa", "ev_name": evname,
+                                                    "events1": ev1, "events2": ev2})
                                             del dictreg, tmp1, tmp2
+                                        # rmse, correlation and standard deviations of all the maps computed at once
+                                        dict_metric, dict_nc = fill_dict_teleconnection(
+                                            list_pairs, dataset1, dataset2, actualtimebounds_mod, actualtimebounds_obs,
+                                            yearN_mod, yearN_obs, 3, centered_rmse=centered_rmse,
+                                            biased_rmse=biased_rmse)
+                                        del list_pairs
                                         if ".nc" in netcdf_name:
                                             file_name = deepcopy(netcdf_name).replace(".nc", "_" + metname + ".nc")
                                         else:
@@ -15217,20 +15345,21 @@ def EnsoSstMap(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlandma
                                     '\033[92m', 'divedown after LinearRegressionTsAgainstMap', 15, **dict_debug)
                             list_region = ["africaSE", "americaN", "americaS", "asiaS", "oceania"]
                             # Metrics ENSO regression regional
-                            dict_metric, dict_nc = dict(), dict()
-                            nbr = 3
+                            list_pairs = list()
                             for ii, reg in enumerate(list_region):
                                 # select region
                                 dictreg = ReferenceRegions(reg)
                                 tmp1 = ts_mod(longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                 tmp2 = ts_obs(longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                dict_metric, dict_nc = fill_dict_teleconnection(
-                                    tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod, actualtimebounds_obs,
-                                    yearN_mod, yearN_obs, nbr, "reg_ts_over_sst_djf_map_" + reg + "__", reg, Units,
-                                    centered_rmse=centered_rmse, biased_rmse=biased_rmse, dict_metric=dict_metric,
-                                    dict_nc=dict_nc)
-                                nbr += 2
+                                list_pairs.append({
+                                    "tab1": tmp1, "tab2": tmp2, "var_name": "reg_ts_over_sst_djf_map_" + reg + "__",
+                                    "add_name": reg, "units": Units})
                                 del dictreg, tmp1, tmp2
+                            # rmse, correlation and standard deviations of all the maps computed at once
+                            dict_metric, dict_nc = fill_dict_teleconnection(
+                                list_pairs, dataset1, dataset2, actualtimebounds_mod, actualtimebounds_obs, yearN_mod,
+                                yearN_obs, 3, centered_rmse=centered_rmse, biased_rmse=biased_rmse)
+                            del list_pairs
                             if ".nc" in netcdf_name:
                                 file_name = deepcopy(netcdf_name).replace(".nc", "_" + metname + ".nc")
                             else:
@@ -15690,20 +15819,15 @@ def EnsoSstMapDjf(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlan
                                         [keyerror_mod1, keyerror_mod2, keyerror_obs1, keyerror_obs2])
                                 else:
                                     # Metrics ENSO events global
-                                    dict_metric, dict_nc = dict(), dict()
-                                    nbr = 3
+                                    list_pairs = list()
                                     for jj, (evname, tab1, tab2, ev1, ev2) in enumerate(
                                             zip(["nino", "nina"], [nino_mod, nina_mod], [nino_obs, nina_obs],
                                                 [nino_mod_years, nina_mod_years],
                                                 [nino_obs_years, nina_obs_years])):
-                                        dict_metric, dict_nc = fill_dict_teleconnection(
-                                            tab1, tab2, dataset1, dataset2, actualtimebounds_mod,
-                                            actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                            "ts_" + evname + "_djf_map__", evname, "C",
-                                            centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                            dict_metric=dict_metric, dict_nc=dict_nc, ev_name=evname, events1=ev1,
-                                            events2=ev2)
-                                        nbr += 2
+                                        list_pairs.append({
+                                            "tab1": tab1, "tab2": tab2, "var_name": "ts_" + evname + "_djf_map__",
+                                            "add_name": evname, "units": "C", "ev_name": evname, "events1": ev1,
+                                            "events2": ev2})
                                     list_region = ["africaSE", "americaN", "americaS", "asiaS", "oceania"]
                                     for ii, reg in enumerate(list_region):
                                         # select region
@@ -15712,13 +15836,10 @@ def EnsoSstMapDjf(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlan
                                             longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                         tmp2 = ts_obs_land_slope(
                                             longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                        dict_metric, dict_nc = fill_dict_teleconnection(
-                                            tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod,
-                                            actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                            "reg_ts_over_sst_djf_map_" + reg + "__", reg, Units,
-                                            centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                            dict_metric=dict_metric, dict_nc=dict_nc)
-                                        nbr += 2
+                                        list_pairs.append({
+                                            "tab1": tmp1, "tab2": tmp2,
+                                            "var_name": "reg_ts_over_sst_djf_map_" + reg + "__", "add_name": reg,
+                                            "units": Units})
                                         for jj, (evname, tab1, tab2, ev1, ev2) in enumerate(
                                                 zip(["nino", "nina"], [nino_mod_land, nina_mod_land],
                                                     [nino_obs_land, nina_obs_land],
@@ -15728,15 +15849,17 @@ def EnsoSstMapDjf(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlan
                                                 longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                             tmp2 = tab2(
                                                 longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                            dict_metric, dict_nc = fill_dict_teleconnection(
-                                                tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod,
-                                                actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                "ts_" + evname + "_djf_map_" + reg + "__", evname + "_" + reg,
-                                                "C", centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                dict_metric=dict_metric, dict_nc=dict_nc, ev_name=evname,
-                                                events1=ev1, events2=ev2)
-                                            nbr += 2
+                                            list_pairs.append({
+                                                "tab1": tmp1, "tab2": tmp2,
+                                                "var_name": "ts_" + evname + "_djf_map_" + reg + "__",
+                                                "add_name": evname + "_" + reg, "units": "C", "ev_name": evname,
+                                                "events1": ev1, "events2": ev2})
                                         del dictreg, tmp1, tmp2
+                                    # rmse, correlation and standard deviations of all the maps computed at once
+                                    dict_metric, dict_nc = fill_dict_teleconnection(
+                                        list_pairs, dataset1, dataset2, actualtimebounds_mod, actualtimebounds_obs,
+                                        yearN_mod, yearN_obs, 3, centered_rmse=centered_rmse, biased_rmse=biased_rmse)
+                                    del list_pairs
                                     if ".nc" in netcdf_name:
                                         file_name = deepcopy(netcdf_name).replace(".nc", "_" + metname + ".nc")
                                     else:
@@ -16199,20 +16322,15 @@ def EnsoSstMapJja(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlan
                                         [keyerror_mod1, keyerror_mod2, keyerror_obs1, keyerror_obs2])
                                 else:
                                     # Metrics ENSO events global
-                                    dict_metric, dict_nc = dict(), dict()
-                                    nbr = 3
+                                    list_pairs = list()
                                     for jj, (evname, tab1, tab2, ev1, ev2) in enumerate(
                                             zip(["nino", "nina"], [nino_mod, nina_mod], [nino_obs, nina_obs],
                                                 [nino_mod_years, nina_mod_years],
                                                 [nino_obs_years, nina_obs_years])):
-                                        dict_metric, dict_nc = fill_dict_teleconnection(
-                                            tab1, tab2, dataset1, dataset2, actualtimebounds_mod,
-                                            actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                            "ts_" + evname + "_jja_map__", evname, "C",
-                                            centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                            dict_metric=dict_metric, dict_nc=dict_nc, ev_name=evname, events1=ev1,
-                                            events2=ev2)
-                                        nbr += 2
+                                        list_pairs.append({
+                                            "tab1": tab1, "tab2": tab2, "var_name": "ts_" + evname + "_jja_map__",
+                                            "add_name": evname, "units": "C", "ev_name": evname, "events1": ev1,
+                                            "events2": ev2})
                                     list_region = ["africaSE", "americaN", "americaS", "asiaS", "oceania"]
                                     for ii, reg in enumerate(list_region):
                                         # select region
@@ -16221,13 +16339,10 @@ def EnsoSstMapJja(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlan
                                             longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                         tmp2 = ts_obs_land_slope(
                                             longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                        dict_metric, dict_nc = fill_dict_teleconnection(
-                                            tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod,
-                                            actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                            "reg_ts_over_sst_jja_map_" + reg + "__", reg, Units,
-                                            centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                            dict_metric=dict_metric, dict_nc=dict_nc)
-                                        nbr += 2
+                                        list_pairs.append({
+                                            "tab1": tmp1, "tab2": tmp2,
+                                            "var_name": "reg_ts_over_sst_jja_map_" + reg + "__", "add_name": reg,
+                                            "units": Units})
                                         for jj, (evname, tab1, tab2, ev1, ev2) in enumerate(
                                                 zip(["nino", "nina"], [nino_mod_land, nina_mod_land],
                                                     [nino_obs_land, nina_obs_land],
@@ -16237,15 +16352,17 @@ def EnsoSstMapJja(sstfilemod, sstnamemod, sstareafilemod, sstareanamemod, sstlan
                                                 longitude=dictreg["longitude"], latitude=dictreg["latitude"])
                                             tmp2 = tab2(
                                                 longitude=dictreg["longitude"], latitude=dictreg["latitude"])
-                                            dict_metric, dict_nc = fill_dict_teleconnection(
-                                                tmp1, tmp2, dataset1, dataset2, actualtimebounds_mod,
-                                                actualtimebounds_obs, yearN_mod, yearN_obs, nbr,
-                                                "ts_" + evname + "_jja_map_" + reg + "__", evname + "_" + reg,
-                                                "C", centered_rmse=centered_rmse, biased_rmse=biased_rmse,
-                                                dict_metric=dict_metric, dict_nc=dict_nc, ev_name=evname,
-                                                events1=ev1, events2=ev2)
-                                            nbr += 2
+                                            list_pairs.append({
+                                                "tab1": tmp1, "tab2": tmp2,
+                                                "var_name": "ts_" + evname + "_jja_map_" + reg + "__",
+                                                "add_name": evname + "_" + reg, "units": "C", "ev_name": evname,
+                                                "events1": ev1, "events2": ev2})
                                         del dictreg, tmp1, tmp2
+                                    # rmse, correlation and standard deviations of all the maps computed at once
+                                    dict_metric, dict_nc = fill_dict_teleconnection(
+                                        list_pairs, dataset1, dataset2, actualtimebounds_mod, actualtimebounds_obs,
+                                        yearN_mod, yearN_obs, 3, centered_rmse=centered_rmse, biased_rmse=biased_rmse)
+                                    del list_pairs
                                     if ".nc" in netcdf_name:
                                         file_name = deepcopy(netcdf_name).replace(".nc", "_" + metname + ".nc")
                                     else:
@@ -2,6 +2,7 @@
 #
 # Define ENSO metrics plots
 #
+from copy import deepcopy
 from numpy import arange as NUMPYarange
 # ENSO_metrics functions
 from .EnsoCollectionsLib import defCollection
@@ -3333,7 +3334,13 @@ reference_observations = {
 }
 
 
+# plot parameters already computed by plot_param, by (metric_collection, metric)
+plot_param_cache = dict()
+
+
 def plot_param(metric_collection, metric):
+    if (metric_collection, metric) in list(plot_param_cache.keys()):
+        return plot_param_cache[(metric_collection, metric)]
     dict_MC = defCollection(metric_collection)
     dict_MCm = dict_MC["metrics_list"][metric]
     # get plot parameters
@@ -3375,4 +3382,6 @@ def plot_param(metric_collection, metric):
     dict_out["metric_reference"] = refname
     # get variable regions
     dict_out["metric_regions"] = dict_MCm["regions"]
-    return dict_out
+    # plot_parameters is shared by all the Metric Collections, the cache keeps a copy for this one
+    plot_param_cache[(metric_collection, metric)] = deepcopy(dict_out)
+    return plot_param_cache[(metric_collection, metric)]
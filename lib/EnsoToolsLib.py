@@ -1,8 +1,17 @@
 # -*- coding:UTF-8 -*-
 from inspect import stack as INSPECTstack
+import json
 from numpy import array as NUMPYarray
+from numpy import floating as NUMPYfloating
+from numpy import generic as NUMPYgeneric
+from numpy import ndarray as NUMPYndarray
+from numpy.ma import filled as NUMPYma__filled
 from numpy import square as NUMPYsquare
 from numpy import unravel_index as NUMPYunravel_index
+from os.path import basename as OSpath__basename
+from os.path import getmtime as OSpath__getmtime
+from os.path import getsize as OSpath__getsize
+from os.path import isfile as OSpath__isfile
 from scipy.stats import scoreatpercentile as SCIPYstats__scoreatpercentile
 # ENSO_metrics package functions:
 from . import EnsoErrorsWarnings
@@ -36,6 +45,42 @@ def add_up_errors(list_keyerror):
     return keyerror
 
 
+def file_fingerprint(list_files, portable=False):
+    """
+    #################################################################################
+    Description:
+    Lists the size and the last modification time of the given files
+    Used to check if a file has changed since an output (e.g., dive down recipe) has been created
+    #################################################################################
+
+    :param list_files: string or list of strings (or of list of strings)
+        path_to/filename of the file(s), None and empty strings are skipped
+    :param portable: boolean, optional
+        default value = False, files are identified by their path and their size and modification time are listed
+        If True, files are identified by their name (without path) and only their size is listed, so that the
+        fingerprint does not change when the files are copied elsewhere (e.g., reference bundle shipped with the
+        package)
+
+    :return dict_out: dict
+        dictionary {path_to/filename: [size, modification time]}, size and time are None if the file does not exist
+        (or {filename: [size]} if portable is True)
+    """
+    if isinstance(list_files, str):
+        list_files = [list_files]
+    dict_out = dict()
+    for file1 in list_files:
+        if isinstance(file1, list):
+            dict_out.update(file_fingerprint(file1, portable=portable))
+        elif isinstance(file1, str) and len(file1) > 0:
+            if portable is True:
+                dict_out[OSpath__basename(file1)] = [OSpath__getsize(file1) if OSpath__isfile(file1) is True else None]
+            elif OSpath__isfile(file1) is True:
+                dict_out[file1] = [OSpath__getsize(file1), OSpath__getmtime(file1)]
+            else:
+                dict_out[file1] = [None, None]
+    return dict_out
+
+
 def find_xy_min_max(tab, return_val='both'):
     """
     #################################################################################
@@ -79,6 +124,152 @@ def find_xy_min_max(tab, return_val='both'):
     return tab_out
 
 
+def json_dump_stream(obj, outfile, sort_keys=True, chunk_size=65536):
+    """
+    #################################################################################
+    Description:
+    Writes the given object in the given (open) json file, piece by piece (the json string is never created entirely)
+    Numpy arrays (masked values are written as 1e20, as EnsoUvcdatToolsLib.ArrayToList) and lists of floats are written
+    by chunks of 'chunk_size' values, converted to strings by numpy (no python float is created)
+    The result is the same as json.dump(obj, outfile, sort_keys=sort_keys)
+    #################################################################################
+
+    :param obj: dict, list, array, string, number, boolean or None
+        object to write
+    :param outfile: file object
+        file open in write mode
+    :param sort_keys: boolean, optional
+        True to sort the keys of the dictionaries
+        default value is True
+    :param chunk_size: int, optional
+        number of values converted at the same time
+        default value is 65536
+    :return:
+    """
+    if isinstance(obj, dict):
+        keys = sorted(list(obj.keys())) if sort_keys is True else list(obj.keys())
+        outfile.write("{")
+        for ii, key in enumerate(keys):
+            outfile.write((", " if ii > 0 else "") + json.dumps({key: 0})[1:-4] + ": ")
+            json_dump_stream(obj[key], outfile, sort_keys=sort_keys, chunk_size=chunk_size)
+        outfile.write("}")
+    elif isinstance(obj, NUMPYndarray) and obj.ndim > 0:
+        if obj.ndim > 1:
+            outfile.write("[")
+            for ii in range(len(obj)):
+                outfile.write(", " if ii > 0 else "")
+                json_dump_stream(obj[ii], outfile, sort_keys=sort_keys, chunk_size=chunk_size)
+            outfile.write("]")
+        elif obj.dtype.kind == "f":
+            tab = NUMPYma__filled(obj, 1e20)
+            outfile.write("[")
+            for ii in range(0, len(tab), chunk_size):
+                outfile.write((", " if ii > 0 else "") + json_encode_floats(tab[ii:ii + chunk_size]))
+            outfile.write("]")
+        else:
+            json_dump_stream(NUMPYma__filled(obj, 1e20).tolist(), outfile, sort_keys=sort_keys, chunk_size=chunk_size)
+    elif isinstance(obj, (list, tuple)):
+        if len(obj) > 0 and all(type(val) is float or isinstance(val, NUMPYfloating) for val in obj):
+            outfile.write("[")
+            for ii in range(0, len(obj), chunk_size):
+                outfile.write((", " if ii > 0 else "") + json_encode_floats(obj[ii:ii + chunk_size]))
+            outfile.write("]")
+        else:
+            outfile.write("[")
+            for ii, val in enumerate(obj):
+                outfile.write(", " if ii > 0 else "")
+                json_dump_stream(val, outfile, sort_keys=sort_keys, chunk_size=chunk_size)
+            outfile.write("]")
+    elif isinstance(obj, NUMPYgeneric):
+        outfile.write(json.dumps(obj.item()))
+    else:
+        outfile.write(json.dumps(obj))
+    return
+
+
+def json_encode_floats(tab):
+    """
+    #################################################################################
+    Description:
+    Converts the given floats to a json string (values separated by ', '), as json.dumps would write them
+    #################################################################################
+
+    :param tab: list or array of floats
+    :return: string
+    """
+    tab = NUMPYarray(tab, dtype="float64").astype(str)
+    tab[tab == "nan"] = "NaN"
+    tab[tab == "inf"] = "Infinity"
+    tab[tab == "-inf"] = "-Infinity"
+    return ", ".join(tab)
+
+
+def json_stream_close(stream, dict_other={}):
+    """
+    #################################################################################
+    Description:
+    Closes a json file opened by json_stream_open, writing the other given keys of the main dictionary
+    #################################################################################
+
+    :param stream: dict
+        output of json_stream_open
+    :param dict_other: dict, optional
+        other keys of the main dictionary (e.g., {'metadata': ...})
+    :return:
+    """
+    outfile = stream["file"]
+    outfile.write("}")
+    for key in sorted(list(dict_other.keys())):
+        outfile.write(", " + json.dumps(key) + ": ")
+        json_dump_stream(dict_other[key], outfile)
+    outfile.write("}")
+    outfile.close()
+    return
+
+
+def json_stream_open(json_name, key):
+    """
+    #################################################################################
+    Description:
+    Opens a json file to write the dictionary stored under 'key' one item at a time (see json_stream_write and
+    json_stream_close), the file contains in the end: {key: {item1: ..., item2: ...}, other keys: ...}
+    #################################################################################
+
+    :param json_name: string
+        path_to/filename of the json file
+    :param key: string
+        key of the main dictionary written one item at a time (e.g., 'value')
+    :return stream: dict
+        to give to json_stream_write and json_stream_close
+    """
+    outfile = open(json_name, "w")
+    outfile.write("{" + json.dumps(key) + ": {")
+    return {"file": outfile, "count": 0}
+
+
+def json_stream_write(stream, key, obj):
+    """
+    #################################################################################
+    Description:
+    Writes one item in a json file opened by json_stream_open (the item can then be deleted from the memory)
+    #################################################################################
+
+    :param stream: dict
+        output of json_stream_open
+    :param key: string
+        key of the item
+    :param obj: dict, list, array,...
+        item to write (see json_dump_stream)
+    :return:
+    """
+    outfile = stream["file"]
+    outfile.write((", " if stream["count"] > 0 else "") + json.dumps(key) + ": ")
+    json_dump_stream(obj, outfile)
+    outfile.flush()
+    stream["count"] += 1
+    return
+
+
 def math_metric_computation(model, model_err, obs=None, obs_err=None, keyword='difference'):
     """
     #################################################################################
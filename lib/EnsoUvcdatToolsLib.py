@@ -3,16 +3,31 @@ from calendar import monthrange
 import copy
 from datetime import date
 from inspect import stack as INSPECTstack
+import json
 from packaging.version import Version
 import ntpath
 import numpy
+from numpy import argmax as NPargmax
+from numpy import argmin as NPargmin
 from numpy import array as NParray
+from numpy import concatenate as NPconcatenate
+from numpy import cumsum as NPcumsum
+from numpy import errstate as NPerrstate
 from numpy import exp as NPexp
 from numpy import histogram as NPhistogram
+from numpy import inf as NPinf
 from numpy import isnan as NPisnan
+from numpy import load as NPload
+from numpy import logical_or as NPlogical_or
 from numpy import nan as NPnan
 from numpy import nonzero as NPnonzero
 from numpy import ones as NPones
+from numpy import savez_compressed as NPsavez_compressed
+from numpy import sqrt as NPsqrt
+from numpy import stack as NPstack
+from numpy import tensordot as NPtensordot
+from numpy import unique as NPunique
+from numpy import unravel_index as NPunravel_index
 
 if Version(numpy.__version__) < Version('1.25.0'):
     from numpy import product as NPproduct
@@ -20,6 +35,10 @@ else:
     from numpy import prod as NPproduct
 
 from numpy import where as NPwhere
+from numpy import zeros as NPzeros
+from numpy.ma import filled as NPma__filled
+from numpy.ma import getmaskarray as NPma__getmaskarray
+from numpy.ma import masked_array as NPma__masked_array
 from numpy.ma.core import MaskedArray as NPma__core__MaskedArray
 from os.path import isdir as OSpath_isdir
 from os.path import isfile as OSpath__isfile
@@ -28,13 +47,15 @@ from os.path import split as OSpath__split
 from scipy.signal import detrend as SCIPYsignal_detrend
 from scipy.stats import skew as SCIPYstats__skew
 from sys import prefix as SYS_prefix
+from zipfile import ZipFile as ZIPFILEzipfile
+from zipfile import ZIP_DEFLATED as ZIPFILEzip_deflated
 
 # ENSO_metrics package functions:
 from .EnsoCollectionsLib import CmipVariables
 from .EnsoCollectionsLib import ReferenceObservations
 from .EnsoCollectionsLib import ReferenceRegions
 from . import EnsoErrorsWarnings
-from .EnsoToolsLib import add_up_errors, find_xy_min_max, string_in_dict
+from .EnsoToolsLib import add_up_errors, file_fingerprint, string_in_dict
 
 # uvcdat based functions:
 from cdms2 import createAxis as CDMS2createAxis
@@ -42,12 +63,17 @@ from cdms2 import createRectGrid as CDMS2createRectGrid
 from cdms2 import createUniformLatitudeAxis as CDMS2createUniformLatitudeAxis
 from cdms2 import createUniformLongitudeAxis as CDMS2createUniformLongitudeAxis
 from cdms2 import createVariable as CDMS2createVariable
+from cdms2 import getNetcdfDeflateFlag as CDMS2getNetcdfDeflateFlag
+from cdms2 import getNetcdfDeflateLevelFlag as CDMS2getNetcdfDeflateLevelFlag
+from cdms2 import getNetcdfShuffleFlag as CDMS2getNetcdfShuffleFlag
 from cdms2 import setAutoBounds as CDMS2setAutoBounds
+from cdms2 import setNetcdfDeflateFlag as CDMS2setNetcdfDeflateFlag
+from cdms2 import setNetcdfDeflateLevelFlag as CDMS2setNetcdfDeflateLevelFlag
+from cdms2 import setNetcdfShuffleFlag as CDMS2setNetcdfShuffleFlag
 from cdms2 import open as CDMS2open
 from cdtime import comptime as CDTIMEcomptime
 import cdutil
 from genutil.statistics import correlation as GENUTILcorrelation
-from genutil.statistics import linearregression as GENUTILlinearregression
 from genutil.statistics import rms as GENUTILrms
 from genutil.statistics import std as GENUTILstd
 from MV2 import add as MV2add
@@ -732,6 +758,91 @@ dict_rms = {"axis": RmsAxis, "horizontal": RmsHorizontal, "meridional": RmsMerid
             "zonal": RmsZonal}
 
 
+def SkillStatistics(tab, ref, weights=None, biased=1):
+    """
+    #################################################################################
+    Description:
+    Computes in one masked pass the statistics comparing tab to ref over all their points (e.g., a map): weighted mean
+    and standard deviation of both arrays, covariance, correlation and root mean square difference (centered or not)
+    As in genutil.statistics, the mean and standard deviation of each array use its own mask while the covariance,
+    correlation and rms use the points where neither tab nor ref is masked
+    tab and ref can be lists of arrays (e.g., several regions or seasons): all the pairs are then stacked (padded with
+    masked values) and computed at once, with the same weights and masks for all the statistics of a pair
+
+    Uses numpy
+    #################################################################################
+
+    :param tab: masked_array or list of masked_arrays
+        masked_array (uvcdat cdms2) containing a variable, with many attributes attached (short_name, units,...)
+        usually it is the modeled variable
+    :param ref: masked_array or list of masked_arrays
+        masked_array (uvcdat cdms2) containing a variable, with many attributes attached (short_name, units,...)
+        usually it is the observed variable, same shape as tab
+    :param weights: masked_array or list of masked_arrays, optional
+        weights applied to each grid point (same shape as tab)
+        default value = None returns equally weighted statistics
+    :param biased: int, optional
+        default value = 1 returns biased statistics (number of elements)
+        If want to compute unbiased statistics pass anything but 1 (number of elements minus 1)
+    :return dict_stat: dict or list of dict
+        'mean_tab', 'mean_ref', 'std_tab', 'std_ref', 'covariance', 'correlation', 'rmse', 'rmse_centered' and
+        'weight_sum' (sum of the weights of the points where neither tab nor ref is masked) (floats)
+        one dictionary per pair if lists are given
+    """
+    list_tab = tab if isinstance(tab, list) else [tab]
+    list_ref = ref if isinstance(ref, list) else [ref]
+    if weights is None:
+        list_weights = [None] * len(list_tab)
+    else:
+        list_weights = weights if isinstance(weights, list) else [weights]
+    # stacks all pairs (padding is masked)
+    size = max([tt.size for tt in list_tab])
+    xx, yy = NPzeros((len(list_tab), size)), NPzeros((len(list_tab), size))
+    wx, wy, ww = NPzeros((len(list_tab), size)), NPzeros((len(list_tab), size)), NPzeros((len(list_tab), size))
+    for ii, (tt, rr, w1) in enumerate(zip(list_tab, list_ref, list_weights)):
+        if tt.shape != rr.shape:
+            list_strings = [
+                "ERROR" + EnsoErrorsWarnings.message_formating(INSPECTstack()) + ": array shape",
+                str().ljust(5) + "different array shape for tab " + str(tt.shape) + " and ref " + str(rr.shape)]
+            EnsoErrorsWarnings.my_error(list_strings)
+        xx[ii, :tt.size] = NPma__filled(tt, 0.).ravel()
+        yy[ii, :tt.size] = NPma__filled(rr, 0.).ravel()
+        ww[ii, :tt.size] = 1. if w1 is None else NPma__filled(w1, 0.).ravel()
+        wx[ii, :tt.size] = ww[ii, :tt.size] * ~NPma__getmaskarray(tt).ravel()
+        wy[ii, :tt.size] = ww[ii, :tt.size] * ~NPma__getmaskarray(rr).ravel()
+    # common mask
+    ww = wx * (wy > 0)
+    with NPerrstate(divide='ignore', invalid='ignore'):
+        # own mask
+        nx, ny = wx.sum(axis=1), wy.sum(axis=1)
+        mean_x, mean_y = (wx * xx).sum(axis=1) / nx, (wy * yy).sum(axis=1) / ny
+        if biased != 1:
+            nx, ny = nx - 1, ny - 1
+        std_x = NPsqrt((wx * (xx - mean_x[:, None])**2).sum(axis=1) / nx)
+        std_y = NPsqrt((wy * (yy - mean_y[:, None])**2).sum(axis=1) / ny)
+        # common mask
+        sw = ww.sum(axis=1)
+        dx = xx - ((ww * xx).sum(axis=1) / sw)[:, None]
+        dy = yy - ((ww * yy).sum(axis=1) / sw)[:, None]
+        sxy, sxx, syy = (ww * dx * dy).sum(axis=1), (ww * dx**2).sum(axis=1), (ww * dy**2).sum(axis=1)
+        corr = sxy / NPsqrt(sxx * syy)
+        nn = sw if biased == 1 else sw - 1
+        cov = sxy / nn
+        rmse = NPsqrt((ww * (xx - yy)**2).sum(axis=1) / nn)
+        rmse_c = NPsqrt((ww * (dx - dy)**2).sum(axis=1) / nn)
+    del xx, yy, wx, wy, ww, dx, dy
+    list_out = list()
+    for ii in range(len(list_tab)):
+        list_out.append({
+            'mean_tab': float(mean_x[ii]), 'mean_ref': float(mean_y[ii]), 'std_tab': float(std_x[ii]),
+            'std_ref': float(std_y[ii]), 'covariance': float(cov[ii]), 'correlation': float(corr[ii]),
+            'rmse': float(rmse[ii]), 'rmse_centered': float(rmse_c[ii]), 'weight_sum': float(sw[ii])})
+    if isinstance(tab, list):
+        return list_out
+    else:
+        return list_out[0]
+
+
 def Std(tab, weights=None, axis=0, centered=1, biased=1):
     """
     #################################################################################
@@ -959,6 +1070,8 @@ def ArrayListAx(tab, list1, ax_name_ax="", ax_long_name="", ax_ref=""):
 
 
 def ArrayToList(tab):
+    if array_sidecar["open"] is True:
+        return ArrayToSidecar(tab)
     try:
         len(tab.mask)
     except:
@@ -984,6 +1097,176 @@ def ArrayToList(tab):
     return tab_out
 
 
+# dive down arrays kept in memory (see StartArraySidecar) and npz files already open (see ReadArraySidecar)
+array_sidecar = {"open": False, "name": None, "arrays": dict(), "handles": dict()}
+
+
+def ArrayToSidecar(tab):
+    """
+    #################################################################################
+    Description:
+    Keeps the given array (values and mask) in the sidecar opened by StartArraySidecar and returns a small pointer to
+    it, to be stored in the dive down dictionary (and json) instead of the list given by ArrayToList
+    #################################################################################
+
+    :param tab: masked_array
+        array to store
+    :return pointer: dict
+        {'sidecar': path_to/filename of the npz, 'key': name of the array in the npz, 'shape': shape of the array}
+    """
+    key = "array" + str(len(array_sidecar["arrays"]) // 2).zfill(5)
+    array_sidecar["arrays"][key + "__data"] = NParray(NPma__filled(tab, 1e20))
+    array_sidecar["arrays"][key + "__mask"] = NPma__getmaskarray(tab)
+    return {"sidecar": array_sidecar["name"], "key": key, "shape": list(tab.shape)}
+
+
+def MergeArraySidecars(list_sidecars, sidecar_name):
+    """
+    #################################################################################
+    Description:
+    Copies the arrays of the given npz files (written by SaveArraySidecar) in one npz file, one array at a time, the
+    array 'key' of the n-th file is named 'sidecarN_key' (see RenameArrayPointers)
+    The given files that do not exist (no array saved) are skipped
+    #################################################################################
+
+    :param list_sidecars: list of strings
+        path_to/filename of the npz files
+    :param sidecar_name: string
+        path_to/filename of the npz file created ('.npz' is added if needed)
+    :return sidecar_name: string
+        path_to/filename of the npz file created
+    :return dict_prefix: dict
+        prefix of the arrays of each copied file {path_to/filename: 'sidecarN_'}
+    """
+    if sidecar_name.endswith(".npz") is False:
+        sidecar_name += ".npz"
+    dict_prefix = dict()
+    zout = ZIPFILEzipfile(sidecar_name, "w", ZIPFILEzip_deflated, allowZip64=True)
+    try:
+        for ii, name in enumerate(list_sidecars):
+            if OSpath__isfile(name) is False:
+                continue
+            dict_prefix[name] = "sidecar" + str(ii).zfill(3) + "_"
+            zin = ZIPFILEzipfile(name)
+            try:
+                for member in zin.namelist():
+                    zout.writestr(dict_prefix[name] + member, zin.read(member))
+            finally:
+                zin.close()
+    finally:
+        zout.close()
+    return sidecar_name, dict_prefix
+
+
+def ReadArraySidecar(pointer):
+    """
+    #################################################################################
+    Description:
+    Reads the array given by a pointer returned by ArrayToSidecar
+    The npz file is opened once and each array is read (and decompressed) only when it is asked for
+    #################################################################################
+
+    :param pointer: dict
+        {'sidecar': path_to/filename of the npz, 'key': name of the array in the npz, ...}
+    :return tab: masked_array
+        array with its mask (masked values are set to 1e20)
+    """
+    name = pointer["sidecar"]
+    if name not in list(array_sidecar["handles"].keys()):
+        array_sidecar["handles"][name] = NPload(name)
+    handle = array_sidecar["handles"][name]
+    return NPma__masked_array(handle[pointer["key"] + "__data"], mask=handle[pointer["key"] + "__mask"],
+                              fill_value=1e20)
+
+
+def RehydrateArrays(dict_in):
+    """
+    #################################################################################
+    Description:
+    Replaces, in the given dive down dictionary (or list), all the pointers returned by ArrayToSidecar by the arrays
+    they point to (see ReadArraySidecar)
+    #################################################################################
+
+    :param dict_in: dict or list
+        dive down values (e.g., output of ComputeCollection or of the json file)
+    :return dict_out: dict or list
+        same structure with masked_arrays instead of the pointers
+    """
+    if isinstance(dict_in, dict) is True:
+        if sorted(list(dict_in.keys())) == ["key", "shape", "sidecar"]:
+            return ReadArraySidecar(dict_in)
+        return dict((key, RehydrateArrays(val)) for key, val in dict_in.items())
+    elif isinstance(dict_in, list) is True:
+        return [RehydrateArrays(val) for val in dict_in]
+    return dict_in
+
+
+def RenameArrayPointers(dict_in, sidecar_name, dict_prefix):
+    """
+    #################################################################################
+    Description:
+    Replaces, in the given dive down dictionary (or list), the pointers to the npz files merged by MergeArraySidecars by
+    pointers to the merged npz file
+    #################################################################################
+
+    :param dict_in: dict or list
+        dive down values
+    :param sidecar_name: string
+        path_to/filename of the merged npz file
+    :param dict_prefix: dict
+        prefix of the arrays of each merged file, output of MergeArraySidecars
+    :return dict_out: dict or list
+        same structure with the new pointers
+    """
+    if isinstance(dict_in, dict) is True:
+        if sorted(list(dict_in.keys())) == ["key", "shape", "sidecar"]:
+            if dict_in["sidecar"] not in list(dict_prefix.keys()):
+                return dict_in
+            return {"sidecar": sidecar_name, "key": dict_prefix[dict_in["sidecar"]] + dict_in["key"],
+                    "shape": dict_in["shape"]}
+        return dict((key, RenameArrayPointers(val, sidecar_name, dict_prefix)) for key, val in dict_in.items())
+    elif isinstance(dict_in, list) is True:
+        return [RenameArrayPointers(val, sidecar_name, dict_prefix) for val in dict_in]
+    return dict_in
+
+
+def SaveArraySidecar():
+    """
+    #################################################################################
+    Description:
+    Writes all the arrays kept by ArrayToSidecar in the npz file (compressed) given to StartArraySidecar and closes
+    the sidecar (ArrayToList returns lists again)
+    #################################################################################
+
+    :return:
+    """
+    name, dict_arrays = array_sidecar["name"], array_sidecar["arrays"]
+    array_sidecar["open"], array_sidecar["name"], array_sidecar["arrays"] = False, None, dict()
+    if name in list(array_sidecar["handles"].keys()):
+        array_sidecar["handles"].pop(name).close()
+    if len(dict_arrays) > 0:
+        NPsavez_compressed(name, **dict_arrays)
+    return
+
+
+def StartArraySidecar(sidecar_name):
+    """
+    #################################################################################
+    Description:
+    From now on, ArrayToList keeps the arrays (values and mask) in memory and returns pointers to them instead of lists
+    (see ArrayToSidecar), the arrays are written in a npz file by SaveArraySidecar
+    #################################################################################
+
+    :param sidecar_name: string
+        path_to/filename of the npz file ('.npz' is added if needed)
+    :return:
+    """
+    if sidecar_name.endswith(".npz") is False:
+        sidecar_name += ".npz"
+    array_sidecar["open"], array_sidecar["name"], array_sidecar["arrays"] = True, sidecar_name, dict()
+    return
+
+
 def BasinMask(tab_in, region_mask, box=None, lat1=None, lat2=None, latkey='', lon1=None, lon2=None, lonkey='',
               debug=False):
     keyerror = None
@@ -1734,6 +2017,8 @@ def get_year_by_year(tab, frequency="monthly"):
     #################################################################################
     Description:
     Reshape array to a year by year array
+    Each time step is put directly at its (year, month) or (year, day) position in a preallocated masked array,
+    positions without data (e.g., partial first / last years) are masked (daily: February 29th is not kept)
     #################################################################################
 
     :param tab: masked_array
@@ -1745,50 +2030,35 @@ def get_year_by_year(tab, frequency="monthly"):
     """
     tab = tab.reorder("t...")
     time_ax = tab.getTime().asComponentTime()
-    myshape = [1] + [ss for ss in tab.shape[1:]]
-    zeros = MV2zeros(myshape)
-    zeros = MV2masked_where(zeros == 0, zeros)
     if frequency == "daily":
-        days = MV2array(list(tt.day for tt in time_ax))
-        months = MV2array(list(tt.month for tt in time_ax))
-        months = MV2array([(mm*100)+dd for dd, mm in zip(days, months)])
+        # day of the year in a 365-day calendar
+        first_day = NPcumsum([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+        steps = NParray([first_day[tt.month - 1] + tt.day - 1 for tt in time_ax])
+        keep = NParray([tt.month != 2 or tt.day != 29 for tt in time_ax])
         tmm = CDMS2createAxis(list(range(365)), id="days")
-        m1 = time_ax[0].day
-        m2 = time_ax[-1].day
         t2 = 365
     elif frequency == "monthly":
-        months = MV2array(list(tt.month for tt in time_ax))
+        steps = NParray([tt.month - 1 for tt in time_ax])
+        keep = NPones(len(time_ax), dtype=bool)
         tmm = CDMS2createAxis(list(range(12)), id="months")
-        m1 = time_ax[0].month
-        m2 = time_ax[-1].month
         t2 = 12
     else:
         EnsoErrorsWarnings.unknown_frequency(frequency, INSPECTstack())
-    years = sorted(set(MV2array(list(tt.year for tt in time_ax))))
+    years, idx_years = NPunique(NParray([tt.year for tt in time_ax]), return_inverse=True)
     tyy = CDMS2createAxis(MV2array(years, dtype="int32"), id="years")
     axes = [tyy] + [tmm]
-    val = sorted(set(months))
-    tab_out = list()
-    if frequency == "daily":
-        val.remove(129)
-    for ii in val:
-        tmp = tab.compress(months == ii, axis=0)
-        if m1 != 1 and len(tmp) != len(years):
-            tmp = MV2concatenate((zeros, tmp))
-        if m2 != t2 and len(tmp) != len(years):
-            tmp = MV2concatenate((tmp, zeros))
-        tab_out.append(tmp)
-    tab_out = MV2array(tab_out)
-    tab_out = MV2masked_where(tab_out == 0, tab_out)
-    tab_out = tab_out.reorder("10")
+    # scatter (years, months|days, ...)
+    myshape = [len(years), t2] + [ss for ss in tab.shape[1:]]
+    tab_out = NPzeros(myshape, dtype=tab.dtype)
+    mask_out = NPones(myshape, dtype=bool)
+    tab_out[idx_years[keep], steps[keep]] = NPma__filled(tab, 0)[keep]
+    mask_out[idx_years[keep], steps[keep]] = NPma__getmaskarray(tab)[keep]
+    tab_out = MV2masked_where(mask_out, tab_out)
     if len(tab.shape) == 1:
-        tab_out = CDMS2createVariable(tab_out, axes=axes, attributes=tab.attributes, id=tab.id)
+        tab_out = CDMS2createVariable(tab_out, axes=axes, mask=mask_out, attributes=tab.attributes, id=tab.id)
     else:
         axes = axes + tab.getAxisList()[1:]
         grid = tab[0].getGrid()
-        mask = tab[0].mask
-        mask_out = MV2zeros(tab_out.shape)
-        mask_out[:, :] = mask
         tab_out = CDMS2createVariable(tab_out, axes=axes, grid=grid, mask=mask_out, attributes=tab.attributes,
                                       id=tab.id)
     return tab_out
@@ -2009,6 +2279,153 @@ def ReadAndSelectRegion(filename, varname, box=None, time_bounds=None, frequency
     return tab
 
 
+def ReadHeader(filename, varname, box=None, time_bounds=None):
+    """
+    #################################################################################
+    Description:
+    Reads only the header of the given 'varname' in the given 'filename' (no data is read) and estimates the size of the
+    array that ReadAndSelectRegion would read with the same 'box' and 'time_bounds'
+    On a curvilinear grid (2D latitude and longitude), the box is applied as the range of grid indices containing
+    all the cells inside the box (the 2D latitude and longitude are read)
+    #################################################################################
+
+    :param filename: string
+        string of the path to the file and name of the file to read
+    :param varname: string
+        name of the variable to read from 'filename'
+    :param box: string, optional
+        name of a region to select, must be defined in EnsoCollectionsLib.ReferenceRegions
+        default value is None
+    :param time_bounds: tuple, optional
+        tuple of the first and last dates to extract from the files (strings)
+        e.g., time_bounds=('1979-01-01T00:00:00', '2017-01-01T00:00:00')
+        default value is None
+
+    :return dict_header: dictionary
+        {'error': None or description of the problem, 'shape': shape in the file, 'shape_selected': estimated shape
+        after selection, 'itemsize': bytes per value, 'nbytes': estimated bytes read}
+        if the variable cannot be read, 'error' is given, the shapes are None and 'nbytes' is 0
+    """
+    dict_header = {"error": None, "shape": None, "shape_selected": None, "itemsize": 4, "nbytes": 0}
+    if OSpath__isfile(filename) is False:
+        dict_header["error"] = "no such file: " + str(filename)
+        return dict_header
+    try:
+        fi = CDMS2open(filename)
+    except Exception as e:
+        dict_header["error"] = "cannot open " + str(filename) + " (" + str(e) + ")"
+        return dict_header
+    try:
+        if varname not in fi.listvariables():
+            dict_header["error"] = "no variable " + str(varname) + " in " + str(filename)
+            return dict_header
+        var = fi[varname]
+        shape = list(var.shape)
+        try:
+            itemsize = var.dtype.itemsize
+        except:
+            itemsize = 4
+        region_ref = None if box is None else ReferenceRegions(box)
+        shape_selected = list(shape)
+        for num, axis in enumerate(var.getAxisList()):
+            if axis.isTime() is True and time_bounds is not None:
+                interval = (time_bounds[0], time_bounds[1])
+            elif axis.isLatitude() is True and region_ref is not None:
+                interval = region_ref["latitude"]
+            elif axis.isLongitude() is True and region_ref is not None:
+                interval = region_ref["longitude"]
+            else:
+                continue
+            # the axes values are read (not the variable)
+            try:
+                i1, i2 = axis.mapInterval(interval)[:2]
+            except:
+                continue
+            shape_selected[num] = min(max(i2 - i1, 0), shape[num])
+        if region_ref is not None and len(shape) > 1:
+            # curvilinear grid: the 2D latitude and longitude are read (not the variable)
+            try:
+                lat, lon = NParray(var.getLatitude()[:]), NParray(var.getLongitude()[:])
+            except:
+                lat, lon = None, None
+            if lat is not None and lon is not None and len(lat.shape) == 2 and list(lat.shape) == shape[-2:] and \
+                    lon.shape == lat.shape:
+                lat1, lat2 = region_ref["latitude"]
+                lon1, lon2 = region_ref["longitude"]
+                inside = (lat >= lat1) & (lat <= lat2) & ((lon - lon1) % 360 <= (lon2 - lon1))
+                for num, axis_nbr in enumerate([1, 0]):
+                    index = NPnonzero(inside.any(axis=axis_nbr))[0]
+                    shape_selected[len(shape) - 2 + num] = 0 if len(index) == 0 else int(index[-1] - index[0] + 1)
+                del inside, lat1, lat2, lon1, lon2
+            del lat, lon
+        dict_header.update({"shape": shape, "shape_selected": shape_selected, "itemsize": itemsize,
+                            "nbytes": int(NPproduct(shape_selected)) * itemsize})
+    finally:
+        fi.close()
+    return dict_header
+
+
+def ReadMetadata(filename, varname, time_axis=True):
+    """
+    #################################################################################
+    Description:
+    Reads only the metadata of the given 'varname' in the given 'filename' (no data is read): units, time period and
+    calendar, shape and grid
+    #################################################################################
+
+    :param filename: string
+        string of the path to the file and name of the file to read
+    :param varname: string
+        name of the variable to read from 'filename'
+    :param time_axis: boolean, optional
+        True if the variable must have a time axis (False for areacell or landmask)
+        default value is True
+
+    :return dict_metadata: dictionary
+        {'error': None or description of the problem, 'units': str, 'calendar': str, 'time_first': 'YYYY-MM',
+        'time_last': 'YYYY-MM', 'nbr_time_steps': int, 'shape': list, 'grid': bool}
+    """
+    dict_metadata = {"error": None, "units": None, "calendar": None, "time_first": None, "time_last": None,
+                     "nbr_time_steps": None, "shape": None, "grid": False}
+    if OSpath__isfile(filename) is False:
+        dict_metadata["error"] = "no such file: " + str(filename)
+        return dict_metadata
+    try:
+        fi = CDMS2open(filename)
+    except Exception as e:
+        dict_metadata["error"] = "cannot open " + str(filename) + " (" + str(e) + ")"
+        return dict_metadata
+    if varname not in fi.listvariables():
+        dict_metadata["error"] = "no variable " + str(varname) + " in " + str(filename)
+        fi.close()
+        return dict_metadata
+    var = fi[varname]
+    dict_metadata["shape"] = list(var.shape)
+    try:
+        dict_metadata["units"] = var.units
+    except:
+        pass
+    dict_metadata["grid"] = var.getGrid() is not None or \
+        (var.getLatitude() is not None and var.getLongitude() is not None)
+    time_ax = var.getTime()
+    if time_ax is not None:
+        try:
+            dict_metadata["calendar"] = time_ax.calendar
+        except:
+            dict_metadata["calendar"] = "gregorian"
+        # only the time axis is read
+        time_comp = time_ax.asComponentTime()
+        dict_metadata["time_first"] = str(time_comp[0].year).zfill(4) + "-" + str(time_comp[0].month).zfill(2)
+        dict_metadata["time_last"] = str(time_comp[-1].year).zfill(4) + "-" + str(time_comp[-1].month).zfill(2)
+        dict_metadata["nbr_time_steps"] = len(time_ax)
+    elif time_axis is True:
+        dict_metadata["error"] = "no time axis for " + str(varname) + " in " + str(filename)
+    if dict_metadata["grid"] is False and dict_metadata["error"] is None:
+        dict_metadata["error"] = "no horizontal grid for " + str(varname) + " in " + str(filename)
+    fi.close()
+    return dict_metadata
+
+
 def ReadAreaSelectRegion(filename, areaname='', box=None, **kwargs):
     """
     #################################################################################
@@ -2337,90 +2754,53 @@ def SaveNetcdf(netcdf_name, var1=None, var1_attributes={}, var1_name='', var1_ti
                var9_time_name=None, var10=None, var10_attributes={}, var10_name='', var10_time_name=None, var11=None,
                var11_attributes={}, var11_name='', var11_time_name=None, var12=None, var12_attributes={}, var12_name='',
                var12_time_name=None, frequency="monthly", global_attributes={}, **kwargs):
+    """
+    #################################################################################
+    Description:
+    Saves the given variables (var1, var2,... any number of them) in the given NetCDF file, as float32
+    If a NetCDF buffer is open (see StartNetcdfBuffer), the variables are kept in memory and written when the buffer is
+    flushed (see FlushNetcdfBuffer)
+    #################################################################################
+
+    :param netcdf_name: string
+        path_to/filename of the NetCDF (the file is created if it does not exist, else the variables are added)
+    :param varN: masked_array
+        variable to save
+    :param varN_attributes: dict, optional
+        attributes of varN
+    :param varN_name: string, optional
+        name of varN in the file, default is varN.id
+    :param varN_time_name: string, optional
+        if given, name of the time-like axis that replaces the time axis of varN (see TimeButNotTime)
+    :param frequency: string, optional
+        time frequency of the variables
+    :param global_attributes: dict, optional
+        global attributes of the file
+    :return:
+    """
     if OSpath_isdir(ntpath.dirname(netcdf_name)) is not True:
         list_strings = [
             "ERROR" + EnsoErrorsWarnings.message_formating(INSPECTstack()) + ": given path does not exist",
             str().ljust(5) + "netcdf_name = " + str(netcdf_name)]
         EnsoErrorsWarnings.my_error(list_strings)
-    if OSpath__isfile(netcdf_name) is True:
-        o = CDMS2open(netcdf_name, "a")
-    else:
-        o = CDMS2open(netcdf_name, "w+")
-    if var1 is not None:
-        if var1_name == '':
-            var1_name = var1.id
-        if var1_time_name is not None:
-            var1 = TimeButNotTime(var1, var1_time_name, frequency)
-        o.write(var1, attributes=var1_attributes, dtype="float32", id=var1_name)
-    if var2 is not None:
-        if var2_name == '':
-            var2_name = var2.id
-        if var2_time_name is not None:
-            var2 = TimeButNotTime(var2, var2_time_name, frequency)
-        o.write(var2, attributes=var2_attributes, dtype="float32", id=var2_name)
-    if var3 is not None:
-        if var3_name == '':
-            var3_name = var3.id
-        if var3_time_name is not None:
-            var3 = TimeButNotTime(var3, var3_time_name, frequency)
-        o.write(var3, attributes=var3_attributes, dtype="float32", id=var3_name)
-    if var4 is not None:
-        if var4_name == '':
-            var4_name = var4.id
-        if var4_time_name is not None:
-            var4 = TimeButNotTime(var4, var4_time_name, frequency)
-        o.write(var4, attributes=var4_attributes, dtype="float32", id=var4_name)
-    if var5 is not None:
-        if var5_name == '':
-            var5_name = var5.id
-        if var5_time_name is not None:
-            var5 = TimeButNotTime(var5, var5_time_name, frequency)
-        o.write(var5, attributes=var5_attributes, dtype="float32", id=var5_name)
-    if var6 is not None:
-        if var6_name == '':
-            var6_name = var6.id
-        if var6_time_name is not None:
-            var6 = TimeButNotTime(var6, var6_time_name, frequency)
-        o.write(var6, attributes=var6_attributes, dtype="float32", id=var6_name)
-    if var7 is not None:
-        if var7_name == '':
-            var7_name = var7.id
-        if var7_time_name is not None:
-            var7 = TimeButNotTime(var7, var7_time_name, frequency)
-        o.write(var7, attributes=var7_attributes, dtype="float32", id=var7_name)
-    if var8 is not None:
-        if var8_name == '':
-            var8_name = var8.id
-        if var8_time_name is not None:
-            var8 = TimeButNotTime(var8, var8_time_name, frequency)
-        o.write(var8, attributes=var8_attributes, dtype="float32", id=var8_name)
-    if var9 is not None:
-        if var9_name == '':
-            var9_name = var9.id
-        if var9_time_name is not None:
-            var9 = TimeButNotTime(var9, var9_time_name, frequency)
-        o.write(var9, attributes=var9_attributes, dtype="float32", id=var9_name)
-    if var10 is not None:
-        if var10_name == '':
-            var10_name = var10.id
-        if var10_time_name is not None:
-            var10 = TimeButNotTime(var10, var10_time_name, frequency)
-        o.write(var10, attributes=var10_attributes, dtype="float32", id=var10_name)
-    if var11 is not None:
-        if var11_name == '':
-            var11_name = var11.id
-        if var11_time_name is not None:
-            var11 = TimeButNotTime(var11, var11_time_name, frequency)
-        o.write(var11, attributes=var11_attributes, dtype="float32", id=var11_name)
-    if var12 is not None:
-        if var12_name == '':
-            var12_name = var12.id
-        if var12_time_name is not None:
-            var12 = TimeButNotTime(var12, var12_time_name, frequency)
-        o.write(var12, attributes=var12_attributes, dtype="float32", id=var12_name)
+    kwargs.update({
+        "var1": var1, "var1_attributes": var1_attributes, "var1_name": var1_name, "var1_time_name": var1_time_name,
+        "var2": var2, "var2_attributes": var2_attributes, "var2_name": var2_name, "var2_time_name": var2_time_name,
+        "var3": var3, "var3_attributes": var3_attributes, "var3_name": var3_name, "var3_time_name": var3_time_name,
+        "var4": var4, "var4_attributes": var4_attributes, "var4_name": var4_name, "var4_time_name": var4_time_name,
+        "var5": var5, "var5_attributes": var5_attributes, "var5_name": var5_name, "var5_time_name": var5_time_name,
+        "var6": var6, "var6_attributes": var6_attributes, "var6_name": var6_name, "var6_time_name": var6_time_name,
+        "var7": var7, "var7_attributes": var7_attributes, "var7_name": var7_name, "var7_time_name": var7_time_name,
+        "var8": var8, "var8_attributes": var8_attributes, "var8_name": var8_name, "var8_time_name": var8_time_name,
+        "var9": var9, "var9_attributes": var9_attributes, "var9_name": var9_name, "var9_time_name": var9_time_name,
+        "var10": var10, "var10_attributes": var10_attributes, "var10_name": var10_name,
+        "var10_time_name": var10_time_name, "var11": var11, "var11_attributes": var11_attributes,
+        "var11_name": var11_name, "var11_time_name": var11_time_name, "var12": var12,
+        "var12_attributes": var12_attributes, "var12_name": var12_name, "var12_time_name": var12_time_name})
     my_keys = sorted([key for key in list(kwargs.keys())
                       if "var" in key and str(key.replace("var", "")).isdigit() is True],
-                     key=lambda v: v.upper())
+                     key=lambda v: int(v.replace("var", "")))
+    list_variables = list()
     for key in my_keys:
         if kwargs[key] is not None:
             if key + "_name" not in list(kwargs.keys()) or \
@@ -2430,10 +2810,192 @@ def SaveNetcdf(netcdf_name, var1=None, var1_attributes={}, var1_name='', var1_ti
                 kwargs[key] = TimeButNotTime(kwargs[key], kwargs[key + "_time_name"], frequency)
             if key + "_attributes" not in list(kwargs.keys()):
                 kwargs[key + "_attributes"] = {}
-            o.write(kwargs[key], attributes=kwargs[key + "_attributes"], dtype="float32", id=kwargs[key + "_name"])
-    for att in sorted(list(global_attributes.keys()), key=lambda v: v.upper()):
-        o.__setattr__(att, global_attributes[att])
-    o.close()
+            list_variables.append([kwargs[key], kwargs[key + "_attributes"], kwargs[key + "_name"]])
+    if netcdf_buffer["open"] is True:
+        if netcdf_name not in list(netcdf_buffer["files"].keys()):
+            netcdf_buffer["files"][netcdf_name] = {"variables": list(), "global_attributes": dict()}
+        netcdf_buffer["files"][netcdf_name]["variables"] += list_variables
+        netcdf_buffer["files"][netcdf_name]["global_attributes"].update(global_attributes)
+    else:
+        WriteNetcdf(netcdf_name, list_variables, global_attributes)
+    return
+
+
+# NetCDFs waiting to be written, see StartNetcdfBuffer
+netcdf_buffer = {"open": False, "files": dict()}
+
+
+def StartNetcdfBuffer():
+    """
+    #################################################################################
+    Description:
+    From now on, SaveNetcdf keeps the variables in memory instead of opening the NetCDF at each call
+    The variables are written by FlushNetcdfBuffer (each NetCDF is opened once)
+    #################################################################################
+
+    :return:
+    """
+    netcdf_buffer["open"] = True
+    return
+
+
+def FlushNetcdfBuffer(deflate=True, deflate_level=1, shuffle=True):
+    """
+    #################################################################################
+    Description:
+    Writes all the variables kept in memory by SaveNetcdf (see StartNetcdfBuffer), each NetCDF is opened once, and
+    closes the buffer (SaveNetcdf writes directly again)
+    #################################################################################
+
+    :param deflate: boolean, optional
+        True to compress the variables (zlib)
+        default value is True
+    :param deflate_level: int, optional
+        level of compression, from 1 (fastest) to 9 (smallest)
+        default value is 1 (dive down variables are small and mostly read by the plotting tools)
+    :param shuffle: boolean, optional
+        True to shuffle the bytes before the compression (better compression of float32)
+        default value is True
+    :return:
+    """
+    dict_files = netcdf_buffer["files"]
+    netcdf_buffer["open"], netcdf_buffer["files"] = False, dict()
+    for netcdf_name in sorted(list(dict_files.keys())):
+        WriteNetcdf(netcdf_name, dict_files[netcdf_name]["variables"], dict_files[netcdf_name]["global_attributes"],
+                    deflate=deflate, deflate_level=deflate_level, shuffle=shuffle)
+    return
+
+
+def NetcdfBufferState():
+    """
+    #################################################################################
+    Description:
+    Returns the content of the NetCDF buffer (number of variables and global attributes of each NetCDF), to be given to
+    NetcdfBufferAdded
+    None is returned if the buffer is not open (see StartNetcdfBuffer)
+    #################################################################################
+
+    :return state: dict or None
+        {netcdf_name: [number of variables, global attributes]}
+    """
+    if netcdf_buffer["open"] is not True:
+        return None
+    return dict((netcdf_name, [len(dict_file["variables"]), dict(dict_file["global_attributes"])])
+                for netcdf_name, dict_file in netcdf_buffer["files"].items())
+
+
+def NetcdfBufferAdded(state):
+    """
+    #################################################################################
+    Description:
+    Returns the names of the variables and the global attributes added to the NetCDF buffer since the given state (see
+    NetcdfBufferState)
+    #################################################################################
+
+    :param state: dict or None
+        content of the NetCDF buffer given by NetcdfBufferState
+    :return dict_added: dict or None
+        {netcdf_name: {"variables": [name1, name2,...], "global_attributes": {...}}}, None if state is None or if the
+        buffer is not open
+    """
+    if state is None or netcdf_buffer["open"] is not True:
+        return None
+    dict_added = dict()
+    for netcdf_name, dict_file in netcdf_buffer["files"].items():
+        nbr_var, old_attributes = state[netcdf_name] if netcdf_name in list(state.keys()) else [0, dict()]
+        list_names = [name for var, attributes, name in dict_file["variables"][nbr_var:]]
+        new_attributes = dict((att, val) for att, val in dict_file["global_attributes"].items()
+                              if att not in list(old_attributes.keys()) or old_attributes[att] is not val)
+        if len(list_names) > 0 or len(new_attributes) > 0:
+            dict_added[netcdf_name] = {"variables": list_names, "global_attributes": new_attributes}
+    return dict_added
+
+
+def CopyNetcdfToBuffer(dict_added, old_name, new_name):
+    """
+    #################################################################################
+    Description:
+    Adds to the NetCDF buffer the variables and global attributes (given by NetcdfBufferAdded) that have already been
+    written in the NetCDFs named after old_name: they are read and kept for the NetCDFs named after new_name
+    Used to write the dive down of an observational diagnostic without computing it again
+    #################################################################################
+
+    :param dict_added: dict
+        {netcdf_name: {"variables": [name1, name2,...], "global_attributes": {...}}} (see NetcdfBufferAdded)
+    :param old_name: string
+        path_to/filename used to save the variables (netcdf_name given to the metric)
+    :param new_name: string
+        path_to/filename for which the variables are needed
+    :return copied: boolean
+        True if the variables have been copied, False if the buffer is not open or if a NetCDF is missing
+    """
+    if netcdf_buffer["open"] is not True:
+        return False
+    list_files = sorted(list(dict_added.keys()))
+    if any(len(dict_added[file1]["variables"]) > 0 and OSpath__isfile(file1) is not True for file1 in list_files):
+        return False
+    for file1 in list_files:
+        netcdf_name = file1.replace(old_name, new_name, 1)
+        if netcdf_name not in list(netcdf_buffer["files"].keys()):
+            netcdf_buffer["files"][netcdf_name] = {"variables": list(), "global_attributes": dict()}
+        if len(dict_added[file1]["variables"]) > 0:
+            ff = CDMS2open(file1)
+            for name in dict_added[file1]["variables"]:
+                # the attributes are read with the variable
+                netcdf_buffer["files"][netcdf_name]["variables"].append([ff(name), {}, name])
+            ff.close()
+        netcdf_buffer["files"][netcdf_name]["global_attributes"].update(dict_added[file1]["global_attributes"])
+    return True
+
+
+def WriteNetcdf(netcdf_name, list_variables, global_attributes={}, deflate=None, deflate_level=None, shuffle=None):
+    """
+    #################################################################################
+    Description:
+    Opens the given NetCDF once and writes all the given variables as float32
+    #################################################################################
+
+    :param netcdf_name: string
+        path_to/filename of the NetCDF (the file is created if it does not exist, else the variables are added)
+    :param list_variables: list
+        list of [variable, attributes, name]
+    :param global_attributes: dict, optional
+        global attributes of the file
+    :param deflate: boolean, optional
+        True to compress the variables (zlib)
+        default value is None, the current cdms2 setting is used
+    :param deflate_level: int, optional
+        level of compression, from 1 (fastest) to 9 (smallest)
+        default value is None, the current cdms2 setting is used
+    :param shuffle: boolean, optional
+        True to shuffle the bytes before the compression
+        default value is None, the current cdms2 setting is used
+    :return:
+    """
+    # compression flags are global in cdms2, only the given ones are changed and they are restored after writing
+    list_flags = [[deflate, CDMS2getNetcdfDeflateFlag, CDMS2setNetcdfDeflateFlag],
+                  [deflate_level, CDMS2getNetcdfDeflateLevelFlag, CDMS2setNetcdfDeflateLevelFlag],
+                  [shuffle, CDMS2getNetcdfShuffleFlag, CDMS2setNetcdfShuffleFlag]]
+    old_flags = list()
+    for flag, get_flag, set_flag in list_flags:
+        if flag is not None:
+            old_flags.append([get_flag(), set_flag])
+            set_flag(int(flag))
+    try:
+        if OSpath__isfile(netcdf_name) is True:
+            o = CDMS2open(netcdf_name, "a")
+        else:
+            o = CDMS2open(netcdf_name, "w+")
+        try:
+            for var, attributes, name in list_variables:
+                o.write(var, attributes=attributes, dtype="float32", id=name)
+            for att in sorted(list(global_attributes.keys()), key=lambda v: v.upper()):
+                o.__setattr__(att, global_attributes[att])
+        finally:
+            o.close()
+    finally:
+        for old_flag, set_flag in old_flags:
+            set_flag(old_flag)
     return
 
 
@@ -3000,122 +3562,63 @@ def CustomLinearRegression(y, x, sign_x=0, return_stderr=True, return_intercept=
         slope of the linear regression of y over x
         unadjusted standard error of the linear regression of y over x (if return_stderr=True)
     """
-    if sign_x != 0:
-        try:
-            len(y[0])
-        except:
-            slope, intercept, stderr = CustomLinearRegression1d(y, x, sign_x=sign_x)
-        else:
-            if x.shape != y.shape:
-                list_strings = [
-                    "ERROR" + EnsoErrorsWarnings.message_formating(INSPECTstack()) + ": array shape",
-                    str().ljust(5) + "different array shape for x " + str(x.shape) + " and y " + str(y.shape)]
-                EnsoErrorsWarnings.my_error(list_strings)
-            slope, intercept, stderr = MV2zeros(y[0].shape), MV2zeros(y[0].shape), MV2zeros(y[0].shape)
-            for ii in list(range(len(y[0]))):
-                try:
-                    len(y[0, ii])
-                except:
-                    slope[ii], intercept[ii], stderr[ii] = CustomLinearRegression1d(y[:, ii], x[:, ii], sign_x=sign_x)
-                else:
-                    for jj in list(range(len(y[0, ii]))):
-                        try:
-                            len(y[0, ii, jj])
-                        except:
-                            slope[ii, jj], intercept[ii, jj], stderr[ii, jj] = \
-                                CustomLinearRegression1d(y[:, ii, jj], x[:, ii, jj], sign_x=sign_x)
-                        else:
-                            for kk in list(range(len(y[0, ii, jj]))):
-                                try:
-                                    len(y[0, ii, jj, kk])
-                                except:
-                                    slope[ii, jj, kk], intercept[ii, jj, kk], stderr[ii, jj, kk] = \
-                                        CustomLinearRegression1d(y[:, ii, jj, kk], x[:, ii, jj, kk], sign_x=sign_x)
-                                else:
-                                    list_strings = [
-                                        "ERROR" + EnsoErrorsWarnings.message_formating(INSPECTstack()) +
-                                        ": array shape",
-                                        str().ljust(5) + str(x.shape) + " too many dimensions (not programmed)",
-                                        str().ljust(5) + "Please ckeck and modify the program if needed"]
-                                    EnsoErrorsWarnings.my_error(list_strings)
-
-    else:
-        results = GENUTILlinearregression(y, x=x, error=1, nointercept=None)
-        slope, intercept, stderr = results[0][0], results[0][1], results[1][0]
-        try:
-            slope[0]
-        except:
-            slope, intercept, stderr = float(slope), float(intercept), float(stderr)
-    try:
-        len(slope)
-    except:
-        pass
-    else:
-        axes = y[0].getAxisList()
-        grid = y[0].getGrid()
-        mask = y[0].mask
-        slope = CDMS2createVariable(MV2array(slope), mask=mask, grid=grid, axes=axes, id='slope')
-        stderr = CDMS2createVariable(MV2array(stderr), mask=mask, grid=grid, axes=axes, id='standart_error')
-        intercept = CDMS2createVariable(MV2array(intercept), mask=mask, grid=grid, axes=axes, id='intercept')
-    if return_stderr is False and return_intercept is False:
-        tab = copy.copy(slope)
-    else:
-        tab = [slope]
-        if return_stderr is True:
-            tab.append(stderr)
-        if return_intercept is True:
-            tab.append(intercept)
-    return tab
+    return LinearRegressionMasked(y, x, list_sign_x=[sign_x], return_stderr=return_stderr,
+                                  return_intercept=return_intercept)[0]
+
 
+def fill_dict_teleconnection(list_pairs, dataset1, dataset2, timebounds1, timebounds2, nyear1, nyear2, nbr,
+                             centered_rmse=0, biased_rmse=1):
+    """
+    #################################################################################
+    Description:
+    Fills the dive down metrics and NetCDF variables of the given pairs of maps (e.g., regions or events of a
+    teleconnection), their rmse, correlation and standard deviations are computed at once (see SkillStatistics)
+    #################################################################################
 
-def CustomLinearRegression1d(y, x, sign_x=1):
-    x = NParray(x)
-    y = NParray(y)
-    if sign_x == 1:
-        idx = NPnonzero(x > 0.)
-    elif sign_x == -1:
-        idx = NPnonzero(x < 0.)
-    if len(idx[0]) == 0:
-        slope, intercept, stderr = 0, 0, 0
-    else:
-        results = GENUTILlinearregression(y[idx], x=x[idx], error=1, nointercept=None)
-        slope, intercept, stderr = float(results[0][0]), float(results[0][1]), float(results[1][0])
-    return slope, intercept, stderr
-
-
-def fill_dict_teleconnection(tab1, tab2, dataset1, dataset2, timebounds1, timebounds2, nyear1, nyear2, nbr, var_name,
-                             add_name, units, centered_rmse=0, biased_rmse=1, dict_metric={}, dict_nc={}, ev_name=None,
-                             events1=None, events2=None):
-    # Metric 1
-    rmse_dive, keyerror = RmsAxis(tab1, tab2, axis="xy", centered=centered_rmse, biased=biased_rmse)
-    rmse_error_dive = None
-    # Metric 2
-    corr_dive = float(Correlation(tab1, tab2, axis="xy", centered=1, biased=1))
-    corr_error_dive = None
-    # Metric 3
-    std_mod_dive = float(Std(tab1, weights=None, axis="xy", centered=1, biased=1))
-    std_obs_dive = float(Std(tab2, weights=None, axis="xy", centered=1, biased=1))
-    std_dive = std_mod_dive / std_obs_dive
-    std_error_dive = None
-    list_met_name = ["RMSE_" + dataset2, "RMSE_error_" + dataset2, "CORR_" + dataset2, "CORR_error_" + dataset2,
-                     "STD_" + dataset2, "STD_error_" + dataset2]
-    list_metric_value = [float(rmse_dive), rmse_error_dive, corr_dive, corr_error_dive, std_dive, std_error_dive]
-    for tmp1, tmp2 in zip(list_met_name, list_metric_value):
-        dict_metric[tmp1 + "_" + add_name] = tmp2
-    dict_nc["var" + str(nbr)] = tab1
-    dict_dive = {"units": units, "number_of_years_used": nyear1, "time_period": str(timebounds1),
-                 "spatialSTD_" + dataset1: std_mod_dive}
-    if isinstance(events1, list) is True:
-        dict_dive[ev_name + "_years"] = str(events1)
-    dict_nc["var" + str(nbr) + "_attributes"] = dict_dive
-    dict_nc["var" + str(nbr) + "_name"] = var_name + dataset1
-    dict_dive = {"units": units, "number_of_years_used": nyear2, "time_period": str(timebounds2),
-                 "spatialSTD_" + dataset2: std_obs_dive}
-    if isinstance(events2, list) is True:
-        dict_dive[ev_name + "_years"] = str(events2)
-    dict_nc["var" + str(nbr + 1)] = tab2
-    dict_nc["var" + str(nbr + 1) + "_attributes"] = dict_dive
-    dict_nc["var" + str(nbr + 1) + "_name"] = var_name + dataset2
+    :param list_pairs: list of dict
+        {'tab1': modeled map, 'tab2': observed map, 'var_name': name in the NetCDF, 'add_name': suffix of the metrics,
+        'units': units, 'ev_name': event name (optional), 'events1' and 'events2': event years (optional)}
+    :param nbr: int
+        number of the first variable in the NetCDF, two variables per pair
+    :return dict_metric, dict_nc: dict
+    """
+    dict_metric, dict_nc = dict(), dict()
+    # rmse, correlation and standard deviations of all pairs computed at once
+    list_stat = SkillStatistics([pair["tab1"] for pair in list_pairs], [pair["tab2"] for pair in list_pairs],
+                                weights=None, biased=1)
+    for pair, dict_stat in zip(list_pairs, list_stat):
+        # Metric 1
+        rmse_dive = dict_stat["rmse_centered"] if centered_rmse == 1 else dict_stat["rmse"]
+        if biased_rmse != 1:
+            rmse_dive = rmse_dive * NPsqrt(dict_stat["weight_sum"] / (dict_stat["weight_sum"] - 1.))
+        rmse_error_dive = None
+        # Metric 2
+        corr_dive = dict_stat["correlation"]
+        corr_error_dive = None
+        # Metric 3
+        std_mod_dive, std_obs_dive = dict_stat["std_tab"], dict_stat["std_ref"]
+        std_dive = std_mod_dive / std_obs_dive
+        std_error_dive = None
+        list_met_name = ["RMSE_" + dataset2, "RMSE_error_" + dataset2, "CORR_" + dataset2, "CORR_error_" + dataset2,
+                         "STD_" + dataset2, "STD_error_" + dataset2]
+        list_metric_value = [float(rmse_dive), rmse_error_dive, corr_dive, corr_error_dive, std_dive, std_error_dive]
+        for tmp1, tmp2 in zip(list_met_name, list_metric_value):
+            dict_metric[tmp1 + "_" + pair["add_name"]] = tmp2
+        dict_nc["var" + str(nbr)] = pair["tab1"]
+        dict_dive = {"units": pair["units"], "number_of_years_used": nyear1, "time_period": str(timebounds1),
+                     "spatialSTD_" + dataset1: std_mod_dive}
+        if isinstance(pair.get("events1"), list) is True:
+            dict_dive[pair["ev_name"] + "_years"] = str(pair["events1"])
+        dict_nc["var" + str(nbr) + "_attributes"] = dict_dive
+        dict_nc["var" + str(nbr) + "_name"] = pair["var_name"] + dataset1
+        dict_dive = {"units": pair["units"], "number_of_years_used": nyear2, "time_period": str(timebounds2),
+                     "spatialSTD_" + dataset2: std_obs_dive}
+        if isinstance(pair.get("events2"), list) is True:
+            dict_dive[pair["ev_name"] + "_years"] = str(pair["events2"])
+        dict_nc["var" + str(nbr + 1)] = pair["tab2"]
+        dict_nc["var" + str(nbr + 1) + "_attributes"] = dict_dive
+        dict_nc["var" + str(nbr + 1) + "_name"] = pair["var_name"] + dataset2
+        nbr += 2
     return dict_metric, dict_nc
 
 
@@ -3126,6 +3629,8 @@ def FindXYMinMaxInTs(tab, return_val='both', smooth=False, axis=0, window=5, met
     Finds in tab in each time step the position (t,x,y,z) of the minimum (return_val='mini') or the maximum
     (return_val='maxi') or both values (if return_val is neither 'mini' nor 'maxi')
     Returned position(s) are not the position in tab but in the (t,x,y,z) space defined by tab axes
+    All time steps are smoothed and located at once (same positions as EnsoToolsLib.find_xy_min_max applied to each
+    time step)
 
     Uses uvcdat for smoothing
     #################################################################################
@@ -3143,7 +3648,7 @@ def FindXYMinMaxInTs(tab, return_val='both', smooth=False, axis=0, window=5, met
 
     See function EnsoUvcdatToolsLib.Smoothing
     :param axis: integer, optional
-        axis along which to smooth the data
+        axis of a time step (i.e., time axis excluded) along which to smooth the data
         default value is the first axis (0)
     :param window: odd integer, optional
         number of points used for the moving window average
@@ -3157,14 +3662,25 @@ def FindXYMinMaxInTs(tab, return_val='both', smooth=False, axis=0, window=5, met
     :return: minimum/maximum position or both minimum and maximum positions, int, float or list
         position(s) in the (t,x,y,z) space defined by tab axes of the minimum and/or maximum values of tab
     """
-    tab_ts = list()
-    for tt in list(range(len(tab))):
-        if smooth is True:
-            tmp, unneeded = Smoothing(tab[tt], '', axis=axis, window=window, method=method)
-        else:
-            tmp = copy.copy(tab[tt])
-        tab_ts.append(find_xy_min_max(tmp, return_val=return_val))
-    tab_ts = MV2array(tab_ts)
+    # smooths all time steps at once ('axis' is given for a time step, i.e., without the time axis)
+    if smooth is True:
+        tmp, unneeded = Smoothing(tab, '', axis=axis + 1, window=window, method=method)
+    else:
+        tmp = copy.copy(tab)
+    # masked argmin / argmax of all time steps (as find_xy_min_max, masked values are ignored and the first position is
+    # returned for ties or fully masked time steps)
+    shape = tmp.shape[1:]
+    list_ax = [tmp.getAxis(ii + 1)[:] for ii in range(len(shape))]
+    list_pos = list()
+    if return_val != 'maxi':
+        idx = NPargmin(NPma__filled(tmp, NPinf).reshape((len(tmp), -1)), axis=1)
+        list_pos.append([list_ax[ii][jj] for ii, jj in enumerate(NPunravel_index(idx, shape))])
+    if return_val != 'mini':
+        idx = NPargmax(NPma__filled(tmp, -NPinf).reshape((len(tmp), -1)), axis=1)
+        list_pos.append([list_ax[ii][jj] for ii, jj in enumerate(NPunravel_index(idx, shape))])
+    # same layout as find_xy_min_max for each time step: (time), (time, 2), (time, ndim) or (time, 2, ndim)
+    list_pos = [pos[0] if len(shape) == 1 else NPstack(pos, axis=1) for pos in list_pos]
+    tab_ts = MV2array(list_pos[0] if len(list_pos) == 1 else NPstack(list_pos, axis=1))
     tab_ts.setAxis(0, tab.getAxis(0))
     return tab_ts
 
@@ -3278,7 +3794,7 @@ def LinearRegressionAndNonlinearity(y, x, return_stderr=True, return_intercept=T
     Uses uvcdat
     #################################################################################
 
-    :param y: masked_array
+    :param y: masked_array or list of masked_arrays
         masked_array (uvcdat cdms2) containing a variable, with many attributes attached (short_name, units,...)
     :param x: masked_array
         masked_array (uvcdat cdms2) containing a variable, with many attributes attached (short_name, units,...)
@@ -3292,16 +3808,179 @@ def LinearRegressionAndNonlinearity(y, x, return_stderr=True, return_intercept=T
             [slope_negative_values, stderr_negative_values]: lists of floats
         slope of the linear regression of y over x
         unadjusted standard error of the linear regression of y over x (if return_stderr=True)
+        if y is a list of variables, one such triplet per variable (x moments are computed once for all of them)
     """
-    # all points
-    all_values = CustomLinearRegression(y, x, 0, return_stderr=return_stderr, return_intercept=return_intercept)
-    # positive SSTA = El Nino
-    positive_values = CustomLinearRegression(y, x, 1, return_stderr=return_stderr, return_intercept=return_intercept)
-    # negative SSTA = La Nina
-    negative_values = CustomLinearRegression(y, x, -1, return_stderr=return_stderr, return_intercept=return_intercept)
+    # all points, positive SSTA = El Nino, negative SSTA = La Nina (x moments are computed once for the three)
+    if isinstance(y, list):
+        return LinearRegressionMasked(
+            y, x, list_sign_x=[0, 1, -1], return_stderr=return_stderr, return_intercept=return_intercept)
+    all_values, positive_values, negative_values = LinearRegressionMasked(
+        y, x, list_sign_x=[0, 1, -1], return_stderr=return_stderr, return_intercept=return_intercept)
     return all_values, positive_values, negative_values
 
 
+def LinearRegressionMasked(y, x, list_sign_x=[0], return_stderr=True, return_intercept=True, return_correlation=False):
+    """
+    #################################################################################
+    Description:
+    Linear regression of y over x along the first (time) axis, computed in one pass from the moments of x and y (sums
+    of x, x**2, y, y**2 and x*y) on the points where neither x nor y is masked
+    x can either be a time series (1D), it is then broadcast against every point of y without creating a map of x, or
+    have the same shape as y
+    The regression can also be computed for values of x>0 and/or x<0: the moments of all the requested subsets are
+    computed at the same time
+    y can be a list of variables (e.g., several heat fluxes) regressed against the same x: the moments of x and the
+    subsets x>0 and x<0 are then computed only once for all of them
+    Gives the same slope, intercept and unadjusted standard error as genutil.linearregression
+
+    Uses numpy
+    #################################################################################
+
+    :param y: masked_array or list of masked_arrays
+        masked_array (uvcdat cdms2) containing a variable, with many attributes attached (short_name, units,...)
+        or list of masked_arrays with the same time axis as x
+    :param x: masked_array
+        masked_array (uvcdat cdms2) containing a variable, with many attributes attached (short_name, units,...)
+        time series (1D) or same shape as y
+    :param list_sign_x: list of int, optional
+        default value = [0], computes the linear regression of y over x. You can add -1 or 1 to compute the linear
+        regression of y over x for x<0 or x>0 respectively (e.g., [0, 1, -1] for all points, x>0 and x<0)
+    :param return_stderr: boolean, optional
+        default value = True, returns the the unadjusted standard error
+        True if you want the unadjusted standard error, if you don't want it pass anything but true
+    :param return_intercept: boolean, optional
+        default value = True, returns the the interception value of the linear regression
+        True if you want the interception value, if you don't want it pass anything but true
+    :param return_correlation: boolean, optional
+        default value = False, returns the correlation of y and x (computed from the same moments)
+        True if you want the correlation, if you don't want it pass anything but true
+    :return list_out: list
+        one element per value in list_sign_x, slope or [slope, stderr, intercept, correlation] (as
+        CustomLinearRegression, the correlation being added at the end if asked)
+        floats if y is a time series, masked_arrays (y[0] shape) otherwise
+        if y is a list, one list_out per element of y
+    """
+    list_y = y if isinstance(y, list) else [y]
+    need_syy = True if (return_stderr is True or return_correlation is True) else False
+    xf = NPma__filled(x, 0.).astype('float64')
+    xm = NPma__getmaskarray(x)
+    if len(x.shape) == 1:
+        # moments of x (weights along time, one set per sign): contracted against y with tensordot
+        xv = (~xm).astype('float64')
+        list_w = list()
+        for sign_x in list_sign_x:
+            if sign_x == 1:
+                list_w.append(xv * (xf > 0))
+            elif sign_x == -1:
+                list_w.append(xv * (xf < 0))
+            else:
+                list_w.append(xv)
+        ww = NPstack(list_w)
+        ww = NPstack([ww, ww * xf, ww * xf**2], axis=1)
+        del list_w, xv
+    else:
+        # subsets of x (shared by all y)
+        list_w = list()
+        for sign_x in list_sign_x:
+            if sign_x == 1:
+                list_w.append(~xm & (xf > 0))
+            elif sign_x == -1:
+                list_w.append(~xm & (xf < 0))
+            else:
+                list_w.append(~xm)
+    list_all = list()
+    for yy in list_y:
+        if len(x.shape) > 1 and x.shape != yy.shape:
+            list_strings = [
+                "ERROR" + EnsoErrorsWarnings.message_formating(INSPECTstack()) + ": array shape",
+                str().ljust(5) + "different array shape for x " + str(x.shape) + " and y " + str(yy.shape)]
+            EnsoErrorsWarnings.my_error(list_strings)
+        valid = ~NPma__getmaskarray(yy)
+        yf = NPma__filled(yy, 0.).astype('float64')
+        if len(x.shape) == 1:
+            vv = valid.astype('float64')
+            # n, sx, sxx (count only points where y is not masked)
+            m_x = NPtensordot(ww, vv, axes=(2, 0))
+            # sy, sxy
+            m_y = NPtensordot(ww[:, :2], yf, axes=(2, 0))
+            m_yy = NPtensordot(ww[:, 0], yf**2, axes=(1, 0)) if need_syy is True else None
+            list_moments = [[m_x[ii, 0], m_x[ii, 1], m_x[ii, 2], m_y[ii, 0], m_y[ii, 1],
+                             m_yy[ii] if need_syy is True else None] for ii in range(len(list_sign_x))]
+            del vv, m_x, m_y, m_yy
+        else:
+            valid = valid & ~xm
+            list_moments = list()
+            for w_x in list_w:
+                w_xy = (valid & w_x).astype('float64')
+                wx, wy = w_xy * xf, w_xy * yf
+                list_moments.append([w_xy.sum(axis=0), wx.sum(axis=0), (wx * xf).sum(axis=0), wy.sum(axis=0),
+                                     (wx * yf).sum(axis=0), (wy * yf).sum(axis=0) if need_syy is True else None])
+                del w_xy, wx, wy
+        list_out = list()
+        for sign_x, (nn, sx, sxx, sy, sxy, syy) in zip(list_sign_x, list_moments):
+            with NPerrstate(divide='ignore', invalid='ignore'):
+                sxx_c = sxx - sx**2 / nn
+                sxy_c = sxy - sx * sy / nn
+                slope = sxy_c / sxx_c
+                intercept = (sy - slope * sx) / nn
+                if return_stderr is True:
+                    ssr = syy - sy**2 / nn - slope * sxy_c
+                    stderr = NPsqrt(NPwhere(ssr > 0, ssr, 0.) / (nn - 2.) / sxx_c)
+                else:
+                    stderr = None
+                if return_correlation is True:
+                    corr = sxy_c / NPsqrt(sxx_c * (syy - sy**2 / nn))
+                else:
+                    corr = None
+            if len(yy.shape) == 1:
+                if sign_x != 0 and nn == 0:
+                    slope, intercept, stderr, corr = 0, 0, 0, 0
+                else:
+                    slope, intercept = float(slope), float(intercept)
+                    stderr = float(stderr) if return_stderr is True else None
+                    corr = float(corr) if return_correlation is True else None
+            else:
+                if sign_x != 0:
+                    # no value of x with the given sign: slope, intercept, stderr and correlation set to 0 (as in
+                    # the 1d case)
+                    slope, intercept = NPwhere(nn == 0, 0., slope), NPwhere(nn == 0, 0., intercept)
+                    if return_stderr is True:
+                        stderr = NPwhere(nn == 0, 0., stderr)
+                    if return_correlation is True:
+                        corr = NPwhere(nn == 0, 0., corr)
+                mask = NPisnan(slope) | (~valid.any(axis=0))
+                axes, grid = yy[0].getAxisList(), yy[0].getGrid()
+                slope = CDMS2createVariable(MV2masked_where(mask, slope), mask=mask, grid=grid, axes=axes,
+                                            id='slope')
+                intercept = CDMS2createVariable(MV2masked_where(mask, intercept), mask=mask, grid=grid, axes=axes,
+                                                id='intercept')
+                if return_stderr is True:
+                    mask2 = mask | NPisnan(stderr)
+                    stderr = CDMS2createVariable(MV2masked_where(mask2, stderr), mask=mask2, grid=grid, axes=axes,
+                                                 id='standart_error')
+                if return_correlation is True:
+                    mask3 = mask | NPisnan(corr)
+                    corr = CDMS2createVariable(MV2masked_where(mask3, corr), mask=mask3, grid=grid, axes=axes,
+                                               id='correlation')
+            if return_stderr is not True and return_intercept is not True and return_correlation is not True:
+                list_out.append(slope)
+            else:
+                tab = [slope]
+                if return_stderr is True:
+                    tab.append(stderr)
+                if return_intercept is True:
+                    tab.append(intercept)
+                if return_correlation is True:
+                    tab.append(corr)
+                list_out.append(tab)
+        list_all.append(list_out)
+        del list_moments, valid, yf
+    if isinstance(y, list):
+        return list_all
+    else:
+        return list_all[0]
+
+
 def LinearRegressionTsAgainstMap(y, x, return_stderr=True):
     """
     #################################################################################
@@ -3323,24 +4002,25 @@ def LinearRegressionTsAgainstMap(y, x, return_stderr=True):
         slope of the linear regression of y over x
         unadjusted standard error of the linear regression of y over x (if return_stderr=True)
     """
-    tmp = MV2zeros(y.shape)
-    for ii in list(range(len(tmp))):
-        tmp[ii].fill(x[ii])
-    tmp = CDMS2createVariable(tmp, mask=y.mask, grid=y.getGrid(), axes=y.getAxisList(), id=x.id)
-    slope, stderr = GENUTILlinearregression(y, x=tmp, error=1, nointercept=1)
+    # x is broadcast against every point of y (no map of x is created)
+    tab = LinearRegressionMasked(y, x, list_sign_x=[0], return_stderr=return_stderr, return_intercept=False)[0]
     if return_stderr:
+        slope, stderr = tab
         return slope, stderr
     else:
-        return slope
+        return tab
 
 
-def LinearRegressionTsAgainstTs(y, x, nbr_years_window, return_stderr=True, frequency=None, debug=False):
+def LinearRegressionTsAgainstTs(y, x, nbr_years_window, return_stderr=True, frequency=None, debug=False,
+                                return_correlation=False):
     """
     #################################################################################
     Description:
     Custom version of genutil.linearregression
     This function offers the possibility to compute the linear regression of a time series against a lead-lag time
     series
+    The years of y and x are aligned once and the regression is computed for all lead-lag timesteps (and every point
+    of y) in a single pass by LinearRegressionMasked (x is broadcast, no map of x is created)
 
     Uses uvcdat
     #################################################################################
@@ -3361,9 +4041,13 @@ def LinearRegressionTsAgainstTs(y, x, nbr_years_window, return_stderr=True, freq
     :param debug: boolean, optional
         default value = False debug mode not activated
         If you want to activate the debug mode set it to True (prints regularly to see the progress of the calculation)
-    :return slope, stderr: floats
+    :param return_correlation: boolean, optional
+        default value = False, returns the lead-lag correlation of y and x (computed from the same moments)
+        True if you want the correlation, if you don't want it pass anything but true
+    :return slope, stderr, correlation: masked_arrays
         slope of the linear regression of y over x
         unadjusted standard error of the linear regression of y over x (if return_stderr=True)
+        correlation of y and x (if return_correlation=True)
     """
     if frequency == 'daily':
         nbr_timestep = nbr_years_window * 365
@@ -3374,50 +4058,44 @@ def LinearRegressionTsAgainstTs(y, x, nbr_years_window, return_stderr=True, freq
     else:
         EnsoErrorsWarnings.unknown_frequency(frequency, INSPECTstack())
     tab_yy_mm = Event_selection(y, frequency, nbr_years_window=nbr_years_window)
-    myshape = [nbr_timestep] + [ss for ss in y.shape[1:]]
+    # aligns the years of the composite and of x (the same for every lead-lag timestep)
+    tmp1 = tab_yy_mm
+    tmp2 = copy.copy(x)
+    yy1 = tab_yy_mm.getAxis(0)[0]
+    yy2 = tmp2.getTime().asComponentTime()[0].year
+    if yy1 == yy2:
+        tmp1 = tmp1[:len(tmp2)]
+    elif yy1 < yy2:
+        tmp1 = tmp1[yy2 - yy1:len(tmp2)]
+    else:
+        tmp2 = tmp2[yy2 - yy1:]
+        tmp1 = tmp1[:len(x)]
+    if len(tmp2) > len(tmp1):
+        tmp2 = tmp2[:len(tmp1)]
+    elif len(tmp1) > len(tmp2):
+        tmp1 = tmp1[:len(tmp2)]
+    if debug is True:
+        dict_debug = {'axes1': str([ax.id for ax in tmp1.getAxisList()]), 'shape1': str(tmp1.shape),
+                      'line1': "first year is " + str(tmp1.getAxis(0)[0]),
+                      'axes2': str([ax.id for ax in tmp2.getAxisList()]), 'shape2': str(tmp2.shape),
+                      'line2': "first year is " + str(tmp2.getTime().asComponentTime()[0].year)}
+        EnsoErrorsWarnings.debug_mode('\033[93m', str(y.id) + " regressed against " + str(x.id), 25, **dict_debug)
+    # regression of all lead-lag timesteps at once: years are the first axis of tmp1 and x is broadcast against it
+    tab = LinearRegressionMasked(tmp1, tmp2, list_sign_x=[0], return_stderr=return_stderr, return_intercept=False,
+                                 return_correlation=return_correlation)[0]
+    if not isinstance(tab, list):
+        tab = [tab]
     tmp_ax = CDMS2createAxis(list(range(nbr_timestep)), id='months')
-    slope_out = MV2zeros(myshape)
-    slope_out.setAxisList([tmp_ax] + y.getAxisList()[1:])
-    stderr_out = MV2zeros(myshape)
-    stderr_out.setAxisList([tmp_ax] + y.getAxisList()[1:])
-    for ii in list(range(nbr_timestep)):
-        tmp1 = tab_yy_mm[:, ii]
-        tmp2 = copy.copy(x)
-        yy1 = tab_yy_mm.getAxis(0)[0]
-        yy2 = tmp2.getTime().asComponentTime()[0].year
-        if yy1 == yy2:
-            tmp1 = tmp1[:len(tmp2)]
-        elif yy1 < yy2:
-            tmp1 = tmp1[yy2 - yy1:len(tmp2)]
-        else:
-            tmp2 = tmp2[yy2 - yy1:]
-            tmp1 = tmp1[:len(x)]
-        if len(tmp2) > len(tmp1):
-            tmp2 = tmp2[:len(tmp1)]
-        # if debug is True:
-        #     yy1 = tmp1.getAxis(0)[0]
-        #     yy2 = tmp2.getTime().asComponentTime()[0].year
-        #     EnsoErrorsWarnings.DebugMode('\033[93m', "EnsoUvcdatToolsLib LinearRegressionTsAgainstTs", 20)
-        #     dict_debug = {'axes1': str([ax.id for ax in tmp1.getAxisList()]), 'shape1': str(tmp1.shape),
-        #                   'line1': "first year is " + str(yy1),
-        #                   'axes2': str([ax.id for ax in tmp2.getAxisList()]), 'shape2': str(tmp2.shape),
-        #                   'line2': "first year is " + str(yy2)}
-        #     EnsoErrorsWarnings.DebugMode('\033[93m', str(x.id) + " regressed against " + str(y.id), 25, **dict_debug)
-        if tmp2.shape == tmp1.shape:
-            tmp3 = copy.copy(tmp2)
-        else:
-            tmp3 = MV2zeros(tmp1.shape)
-            for jj in list(range(len(tmp3))):
-                tmp3[jj].fill(tmp2[jj])
-        tmp3 = CDMS2createVariable(tmp3, mask=tmp1.mask, grid=tmp1.getGrid(), axes=tmp1.getAxisList(), id=x.id)
-        slope, stderr = GENUTILlinearregression(tmp1, x=tmp3, error=1, nointercept=1)
-        slope_out[ii] = slope
-        stderr_out[ii] = stderr
-        del slope, stderr, tmp1, tmp2, tmp3, yy1, yy2
-    if return_stderr:
-        return slope_out, stderr_out
+    axes = [tmp_ax] + y.getAxisList()[1:]
+    list_out = list()
+    for tmp in tab:
+        tmp.setAxisList(axes)
+        list_out.append(tmp)
+    del tab, tmp1, tmp2, yy1, yy2
+    if len(list_out) == 1:
+        return list_out[0]
     else:
-        return slope_out
+        return tuple(list_out)
 
 
 def PreProcessTS(tab, info, areacell=None, average=False, compute_anom=False, compute_sea_cycle=False, debug=False,
@@ -3525,29 +4203,171 @@ def ReadSelectRegionCheckUnits(filename, varname, varfamily, box=None, time_boun
     return tab, keyerror
 
 
+# observational fields saved with a reference bundle, read instead of the files (see StartReferenceFields)
+reference_fields = {"open": False, "update": False, "directory": None, "entries": dict(), "files": list(),
+                    "portable": False}
+
+
+def StartReferenceFields(directory, entries, update=False, list_files=None, portable=False):
+    """
+    #################################################################################
+    Description:
+    From now on, Read_data_mask_area reads the fields (variable selected in the region, with checked units and masked
+    land / ocean, and its areacell) saved in the given directory instead of the files, if the files have not changed
+    If update is True, the fields read from the given files (list_files) that are not yet saved are added
+    #################################################################################
+
+    :param directory: string
+        path_to/directory of the saved fields (one NetCDF per field)
+    :param entries: dict
+        saved fields {key: {'file': NetCDF, 'id': variable id, 'name': variable name, 'area': bool}} (see
+        reference_field_key), completed if update is True
+    :param update: boolean, optional
+        True to save the fields read from 'list_files' that are not in 'entries'
+        default value is False
+    :param list_files: list, optional
+        path_to/filename of the files whose fields may be saved (e.g., the observational files)
+        default value is None, no field is saved
+    :param portable: boolean, optional
+        True if the files are identified by their name and size only (see EnsoToolsLib.file_fingerprint)
+        default value is False
+    :return:
+    """
+    reference_fields.update({"open": True, "update": update, "directory": directory, "entries": entries,
+                             "files": list() if list_files is None else list(list_files), "portable": portable})
+    return
+
+
+def StopReferenceFields():
+    """
+    #################################################################################
+    Description:
+    Read_data_mask_area reads the files again (see StartReferenceFields)
+    #################################################################################
+
+    :return entries: dict
+        saved fields (see StartReferenceFields)
+    """
+    entries = reference_fields["entries"]
+    reference_fields.update({"open": False, "update": False, "directory": None, "entries": dict(), "files": list(),
+                             "portable": False})
+    return entries
+
+
+def reference_field_key(file_data, name_data, type_data, region, file_area, name_area, file_mask, name_mask,
+                        maskland, maskocean, time_bounds, frequency):
+    """
+    #################################################################################
+    Description:
+    Key of a field saved with a reference bundle (see StartReferenceFields): arguments of Read_data_mask_area and
+    fingerprint of the files
+    None is returned if no field is read or saved
+    #################################################################################
+    """
+    if reference_fields["open"] is not True:
+        return None
+    fingerprint = file_fingerprint([file_data, file_area, file_mask], portable=reference_fields["portable"])
+    return json.dumps([fingerprint, name_data, type_data, region, name_area, name_mask, maskland, maskocean,
+                       time_bounds, frequency], sort_keys=True, default=str)
+
+
+def ReadReferenceField(key):
+    """
+    #################################################################################
+    Description:
+    Reads the field saved with the given key (see StartReferenceFields)
+    #################################################################################
+
+    :param key: string or None
+        key of the field (see reference_field_key)
+    :return variable, areacell: masked_array
+        variable and areacell as returned by Read_mask_area, None if the field is not saved
+    """
+    if key is None or key not in list(reference_fields["entries"].keys()):
+        return None, None
+    entry = reference_fields["entries"][key]
+    fi = CDMS2open(OSpath__join(reference_fields["directory"], entry["file"]))
+    try:
+        variable = fi("variable")
+        areacell = fi("areacell") if entry["area"] is True else None
+    finally:
+        fi.close()
+    variable.id = entry["id"]
+    if entry["name"] is not None:
+        variable.name = entry["name"]
+    if areacell is not None:
+        areacell.id = "areacell"
+    return variable, areacell
+
+
+def SaveReferenceField(key, file_data, variable, areacell):
+    """
+    #################################################################################
+    Description:
+    Saves the given field (in its own NetCDF, with its type) if the reference fields are updated and if it has been
+    read from the given files (see StartReferenceFields)
+    #################################################################################
+
+    :param key: string or None
+        key of the field (see reference_field_key)
+    :param file_data: string or list of strings
+        path_to/filename of the file(s) read
+    :param variable: masked_array
+        variable returned by Read_mask_area
+    :param areacell: masked_array or None
+        areacell returned by Read_mask_area
+    :return:
+    """
+    if key is None or reference_fields["update"] is not True or key in list(reference_fields["entries"].keys()):
+        return
+    if isinstance(file_data, list) is False:
+        file_data = [file_data]
+    if any(ff not in reference_fields["files"] for ff in file_data):
+        return
+    entry = {"file": "field_" + str(len(reference_fields["entries"])).zfill(5) + ".nc", "id": variable.id,
+             "name": getattr(variable, "name", None), "area": areacell is not None}
+    o = CDMS2open(OSpath__join(reference_fields["directory"], entry["file"]), "w+")
+    try:
+        o.write(variable, id="variable")
+        if areacell is not None:
+            o.write(areacell, id="areacell")
+    finally:
+        o.close()
+    reference_fields["entries"][key] = entry
+    return
+
+
 def Read_data_mask_area(file_data, name_data, type_data, metric, region, file_area='', name_area='', file_mask='',
                         name_mask='', maskland=False, maskocean=False, time_bounds=None, debug=False, **kwargs):
     keyerror1, keyerror2, keyerror3 = None, None, None
-    # Read variable
-    if debug is True:
-        dict_debug = {'file1': '(' + type_data + ') ' + str(file_data), 'var1': '(' + type_data + ') ' + str(name_data)}
-        EnsoErrorsWarnings.debug_mode('\033[93m', 'Files', 20, **dict_debug)
-    variable, keyerror1 = ReadSelectRegionCheckUnits(file_data, name_data, type_data, box=region,
-                                                     time_bounds=time_bounds, **kwargs)
-    if debug is True:
-        dict_debug = {'axes1': '(' + type_data + ') ' + str([ax.id for ax in variable.getAxisList()]),
-                      'shape1': '(' + type_data + ') ' + str(variable.shape),
-                      'time1': '(' + type_data + ') ' + str(TimeBounds(variable))}
-        EnsoErrorsWarnings.debug_mode('\033[93m', 'after ReadSelectRegionCheckUnits', 20, **dict_debug)
+    # field saved with a reference bundle (see StartReferenceFields)
+    field_key = reference_field_key(file_data, name_data, type_data, region, file_area, name_area, file_mask,
+                                    name_mask, maskland, maskocean, time_bounds, kwargs.get('frequency'))
+    variable, areacell = ReadReferenceField(field_key)
+    if variable is None:
+        # Read variable
+        if debug is True:
+            dict_debug = {'file1': '(' + type_data + ') ' + str(file_data),
+                          'var1': '(' + type_data + ') ' + str(name_data)}
+            EnsoErrorsWarnings.debug_mode('\033[93m', 'Files', 20, **dict_debug)
+        variable, keyerror1 = ReadSelectRegionCheckUnits(file_data, name_data, type_data, box=region,
+                                                         time_bounds=time_bounds, **kwargs)
+        if debug is True:
+            dict_debug = {'axes1': '(' + type_data + ') ' + str([ax.id for ax in variable.getAxisList()]),
+                          'shape1': '(' + type_data + ') ' + str(variable.shape),
+                          'time1': '(' + type_data + ') ' + str(TimeBounds(variable))}
+            EnsoErrorsWarnings.debug_mode('\033[93m', 'after ReadSelectRegionCheckUnits', 20, **dict_debug)
+        # Read areacell & mask
+        variable, areacell, keyerror3 = Read_mask_area(
+            variable, name_data, file_data, type_data, region, file_area=file_area, name_area=name_area,
+            file_mask=file_mask, name_mask=name_mask, maskland=maskland, maskocean=maskocean, debug=debug, **kwargs)
+        if keyerror1 is None and keyerror3 is None:
+            SaveReferenceField(field_key, file_data, variable, areacell)
     # checks if the time-period fulfills the minimum length criterion
     if isinstance(kwargs['min_time_steps'], int):
         if len(variable) < kwargs['min_time_steps']:
             EnsoErrorsWarnings.too_short_time_period(metric, len(variable), kwargs['min_time_steps'], INSPECTstack())
             keyerror2 = "too short time period (" + str(len(variable)) + ")"
-    # Read areacell & mask
-    variable, areacell, keyerror3 = Read_mask_area(
-        variable, name_data, file_data, type_data, region, file_area=file_area, name_area=name_area,
-        file_mask=file_mask, name_mask=name_mask, maskland=maskland, maskocean=maskocean, debug=debug, **kwargs)
     if keyerror1 is not None or keyerror2 is not None or keyerror3 is not None:
         keyerror = add_up_errors([keyerror1, keyerror2, keyerror3])
     else:
@@ -3743,25 +4563,11 @@ def SlabOcean(tab1, tab2, month1, month2, events, frequency=None, tmin=0.1, debu
                       'axes2': '(thf) ' + str([ax.id for ax in thfA.getAxisList()]),
                       'shape1': '(sst) ' + str(sstA.shape), 'shape2': '(thf) ' + str(thfA.shape)}
         EnsoErrorsWarnings.debug_mode('\033[93m', 'after Event_selection', 25, **dict_debug)
-    # cumulative anomalies
-    myshape = [len(events), mm2-mm1+1] + [ss for ss in tab1.shape[1:]]
-    dSST = MV2zeros(myshape)
-    dSSTthf = MV2zeros(myshape)
-    for ii in range(mm1, mm2):
-        dSST[:, ii - mm1 + 1] = dSST[:, ii - mm1] + sstA[:, ii + 1] - sstA[:, ii]
-        dSSTthf[:, ii - mm1 + 1] = dSSTthf[:, ii - mm1] + thfA[:, ii + 1]
+    # normalized cumulative SST changes
+    dSST, dSSTthf = SlabOceanCumulative(sstA, thfA, mm1, mm2, fraction, tmin=tmin)
     if debug is True:
         dict_debug = {'shape1': '(dSST) ' + str(dSST.shape), 'shape2': '(dSSTthf) ' + str(dSSTthf.shape)}
         EnsoErrorsWarnings.debug_mode('\033[93m', 'after cumulative_anomalies', 25, **dict_debug)
-    # normalized heat flux-driven SST change
-    dt = MV2zeros(dSSTthf.shape)
-    dt = dt.reorder('10')
-    dt[:] = dSST[:, -1]
-    dt = dt.reorder('10')
-    dt = MV2masked_where(abs(dt) < tmin, dt)
-    dSSTthf[:] = fraction * dSSTthf[:] / dt
-    # normalized SST change
-    dSST[:] = dSST[:] / dt
     # normalized SST change by an anomalous ocean circulation
     dSSToce = dSST - dSSTthf
     # averaging across events
@@ -3790,6 +4596,54 @@ def SlabOcean(tab1, tab2, month1, month2, events, frequency=None, tmin=0.1, debu
     return dSST, dSSTthf, dSSToce
 
 
+def SlabOceanCumulative(sstA, thfA, mm1, mm2, fraction, tmin=0.1):
+    """
+    #################################################################################
+    Description:
+    Normalized cumulative SST change and heat flux-driven SST change of each event, from month mm1 to month mm2 (see
+    SlabOcean)
+    All events, months and grid points are integrated at once (same results as accumulating month by month)
+    #################################################################################
+
+    :param sstA: masked_array
+        SSTA of each event (event, month, ...), as returned by Event_selection
+    :param thfA: masked_array
+        THFA of each event (event, month, ...), as returned by Event_selection
+    :param mm1: int
+        position of the first month of integration (e.g., 5 for 'JUN')
+    :param mm2: int
+        position of the last month of integration (e.g., 11 for 'DEC')
+    :param fraction: float
+        conversion of the heat flux into SST change (W/m2 to C)
+    :param tmin: float, optional
+        minimum SST change of an event, events with a smaller change are masked
+        default value is 0.1
+    :return dSST, dSSTthf: masked_array
+        normalized cumulative SST change and heat flux-driven SST change (event, month, ...)
+    """
+    # cumulative anomalies (all events, months and grid points at once)
+    # dSST is the SST change since month1 and dSSTthf the heat flux integrated from the month following month1, once a
+    # month is masked the following months are masked too (as when accumulating month by month)
+    list_cum, list_mask = list(), list()
+    for tab in [sstA[:, mm1 + 1:mm2 + 1] - sstA[:, mm1:mm2], thfA[:, mm1 + 1:mm2 + 1]]:
+        zeros = NPzeros([tab.shape[0], 1] + [ss for ss in tab.shape[2:]])
+        list_cum.append(NPconcatenate((zeros, NPcumsum(NPma__filled(tab, 0.), axis=1)), axis=1))
+        list_mask.append(NPconcatenate(
+            (zeros.astype(bool), NPlogical_or.accumulate(NPma__getmaskarray(tab), axis=1)), axis=1))
+        del zeros
+    # normalization by the total SST change of each event (broadcast over months), events with a change smaller than
+    # tmin are masked
+    dt = list_cum[0][:, -1:]
+    mask_dt = list_mask[0][:, -1:] | (abs(dt) < tmin)
+    with NPerrstate(divide='ignore', invalid='ignore'):
+        # normalized SST change
+        dSST = MV2masked_where(list_mask[0] | mask_dt, list_cum[0] / dt)
+        # normalized heat flux-driven SST change
+        dSSTthf = MV2masked_where(list_mask[1] | mask_dt, fraction * list_cum[1] / dt)
+    del dt, list_cum, list_mask, mask_dt
+    return dSST, dSSTthf
+
+
 def TimeAnomaliesLinearRegressionAndNonlinearity(tab2, tab1, return_stderr=True):
     """
     #################################################################################
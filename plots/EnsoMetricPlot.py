@@ -2,17 +2,55 @@
 
 from copy import deepcopy
 from datetime import datetime
+from multiprocessing import Pool as MULTIPROCESSINGpool
 from os.path import join as OSpath__join
 # ENSO_metrics functions
 from EnsoMetrics.EnsoPlotLib import plot_param
 from .EnsoPlotTemplate import cmip_boxplot, my_boxplot, my_curve, my_dotplot, my_dot_to_box, my_hovmoeller, my_map,\
-    my_scatterplot
+    my_scatterplot, warm_map_features
+from .EnsoPlotToolsLib import close_nc_files
 
 
 dict_plot = {"boxplot": my_boxplot, "curve": my_curve, "dot": my_dotplot, "dot_to_box": my_dot_to_box,
              "hovmoeller": my_hovmoeller, "map": my_map, "scatterplot": my_scatterplot}
 
 
+def batch_plotter(list_jobs, nbr_processes=1):
+    """
+    Draws the plots of all the given jobs (one job = one call to main_plotter), distributed on a pool of processes
+    Each process warms its caches once (cartopy features, plot parameters of all the metrics) and keeps them for all
+    the jobs it draws, as well as the NetCDF files it opens (see EnsoPlotToolsLib.get_nc_file)
+
+    Inputs:
+    ------
+    :param list_jobs: list of dictionaries
+        arguments of main_plotter for each job
+        e.g., [{"metric_collection": "ENSO_tel", "metric": "EnsoPrMapDjf", "model": "CNRM-CM5", ...}, ...]
+    **Optional arguments:**
+    :param nbr_processes: integer, optional
+        number of processes drawing the plots
+        default is 1 (the plots are drawn in this process)
+
+    Output:
+    ------
+    :return list_errors: list
+        description of the jobs that failed (the other jobs are drawn anyway)
+    """
+    list_params = sorted(list(set([(job["metric_collection"], job["metric"]) for job in list_jobs])))
+    if nbr_processes > 1 and len(list_jobs) > 1:
+        # NetCDF files open in this process must not be shared with the workers, each worker opens its own
+        close_nc_files()
+        pool = MULTIPROCESSINGpool(processes=min(nbr_processes, len(list_jobs)), initializer=warm_plot_caches,
+                                   initargs=(list_params,))
+        list_errors = list(pool.imap_unordered(plot_job, list_jobs, chunksize=1))
+        pool.close()
+        pool.join()
+    else:
+        warm_plot_caches(list_params)
+        list_errors = [plot_job(job) for job in list_jobs]
+    return [err for err in list_errors if err is not None]
+
+
 def cmip_plotter(metric_collection, metric, experiment, diagnostic_values, diagnostic_units, metric_values,
                  metric_units, multi_member_ave, figure_name):
     """
@@ -142,4 +180,45 @@ def main_plotter(metric_collection, metric, model, experiment, filename_nc, diag
         dt = datetime.now() - t1
         dt = str(int(round(dt.seconds / 60.)))
         print(str().ljust(30) + "took " + dt + " minute(s)")
+    return
+
 
+def plot_job(job):
+    """
+    Draws the plots of one job of batch_plotter
+
+    Inputs:
+    ------
+    :param job: dictionary
+        arguments of main_plotter
+
+    Output:
+    ------
+    :return error: string or None
+        description of the error if the job failed
+    """
+    try:
+        main_plotter(**job)
+    except Exception as e:
+        print(e)
+        return str(job["metric_collection"]) + " " + str(job["metric"]) + " " + str(job["model"]) + ": " + str(e)
+    return None
+
+
+def warm_plot_caches(list_params):
+    """
+    Fills the caches of this process before drawing: cartopy features and plot parameters
+
+    Inputs:
+    ------
+    :param list_params: list
+        list of (metric_collection, metric) that will be drawn
+
+    Output:
+    ------
+    :return:
+    """
+    warm_map_features()
+    for metric_collection, metric in list_params:
+        plot_param(metric_collection, metric)
+    return
@@ -22,7 +22,7 @@ from numpy.ma import masked_where as NUMPYmasked_where
 # ENSO_metrics functions
 from EnsoMetrics.EnsoCollectionsLib import ReferenceRegions
 from .EnsoPlotToolsLib import create_labels, create_levels, format_metric, minimaxi, minmax_plot, my_average,\
-    my_bootstrap, my_legend, my_mask, my_mask_map, read_diag, read_var, return_metrics_type, shading_levels
+    my_bootstrap, my_legend, my_mask, my_mask_map, read_diag, read_var, return_metrics_type, shading_levels_stream
 
 colors_sup = ["r", "lime", "peru", "gold", "forestgreen", "sienna", "gold"]
 dict_col = {"REF": "k", "CMIP": "forestgreen", "CMIP3": "orange", "CMIP5": "dodgerblue", "CMIP6": "r"}
@@ -790,8 +790,8 @@ def my_hovmoeller(model, filename_nc, dict_param, reference, metric_variables, f
         for ii in range(len(tab_obs)):
             tab.append(tab_obs[ii])
             for kk in range(len(tab_mod)):
-                tmp = [tab_mod[kk][jj][ii] for jj in range(len(tab_mod[kk]))]
-                tab.append(my_average(tmp, axis=0))
+                tmp = (tab_mod[kk][jj][ii] for jj in range(len(tab_mod[kk])))
+                tab.append(shading_levels_stream(tmp, lev=[])[0])
     else:
         for ii in range(len(tab_obs)):
             tab.append(tab_obs[ii])
@@ -1085,13 +1085,12 @@ def my_map(model, filename_nc, dict_param, reference, metric_variables, figure_n
         for ii in range(len(tab_obs)):
             tab.append(tab_obs[ii])
             for kk in range(len(tab_mod)):
+                # members masked and read one at a time
                 if "africaSE" in variables or "america" in variables or "asiaS" in variables or "oceania" in variables:
-                    tmp = list()
-                    for jj in range(len(tab_mod[kk])):
-                        tmp.append(my_mask_map(tab_obs[ii], tab_mod[kk][jj][ii]))
+                    tmp = (my_mask_map(tab_obs[ii], tab_mod[kk][jj][ii]) for jj in range(len(tab_mod[kk])))
                 else:
-                    tmp = [tab_mod[kk][jj][ii] for jj in range(len(tab_mod[kk]))]
-                tab.append(my_average(tmp, axis=0))
+                    tmp = (tab_mod[kk][jj][ii] for jj in range(len(tab_mod[kk])))
+                tab.append(shading_levels_stream(tmp, lev=[])[0])
     else:
         for ii in range(len(tab_obs)):
             tab.append(tab_obs[ii])
@@ -1681,6 +1680,28 @@ def my_scatterplot(model, filename_nc, dict_param, reference, metric_variables,
     return
 
 
+def warm_map_features(scales=["110m", "50m"]):
+    """
+    Reads the geometries of the cartopy features drawn by my_map (coastlines, land, ocean) at the given scales
+    cartopy keeps them in memory, so that the following maps (in this process) do not read the shapefiles again
+
+    Inputs:
+    ------
+    **Optional arguments:**
+    :param scales: list of strings, optional
+        Natural Earth scales to read (ax.coastlines chooses the scale from the extent of the map)
+        default is ["110m", "50m"]
+
+    Output:
+    ------
+    :return:
+    """
+    for scale in scales:
+        for name in ["coastline", "land", "ocean"]:
+            list(cfeature.NaturalEarthFeature("physical", name, scale).geometries())
+    return
+
+
 def plot_curve(tab_mod, tab_obs, ax, title, axis, xname, yname, ytick_labels, linecolors, linestyles, metric_type,
                metval, metric_units, model='', member=None, obsname='', legend=[], multimodel=False, plot_metric=False,
                plot_legend=False, shading=False, plot_ref=False, method=""):
@@ -1726,7 +1747,7 @@ def plot_curve(tab_mod, tab_obs, ax, title, axis, xname, yname, ytick_labels, li
     if plot_ref is False:
         for ii, tab in enumerate(tab_mod):
             if shading is True:
-                tab_sh = shading_levels(tab, axis=0)
+                tab_sh = shading_levels_stream(tab)
                 # # !!!!! temporary: start !!!!!
                 # if ii != len(tab_mod) - 1:
                 #     ax.fill_between(axis, list(tab_sh[0]), list(tab_sh[3]), facecolor=linecolors["model"][ii],
@@ -6,14 +6,30 @@ from math import floor as MATHfloor
 from numpy import arange as NUMPYarange
 from numpy import around as NUMPYaround
 from numpy import array as NUMPYarray
+from numpy import concatenate as NUMPYconcatenate
+from numpy import errstate as NUMPYerrstate
+from numpy import floor as NUMPYfloor
+from numpy import isfinite as NUMPYisfinite
 from numpy import isnan as NUMPYisnan
+from numpy import maximum as NUMPYmaximum
 from numpy import mean as NUMPYmean
+from numpy import minimum as NUMPYminimum
 from numpy import nan as NUMPYnan
+from numpy import partition as NUMPYpartition
 from numpy import sort as NUMPYsort
+from numpy import sqrt as NUMPYsqrt
+from numpy import take_along_axis as NUMPYtake_along_axis
 from numpy import where as NUMPYwhere
+from numpy import zeros as NUMPYzeros
+from numpy.ma import array as NUMPYma__array
+from numpy.ma import filled as NUMPYma__filled
+from numpy.ma import getmaskarray as NUMPYma__getmaskarray
 from numpy.ma import masked_invalid as NUMPYma__masked_invalid
-from numpy.random import randint as NUMPYrandom__randint
+from numpy.ma import masked_where as NUMPYma__masked_where
+from numpy.random import default_rng as NUMPYrandom__default_rng
+from os.path import getmtime as OSpath__getmtime
 from scipy.stats import scoreatpercentile as SCIPYstats__scoreatpercentile
+from scipy.stats import t as SCIPYstats__t
 
 # xarray based functions
 from xarray import open_dataset
@@ -62,15 +78,91 @@ models_order = [
     "NorESM2-MM", "SAM0-UNICON", "TaiESM1", "UKESM1-0-LL"]
 
 
-def bootstrap(tab, num_samples=1000000, alpha=0.05, nech=None, statistic=NUMPYmean):
-    """Returns bootstrap estimate of 100.0*(1-alpha) CI for statistic."""
+def bootstrap(tab, num_samples=1000000, alpha=0.05, nech=None, statistic=NUMPYmean, seed=None, chunk_size=10000):
+    """
+    Returns bootstrap estimate of 100.0*(1-alpha) CI for statistic.
+    The samples are drawn by blocks of chunk_size samples, in one pass: only the values of the statistic below the lower
+    quantile and above the upper quantile are kept (about alpha * num_samples values, e.g. 50000 for the default
+    values, whatever the distribution of tab), so the memory used is that of these values and of one block of samples
+    (chunk_size * nech). The result is the same as sorting all the values of the statistic.
+    Give a seed (int) to get reproducible results.
+    """
+    tab = NUMPYarray(tab)
     n = len(tab)
     if nech is None:
         nech = deepcopy(n)
-    idx = NUMPYrandom__randint(0, n, (num_samples, nech))
-    samples = tab[idx]
-    stat = NUMPYsort(statistic(samples, 1))
-    return [stat[int(round((alpha / 2.)*num_samples))], stat[int(round((1 - alpha / 2.)*num_samples))]]
+    rng = NUMPYrandom__default_rng(seed)
+    ranks = [int(round((alpha / 2.) * num_samples)), min(int(round((1 - alpha / 2.) * num_samples)), num_samples - 1)]
+    # number of smallest values (lower quantile) and of largest values (upper quantile) kept
+    nbr_low, nbr_upp = ranks[0] + 1, num_samples - ranks[1]
+    low, upp = NUMPYzeros(0), NUMPYzeros(0)
+    for ii in range(0, num_samples, chunk_size):
+        stat = statistic(tab[rng.integers(0, n, (min(chunk_size, num_samples - ii), nech))], 1)
+        low, upp = NUMPYconcatenate((low, stat)), NUMPYconcatenate((upp, stat))
+        if len(low) > nbr_low:
+            low = NUMPYpartition(low, nbr_low - 1)[:nbr_low]
+        if len(upp) > nbr_upp:
+            upp = NUMPYpartition(upp, len(upp) - nbr_upp)[len(upp) - nbr_upp:]
+        del stat
+    return [low.max(), upp.min()]
+
+
+def compute_correlation(tab_in, nbr_rows=16):
+    """
+    Computes correlations
+    All the pairs are computed at once (by blocks of rows) with numpy, for each pair only the values available in both
+    rows are used. The results are the same as scipy.stats.linregress applied to each pair (a pair with a constant row
+    has a correlation of 0 and a p-value of 1)
+
+    Input:
+    -----
+    :param tab_in: `cdms2` variable
+        A `cdms2` variable containing the data to be analysed.
+    **Optional arguments:**
+    :param nbr_rows: int, optional
+        Number of rows of the correlation matrix computed at the same time (memory used is proportional to
+        nbr_rows * len(tab_in) * tab_in.shape[1]).
+
+    Outputs:
+    -------
+    :return rval: `cdms2` variable
+        A `cdms2` variable containing the correlation coefficients between the values along the first axis.
+    :return pval: `cdms2` variable
+        A `cdms2` variable containing the two-sided p-value for a hypothesis test whose null hypothesis is that the
+        slope is zero, using Wald Test with t-distribution of the test statistic. I.e., if the absolute value of the
+        correlation is smaller than the p-value, it means that the correlation is not significant.
+    """
+    nbr = len(tab_in)
+    valid = ~NUMPYma__getmaskarray(tab_in).reshape((nbr, -1))
+    values = NUMPYma__filled(tab_in, 0.).reshape((nbr, -1)).astype("float64")
+    pval, rval, npts = NUMPYzeros((nbr, nbr)), NUMPYzeros((nbr, nbr)), NUMPYzeros((nbr, nbr))
+    with NUMPYerrstate(divide="ignore", invalid="ignore"):
+        for ii in range(0, nbr, nbr_rows):
+            # values available in both rows: (rows of the block, all rows, columns)
+            both = valid[ii:ii + nbr_rows, None, :] & valid[None, :, :]
+            nn = both.sum(axis=-1)
+            tmp1 = NUMPYwhere(both, values[ii:ii + nbr_rows, None, :], 0.)
+            tmp2 = NUMPYwhere(both, values[None, :, :], 0.)
+            tmp1 = NUMPYwhere(both, tmp1 - (tmp1.sum(axis=-1) / nn)[:, :, None], 0.)
+            tmp2 = NUMPYwhere(both, tmp2 - (tmp2.sum(axis=-1) / nn)[:, :, None], 0.)
+            ssxm, ssym = (tmp1**2).sum(axis=-1) / nn, (tmp2**2).sum(axis=-1) / nn
+            ssxym = (tmp1 * tmp2).sum(axis=-1) / nn
+            # same special cases as scipy.stats.linregress
+            r_value = ssxym / NUMPYsqrt(ssxm * ssym)
+            # constant row: r = 0 (hence p = 1), as scipy.stats.linregress
+            r_value = NUMPYwhere((ssxm == 0) | (ssym == 0), 0., r_value)
+            r_value = NUMPYwhere(r_value > 1., 1., NUMPYwhere(r_value < -1., -1., r_value))
+            df = nn - 2
+            t_value = r_value * NUMPYsqrt(df / ((1. - r_value + 1e-20) * (1. + r_value + 1e-20)))
+            p_value = 2 * NUMPYminimum(SCIPYstats__t.cdf(t_value, df), SCIPYstats__t.sf(t_value, df))
+            # only two points: the p-value is 1 if the two values of the second row are equal, else 0
+            p_value = NUMPYwhere(nn == 2, NUMPYwhere(ssym == 0, 1., 0.), p_value)
+            rval[ii:ii + nbr_rows], pval[ii:ii + nbr_rows], npts[ii:ii + nbr_rows] = r_value, p_value, nn
+            del both, df, nn, p_value, r_value, ssxm, ssxym, ssym, t_value, tmp1, tmp2
+    # less than two values in common: the correlation cannot be computed
+    rval = NUMPYma__masked_where((npts < 2) | ~NUMPYisfinite(rval), rval)
+    pval = NUMPYma__masked_where((npts < 2) | ~NUMPYisfinite(pval), pval)
+    return rval, pval
 
 
 def create_labels(label_name, label_ticks):
@@ -256,11 +348,11 @@ def my_average(tab, axis=None, remove_masked=False):
     return NUMPYmean(tmp, axis=axis)
 
 
-def my_bootstrap(tab1, tab2):
+def my_bootstrap(tab1, tab2, seed=None):
     mea1 = float(NUMPYarray(tab1).mean())
     mea2 = float(NUMPYarray(tab2).mean())
-    bst1 = bootstrap(NUMPYarray(tab1), nech=len(tab2))
-    bst2 = bootstrap(NUMPYarray(tab2), nech=len(tab1))
+    bst1 = bootstrap(NUMPYarray(tab1), nech=len(tab2), seed=seed)
+    bst2 = bootstrap(NUMPYarray(tab2), nech=len(tab1), seed=None if seed is None else seed + 1)
     return bst1, bst2, mea1, mea2
 
 
@@ -393,10 +485,82 @@ def read_obs(xml, variables_in_xml, metric_variables, varname, dict_metric, mode
     return tab_out, metric_value, obs
 
 
+# NetCDF files already opened by get_nc_file (by file name), at most 'max_nc_files' are kept open
+nc_files = dict()
+max_nc_files = 128
+
+
+def close_nc_files():
+    """
+    Closes all the NetCDF files kept open by get_nc_file
+    """
+    for filename_nc in list(nc_files.keys()):
+        nc_files.pop(filename_nc)["dataset"].close()
+    return
+
+
+def get_nc_file(filename_nc):
+    """
+    Opens the given NetCDF file (lazily, the variables are read only when they are used) and indexes its variables and
+    global attributes
+    The file is kept open for the following calls (it is opened again if it has been modified), the least recently
+    used file is closed when more than 'max_nc_files' files are open
+
+    Input:
+    -----
+    :param filename_nc: string
+        path and name of the NetCDF file
+
+    Output:
+    ------
+    :return nc_file: dictionary
+        {"dataset": xarray dataset, "variables": set of variable names, "attributes": global attributes,
+        "attributes_order": position of each global attribute in the file}
+    """
+    mtime = OSpath__getmtime(filename_nc)
+    if filename_nc in list(nc_files.keys()):
+        nc_file = nc_files.pop(filename_nc)
+        if nc_file["mtime"] == mtime:
+            nc_files[filename_nc] = nc_file
+            return nc_file
+        nc_file["dataset"].close()
+    # cache=False: the values read are not kept in the dataset (the file stays open for the following calls)
+    ff = open_dataset(filename_nc, decode_times=False, cache=False)
+    attributes = dict(ff.attrs)
+    nc_files[filename_nc] = {
+        "dataset": ff, "mtime": mtime, "variables": set(ff.keys()), "attributes": attributes,
+        "attributes_order": dict((key, ii) for ii, key in enumerate(attributes.keys()))}
+    while len(nc_files) > max_nc_files:
+        nc_files.pop(list(nc_files.keys())[0])["dataset"].close()
+    return nc_files[filename_nc]
+
+
+def read_nc_attribute(nc_file, list_keys):
+    """
+    Reads a global attribute of a NetCDF file opened by get_nc_file
+
+    Inputs:
+    ------
+    :param nc_file: dictionary
+        output of get_nc_file
+    :param list_keys: list of strings
+        possible names of the attribute, if several are in the file, the last one in the file is read
+
+    Output:
+    ------
+    :return val: attribute value or None if none of the names is in the file
+    """
+    list_keys = [key for key in list_keys if key in nc_file["attributes_order"]]
+    if len(list_keys) == 0:
+        return None
+    return nc_file["attributes"][max(list_keys, key=lambda v: nc_file["attributes_order"][v])]
+
+
 def reader(filename_nc, model, reference, var_to_read, metric_variables, dict_metric, member=None, met_in_file=False,
            met_type=None, met_pattern=""):
-    ff = open_dataset(filename_nc, decode_times=False)
-    variables_in_file = sorted([var for var in list(ff.keys())], key=lambda v: v.upper())
+    nc_file = get_nc_file(filename_nc)
+    ff = nc_file["dataset"]
+    variables_in_file = nc_file["variables"]
     # read model
     tab_mod = list()
     for var in var_to_read:
@@ -412,8 +576,7 @@ def reader(filename_nc, model, reference, var_to_read, metric_variables, dict_me
         #     tab_mod.append(ff[var + model])
         varName_in_nc = var + model
         if member is not None:
-            varName_in_nc += "_" + member 
-        #tab_mod.append(ff[var + model])
+            varName_in_nc += "_" + member
         tab_mod.append(ff[varName_in_nc])
     # reab obs
     tab_obs = list()
@@ -439,23 +602,15 @@ def reader(filename_nc, model, reference, var_to_read, metric_variables, dict_me
     if isinstance(var_to_read, list) is True and len(var_to_read) == 1:
         if met_in_file is True:
             if isinstance(met_type, str):
-                for key in list(ff.attrs.keys()):
-                    if met_type + "_" + obs + "_" + met_pattern == key:
-                        val = ff.attrs[key]
-                try: val
-                except: val = None
-                metval = deepcopy(val)
-                del val
+                metval = read_nc_attribute(nc_file, [met_type + "_" + obs + "_" + met_pattern])
             elif isinstance(met_type, list):
                 metval = list()
                 for mety in met_type:
-                    for key in list(ff.attrs.keys()):
-                        if mety + "_" + obs + "_" + met_pattern == key or (met_pattern == "" and mety + "_" + obs == key):
-                            val = ff.attrs[key]
-                    try: val
-                    except: val = None
-                    metval.append(val)
-                    del val
+                    list_keys = [mety + "_" + obs + "_" + met_pattern]
+                    if met_pattern == "":
+                        list_keys.append(mety + "_" + obs)
+                    metval.append(read_nc_attribute(nc_file, list_keys))
+                    del list_keys
     elif isinstance(var_to_read, list) is True and len(var_to_read) == 2 and\
             ("nina" in var_to_read[0] or "nino" in var_to_read[0]):
         metval = list()
@@ -463,28 +618,18 @@ def reader(filename_nc, model, reference, var_to_read, metric_variables, dict_me
             add = "nina" if "nina" in var else "nino"
             if met_in_file is True:
                 if isinstance(met_type, str):
-                    for key in list(ff.attrs.keys()):
-                        if met_type + "_" + obs + "_" + add + "_" + met_pattern == key:
-                            val = ff.attrs[key]
-                    try:    val
-                    except: val = None
-                    metval.append(val)
-                    del val
+                    metval.append(read_nc_attribute(nc_file, [met_type + "_" + obs + "_" + add + "_" + met_pattern]))
                 elif isinstance(met_type, list):
                     tmpval = list()
                     for mety in met_type:
-                        for key in list(ff.attrs.keys()):
-                            if mety + "_" + obs + "_" + add + "_" + met_pattern == key or (
-                                    met_pattern == "" and mety + "_" + obs + "_" + add == key):
-                                val = ff.attrs[key]
-                        try: val
-                        except: val = None
-                        tmpval.append(val)
-                        del val
+                        list_keys = [mety + "_" + obs + "_" + add + "_" + met_pattern]
+                        if met_pattern == "":
+                            list_keys.append(mety + "_" + obs + "_" + add)
+                        tmpval.append(read_nc_attribute(nc_file, list_keys))
+                        del list_keys
                     metval.append(tmpval)
                     del tmpval
             del add
-    ff.close()
     return tab_mod, tab_obs, metval, obs
 
 
@@ -534,6 +679,69 @@ def shading_levels(tab, lev=[5, 25, 75, 95], axis=None):
     return [SCIPYstats__scoreatpercentile(tab, ll, axis=axis) for ll in lev] + [my_average(tab, axis=axis)]
 
 
+def shading_levels_stream(list_tab, lev=[5, 25, 75, 95], nbr_points=100000):
+    """
+    Computes the envelope of the given members like shading_levels(list_tab, lev=lev, axis=0), without stacking all the
+    members at once: the mean is computed reading the members one at a time and the percentiles are the exact order
+    statistics of each point, computed by blocks of nbr_points points (the members of a block are sorted together)
+    Invalid and masked values are ignored, the points without valid value are masked
+
+    Inputs:
+    ------
+    :param list_tab: list
+        members, all of the same shape (e.g., xarray variables read from NetCDF files, read only when used)
+        if lev is empty, it can be an iterator (the members are read once), else it is read once per block of points
+        after the first reading
+    **Optional arguments:**
+    :param lev: list of numbers, optional
+        percentiles to compute (interpolated between the two closest values, as scoreatpercentile)
+        default is [5, 25, 75, 95]
+    :param nbr_points: integer, optional
+        number of points of a block (memory used for the percentiles is about 8 * len(list_tab) * nbr_points bytes)
+        default is 100000
+
+    Output:
+    ------
+    :return tab_out: list of masked_arrays
+        percentiles (same order as lev) and mean of the members
+    """
+    def member_values(tab):
+        # values of a member as floats, invalid and masked values set to nan
+        return NUMPYma__filled(NUMPYma__masked_invalid(NUMPYma__array(tab, dtype=float)), NUMPYnan)
+
+    # first pass: sum and number of valid values of each point
+    for ii, tab in enumerate(list_tab):
+        tab = member_values(tab)
+        valid = NUMPYisfinite(tab)
+        if ii == 0:
+            shape = tab.shape
+            total, count = NUMPYzeros(shape), NUMPYzeros(shape, dtype=int)
+        total += NUMPYwhere(valid, tab, 0.)
+        count += valid
+        del tab, valid
+    tab_out = [NUMPYma__masked_where(count == 0, total / NUMPYmaximum(count, 1))]
+    if len(lev) == 0:
+        return tab_out
+    # percentiles: members sorted by blocks of points (nan are sorted last)
+    nbr_pts = count.size
+    count = count.ravel()
+    list_levels = [NUMPYzeros(nbr_pts) for ll in lev]
+    for i0 in range(0, nbr_pts, nbr_points):
+        block = NUMPYsort(NUMPYarray([member_values(tab).ravel()[i0:i0 + nbr_points] for tab in list_tab]), axis=0)
+        nn = count[i0:i0 + nbr_points]
+        for ll, levels in zip(lev, list_levels):
+            # position of the percentile in the sorted values, interpolated between the two closest values
+            rank = NUMPYmaximum((nn - 1) * ll / 100., 0.)
+            i1 = NUMPYfloor(rank).astype(int)
+            i2 = NUMPYminimum(i1 + 1, NUMPYmaximum(nn - 1, 0))
+            val1 = NUMPYtake_along_axis(block, i1[None, :], axis=0)[0]
+            val2 = NUMPYtake_along_axis(block, i2[None, :], axis=0)[0]
+            levels[i0:i0 + nbr_points] = NUMPYwhere(i2 > i1, val1 + (rank - i1) * (val2 - val1), val1)
+            del i1, i2, rank, val1, val2
+        del block, nn
+    return [NUMPYma__masked_where(count == 0, levels).reshape(shape) for levels in list_levels] + tab_out
+
+
 def remove_metrics(metrics_in, metric_collection, reduced_set=False, portraitplot=False):
     """
     Removes some metrics from given list
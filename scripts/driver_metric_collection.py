@@ -10,7 +10,7 @@ from EnsoMetrics.EnsoComputeMetricsLib import ComputeCollection
 
 # set of functions to find cmip/obs files and save a json file
 # to be adapted/changed by users depending on their environments
-from driver_tools_lib import find_members, find_xml_cmip, find_xml_obs, save_json
+from driver_tools_lib import find_members, find_xml_cmip, find_xml_obs, journal_append, journal_compact, journal_start
 
 
 # user (get your user name for the paths and to save the files)
@@ -117,12 +117,13 @@ for obs in list_obs:
 #
 # finding file and variable name in file for each models
 #
-dict_metric, dict_dive = dict(), dict()
 dict_var = CmipVariables()["variable_name_in_file"]
+# results of all members, appended when a member is computed (the journal of a previous run is emptied)
+journal_name = OSpath__join(path_netcdf, user_name + "_" + mc_name + "_" + experiment + "_journal.jsonl")
+journal_start(journal_name)
 for mod in list_models:
     list_ens = find_members(experiment, frequency, mod, project, realm, first_only=first_member_only)
     pattern_out = OSpath__join(path_netcdf, user_name + "_" + mc_name + "_" + mod + "_" + experiment)
-    dict_ens, dict_ens_dive = dict(), dict()
     for ens in list_ens:
         dict_mod = {mod + '_' + ens: {}}
         for var in list_variables:
@@ -165,12 +166,13 @@ for mod in list_models:
         dictDatasets = {"model": dict_mod, "observations": dict_obs}
         # Computes the metric collection
         netcdf = pattern_out + "_" + ens
-        dict_ens[mod + "_" + ens], dict_ens_dive[mod + "_" + ens] =\
+        dict_ens, _ = \
             ComputeCollection(mc_name, dictDatasets, mod + "_" + ens, netcdf=True, netcdf_name=netcdf, debug=False)
-        # save json
-        save_json({mod + "_" + ens: dict_ens[mod + "_" + ens]}, netcdf, metric_only=True)
+        # save json (the members are not kept in memory, the json file of all members is created from the journal)
+        journal_append(journal_name, {mod + "_" + ens: dict_ens}, metric_only=True)
         with open(netcdf + "_raw.json", "w") as outfile:
-            json.dump(dict_ens[mod + "_" + ens], outfile, sort_keys=True)
-        del dict_mod, dictDatasets, netcdf
-    dict_metric[mod], dict_dive[mod] = dict_ens, dict_ens_dive
-    del dict_ens, dict_ens_dive, list_ens, pattern_out
+            json.dump(dict_ens, outfile, sort_keys=True)
+        del dict_ens, dict_mod, dictDatasets, netcdf
+    del list_ens, pattern_out
+# json file with all models and members
+journal_compact(journal_name, OSpath__join(path_netcdf, user_name + "_" + mc_name + "_" + experiment + "_allModels"))
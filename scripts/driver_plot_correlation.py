@@ -13,19 +13,15 @@
 # Import the right packages
 # ---------------------------------------------------#
 
-from numpy.ma import masked_invalid as NUMPYma__masked_invalid
-from numpy.ma import masked_where as NUMPYmasked_where
-from numpy.ma import zeros as NUMPYma__zeros
 from os.path import join as OSpath__join
-from scipy.stats import linregress as SCIPYstats__linregress
 
 # set of functions to find cmip/obs files and save a json file
 # to be adapted/changed by users depending on their environments
-from driver_tools_lib import get_metric_values, get_mod_mem_json
+from driver_tools_lib import get_metric_array, get_metric_values, get_mod_mem_json
 
 # ENSO_metrics functions
 from EnsoPlots.EnsoPlotTemplate import plot_metrics_correlations
-from EnsoPlots.EnsoPlotToolsLib import sort_metrics
+from EnsoPlots.EnsoPlotToolsLib import compute_correlation, sort_metrics
 
 
 # ---------------------------------------------------#
@@ -61,6 +57,8 @@ dict_json = {
         "ENSO_perf": "share/EnsoMetrics/obs2obs_historical_ENSO_perf_" + version_obs + "_allObservations.json",
         "ENSO_proc": "share/EnsoMetrics/obs2obs_historical_ENSO_proc_" + version_obs + "_allObservations.json",
         "ENSO_tel":  "share/EnsoMetrics/obs2obs_historical_ENSO_tel_" + version_obs + "_allObservations.json"}}
+# results store (SQLite database filled from the json files at the first use), None to read the json files directly
+results_file = None  # "metric_values_" + version_mod + ".sqlite"  #
 # figure name
 path_out = ""
 figure_name = "metrics_correlations_" + str(len(list_metric_collections)) + "metric_collections_" + version_mod
@@ -78,46 +76,6 @@ figure_name = OSpath__join(path_out, figure_name)
 # ---------------------------------------------------#
 
 
-# ---------------------------------------------------#
-# Functions
-# ---------------------------------------------------#
-def compute_correlation(tab_in):
-    """
-    Computes correlations
-
-    Input:
-    -----
-    :param tab_in: `cdms2` variable
-        A `cdms2` variable containing the data to be analysed.
-
-    Outputs:
-    -------
-    :return rval: `cdms2` variable
-        A `cdms2` variable containing the correlation coefficients between the values along the first axis.
-    :return pval: `cdms2` variable
-        A `cdms2` variable containing the two-sided p-value for a hypothesis test whose null hypothesis is that the
-        slope is zero, using Wald Test with t-distribution of the test statistic. I.e., if the absolute value of the
-        correlation is smaller than the p-value, it means that the correlation is not significant.
-    """
-    pval = NUMPYma__zeros((len(tab_in), len(tab_in)))
-    rval = NUMPYma__zeros((len(tab_in), len(tab_in)))
-    for ii in range(len(tab_in)):
-        tmp1 = tab_in[ii]
-        for jj in range(len(tab_in)):
-            tmp2 = tab[jj]
-            tmpf1 = NUMPYmasked_where(tmp2.mask, tmp1)
-            tmpf2 = NUMPYmasked_where(tmpf1.mask, tmp2)
-            tmpf1 = tmpf1.flatten().compressed()
-            tmpf2 = tmpf2.flatten().compressed()
-            slope, intercept, r_value, p_value, std_err = SCIPYstats__linregress(tmpf1, tmpf2)
-            pval[ii, jj] = float(p_value)
-            rval[ii, jj] = float(r_value)
-            del intercept, p_value, r_value, slope, std_err, tmp2, tmpf1, tmpf2
-        del tmp1
-    return rval, pval
-# ---------------------------------------------------#
-
-
 # ---------------------------------------------------#
 # Main
 # ---------------------------------------------------#
@@ -125,12 +83,14 @@ def compute_correlation(tab_in):
 # only metrics from models/members chosen here will be used
 # all metrics from models/members chosen here will be used (ensures that if a model/member is not available for one or
 # several metric collections, the corresponding line will still be created in the portraitplot)
-model_by_proj = get_mod_mem_json(list_projects, list_metric_collections, dict_json, first_only=first_member)
+model_by_proj = get_mod_mem_json(list_projects, list_metric_collections, dict_json, first_only=first_member,
+                                 results_file=results_file)
 # read json file
 dict_met = dict()
 for proj in list_projects:
     for mc in list_metric_collections:
-        dict1 = get_metric_values(proj, mc, dict_json, model_by_proj, reduced_set=reduced_set)
+        dict1 = get_metric_values(proj, mc, dict_json, model_by_proj, reduced_set=reduced_set,
+                                  results_file=results_file)
         # save in common dictionary
         for mod in list(dict1.keys()):
             try:    dict_met[mod]
@@ -151,15 +111,7 @@ if ' ':
     list_metrics = sort_metrics(list(set(list_metrics)))
     list_models = list(dict_met.keys())
     # fill 2D-array with metric values
-    tab = NUMPYma__zeros((len(list_metrics), len(list_models)))
-    for ii, met in enumerate(list_metrics):
-        for jj, mod in enumerate(list_models):
-            if met not in list(dict_met[mod].keys()) or dict_met[mod][met] is None:
-                tab[ii, jj] = 1e20
-            else:
-                tab[ii, jj] = dict_met[mod][met]
-    tab = NUMPYma__masked_invalid(tab)
-    tab = NUMPYmasked_where(tab == 1e20, tab)
+    tab = get_metric_array(dict_met, list_metrics, list_models)
     # compute inter model correlations
     rval, pval = compute_correlation(tab)
     # plot metrics correlations
@@ -18,7 +18,7 @@ import json
 from os.path import join as OSpath__join
 
 # ENSO_metrics functions
-from EnsoPlots.EnsoMetricPlot import main_plotter
+from EnsoPlots.EnsoMetricPlot import batch_plotter
 from EnsoPlots.EnsoPlotToolsLib import remove_metrics
 
 
@@ -58,6 +58,8 @@ path_nc = OSpath__join(path_main, "Data/" + project.lower() + "/" + experiment +
 path_out = ""
 dataname2 = dataname.replace("GPCPv2.3", "GPCPv23").replace("SODA3.4.2", "SODA342")
 figure_name = project.lower() + "_" + experiment + "_" + metric_collection + "_" + dataname2
+# number of processes drawing the plots (each process keeps its cartopy features and plot parameters in memory)
+nbr_processes = 1
 # ---------------------------------------------------#
 
 
@@ -78,6 +80,7 @@ pattern = project.lower() + "_" + experiment + "_" + metric_collection + "_" + v
 #
 # Loop on metrics
 #
+list_jobs = list()
 for met in ["EnsoPrMapDjfRmse"]:#list_metrics:
     print(met)
     # get NetCDF file name
@@ -119,7 +122,16 @@ for met in ["EnsoPrMapDjfRmse"]:#list_metrics:
     #      - (optional) the path where to save the plots: path_png
     #      - (optional) the name of the plots: name_png
     #      - (optional) if the project aims to compare observational datasets (obs2obs): plot_ref
-    main_plotter(metric_collection, met2, model, experiment, filename_nc, diagnostic_values, diagnostic_units,
-                 metric_values, metric_units, member=member, path_png=path_out, name_png=figure_name, plot_ref=plot_ref)
+    list_jobs.append({
+        "metric_collection": metric_collection, "metric": met2, "model": model, "experiment": experiment,
+        "filename_nc": filename_nc, "diagnostic_values": diagnostic_values, "diagnostic_units": diagnostic_units,
+        "metric_values": metric_values, "metric_units": metric_units, "member": member, "path_png": path_out,
+        "name_png": figure_name, "plot_ref": plot_ref})
     del diagnostic_values, diagnostic_units, dict_dia, dict_met, filename_nc, met2, metric_values, metric_units, \
         name_png
+#
+# Draw all the plots
+#
+list_errors = batch_plotter(list_jobs, nbr_processes=nbr_processes)
+for err in list_errors:
+    print(err)
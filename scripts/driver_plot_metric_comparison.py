@@ -84,6 +84,8 @@ dict_json = {
         "ENSO_perf": "share/EnsoMetrics/obs2obs_historical_ENSO_perf_" + version_obs + "_allObservations.json",
         "ENSO_proc": "share/EnsoMetrics/obs2obs_historical_ENSO_proc_" + version_obs + "_allObservations.json",
         "ENSO_tel":  "share/EnsoMetrics/obs2obs_historical_ENSO_tel_" + version_obs + "_allObservations.json"}}
+# results store (SQLite database filled from the json files at the first use), None to read the json files directly
+results_file = None  # "metric_values_" + version_mod + ".sqlite"  #
 # figure name
 path_out = ""
 figure_name = "metrics_intercomparison_" + str(len(list_metric_collections)) + "metric_collections_" + version_mod
@@ -126,14 +128,16 @@ def common_save(dict_in, dict_out={}):
 # only metrics from models/members chosen here will be used
 # all metrics from models/members chosen here will be used (ensures that if a model/member is not available for one or
 # several metric collections, the corresponding line will still be created in the portraitplot)
-model_by_proj = get_mod_mem_json(list_projects, list_metric_collections, dict_json, first_only=first_member)
+model_by_proj = get_mod_mem_json(list_projects, list_metric_collections, dict_json, first_only=first_member,
+                                 results_file=results_file)
 # read json file
 dict_met = dict()
 if big_ensemble is False:
     for proj in list_projects:
         dict_mc = dict()
         for mc in list_metric_collections:
-            dict1 = get_metric_values(proj, mc, dict_json, model_by_proj, reduced_set=reduced_set)
+            dict1 = get_metric_values(proj, mc, dict_json, model_by_proj, reduced_set=reduced_set,
+                                      results_file=results_file)
             # save in common dictionary
             dict_mc = common_save(dict1, dict_out=dict_mc)
         dict_met[proj] = dict_mc
@@ -142,7 +146,8 @@ else:
     dict_mc = dict()
     for proj in list_projects:
         for mc in list_metric_collections:
-            dict1 = get_metric_values(proj, mc, dict_json, model_by_proj, reduced_set=reduced_set)
+            dict1 = get_metric_values(proj, mc, dict_json, model_by_proj, reduced_set=reduced_set,
+                                      results_file=results_file)
             # save in common dictionary
             dict_mc = common_save(dict1, dict_out=dict_mc)
     dict_met["CMIP"] = dict_mc
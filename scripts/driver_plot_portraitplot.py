@@ -16,6 +16,7 @@
 from numpy import mean as NUMPYmean
 from numpy import std as NUMPYstd
 from numpy.ma import array as NUMPYma__array
+from numpy.ma import filled as NUMPYma__filled
 from numpy.ma import masked_invalid as NUMPYma__masked_invalid
 from numpy.ma import masked_where as NUMPYmasked_where
 from numpy.ma import zeros as NUMPYma__zeros
@@ -24,7 +25,7 @@ import string
 
 # set of functions to find cmip/obs files and save a json file
 # to be adapted/changed by users depending on their environments
-from driver_tools_lib import get_metric_values, get_metric_values_observations, get_mod_mem_json
+from driver_tools_lib import get_metric_values, get_metric_values_observations, get_mod_mem_json, results_array
 
 # ENSO_metrics functions
 from EnsoPlots.EnsoPlotTemplate import plot_portraitplot
@@ -67,6 +68,8 @@ dict_json = {
         "ENSO_perf": "share/EnsoMetrics/obs2obs_historical_ENSO_perf_" + version_obs + "_allObservations.json",
         "ENSO_proc": "share/EnsoMetrics/obs2obs_historical_ENSO_proc_" + version_obs + "_allObservations.json",
         "ENSO_tel":  "share/EnsoMetrics/obs2obs_historical_ENSO_tel_" + version_obs + "_allObservations.json"}}
+# results store (SQLite database filled from the json files at the first use), None to read the json files directly
+results_file = None  # "metric_values_" + version_mod + ".sqlite"  #
 # figure name
 path_out = ""
 figure_name = "portraitplot_" + str(len(list_metric_collections)) + "metric_collections_" + version_mod
@@ -93,13 +96,15 @@ metric_collection_names_for_plot = {"ENSO_perf": "Performance", "ENSO_proc": "Pr
 # only metrics from models/members chosen here will be used
 # all metrics from models/members chosen here will be used (ensures that if a model/member is not available for one or
 # several metric collections, the corresponding line will still be created in the portraitplot)
-model_by_proj = get_mod_mem_json(list_projects, list_metric_collections, dict_json, first_only=first_member)
+model_by_proj = get_mod_mem_json(list_projects, list_metric_collections, dict_json, first_only=first_member,
+                                 results_file=results_file)
 # read json file
 tab_all, tab_all_act, x_names = list(), list(), list()
 for mc in list_metric_collections:
     dict_met = dict()
     for proj in list_projects:
-        dict1 = get_metric_values(proj, mc, dict_json, model_by_proj, reduced_set=reduced_set, portraitplot=True)
+        dict1 = get_metric_values(proj, mc, dict_json, model_by_proj, reduced_set=reduced_set, portraitplot=True,
+                                  results_file=results_file)
         # save in common dictionary
         for mod in list(dict1.keys()):
             dict_met[mod] = dict1[mod]
@@ -119,12 +124,17 @@ for mc in list_metric_collections:
     plus = 3 + len(list_observations)
     # fill array
     tab = NUMPYma__zeros((len(my_models) + plus, len(my_metrics)))
-    for ii, mod in enumerate(my_models):
-        for jj, met in enumerate(my_metrics):
-            if met not in list(dict_met[mod].keys()) or dict_met[mod][met] is None:
-                tab[ii + plus, jj] = 1e20
-            else:
-                tab[ii + plus, jj] = dict_met[mod][met]
+    if results_file is not None:
+        # model values filled in the results store
+        tab[plus:] = NUMPYma__filled(results_array(results_file, mc, dict_json, model_by_proj, my_metrics,
+                                                   my_models).T, 1e20)
+    else:
+        for ii, mod in enumerate(my_models):
+            for jj, met in enumerate(my_metrics):
+                if met not in list(dict_met[mod].keys()) or dict_met[mod][met] is None:
+                    tab[ii + plus, jj] = 1e20
+                else:
+                    tab[ii + plus, jj] = dict_met[mod][met]
     tab = NUMPYma__masked_invalid(tab)
     tab = NUMPYmasked_where(tab == 1e20, tab)
     # add values to the array (CMIP mean, reference, other observational datasets,...)
@@ -6,13 +6,22 @@ from cdms2 import open as CDMS2open
 from inspect import stack as INSPECTstack
 import json
 from numpy import array as NUMPYarray
+from numpy.ma import masked_invalid as NUMPYma__masked_invalid
+from numpy.ma import masked_where as NUMPYma__masked_where
+from numpy.ma import zeros as NUMPYma__zeros
 from os import environ as OSenviron
+from os import walk as OSwalk
+from os.path import getmtime as OSpath__getmtime
+from os.path import isfile as OSpath__isfile
 from os.path import join as OSpath__join
+import sqlite3
 from sys import exit as SYSexit
 from sys import path as SYSpath
+from time import time as TIMEtime
 
 # ENSO_metrics package
 from EnsoMetrics.EnsoCollectionsLib import ReferenceObservations
+from EnsoMetrics.EnsoToolsLib import json_dump_stream
 from EnsoPlots.EnsoPlotToolsLib import find_first_member, get_reference, remove_metrics, sort_members
 
 # user (get your user name for the paths and to save the files)
@@ -21,6 +30,18 @@ user_name = GETPASSgetuser()
 xmldir = OSenviron['XMLDIR']
 path_obs = "/data/" + user_name + "/Obs"
 path_netcdf = "/data/" + user_name + "/ENSO_metrics/v20200311"
+# catalog of the files already opened (variables, periods), see catalog_connect
+path_catalog = "/data/" + user_name + "/ENSO_metrics/file_catalog.sqlite"
+# models removed from the plots
+# EC-EARTH: incorrect time coordinate
+# FIO-ESM, HadCM3: grid issues
+# GFDL-CM2p1: hfls not published
+# HadGEM2-AO: rlus and rsus not published
+# E3SM-1-1-ECA: Experimental stage
+# CIESM, FGOALS-g3: ???
+# MCM-UA-1-0: unit issue with pr
+models_to_remove = ["EC-EARTH", "FIO-ESM", "GFDL-CM2p1", "HadGEM2-AO", "CIESM", "E3SM-1-1-ECA", "FGOALS-g3",
+                    "MCM-UA-1-0"]
 
 # My (YYP) package
 # set new path where to find programs
@@ -43,6 +64,221 @@ class bcolors:
 # ---------------------------------------------------#
 
 
+# ---------------------------------------------------#
+# catalog of the files
+# the variables and periods of each file are saved in a SQLite database, a file is opened again only if it has been
+# modified (mtime), the results of find_path_and_files are saved as long as the directory found and its subdirectories
+# are not modified, failed searches are saved for catalog_failure_lifetime seconds (default 0: a failed search is
+# always done again, set it to a few minutes if the same missing files are searched many times in a run)
+# find_path_and_files still looks for the files the first time a search is done and each time it is not valid anymore
+# (the directory layout is only known by find_path_and_files)
+catalog = None
+catalog_failure_lifetime = 0
+
+
+def catalog_connect(catalog_file=path_catalog):
+    """
+    Opens (and creates if needed) the catalog of the files
+
+    Inputs:
+    ------
+    **Optional arguments:**
+    :param catalog_file: string, optional
+        path and name of the SQLite database
+
+    Output:
+    ------
+    :return catalog: sqlite3.Connection
+    """
+    global catalog
+    if catalog is None:
+        catalog = sqlite3.connect(catalog_file)
+        catalog.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL, readable INTEGER)")
+        catalog.execute("CREATE TABLE IF NOT EXISTS variables (path TEXT, variable TEXT, first TEXT, last TEXT, "
+                        "PRIMARY KEY (path, variable))")
+        catalog.execute("CREATE INDEX IF NOT EXISTS variables_variable ON variables (variable)")
+        catalog.execute("DROP TABLE IF EXISTS queries")
+        catalog.execute("CREATE TABLE IF NOT EXISTS searches (query TEXT PRIMARY KEY, path TEXT, files TEXT, "
+                        "directories TEXT, error TEXT, time REAL)")
+        catalog.commit()
+    return catalog
+
+
+def catalog_refresh(list_files):
+    """
+    Adds the given files to the catalog (or updates them if they have been modified since they were added)
+    Only the headers of the files are read (list of variables and time axes)
+
+    Inputs:
+    ------
+    :param list_files: list
+        list of path and file names
+    """
+    cc = catalog_connect()
+    for file_name in list_files:
+        if file_name is None:
+            continue
+        if OSpath__isfile(file_name) is False:
+            cc.execute("DELETE FROM files WHERE path = ?", (file_name,))
+            cc.execute("DELETE FROM variables WHERE path = ?", (file_name,))
+            continue
+        mtime = OSpath__getmtime(file_name)
+        row = cc.execute("SELECT mtime FROM files WHERE path = ?", (file_name,)).fetchone()
+        if row is not None and row[0] == mtime:
+            continue
+        cc.execute("DELETE FROM variables WHERE path = ?", (file_name,))
+        try:
+            ff = CDMS2open(file_name)
+        except:
+            cc.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (file_name, mtime, 0))
+            continue
+        list_rows = list()
+        for var in ff.listvariables():
+            try:
+                time_comp = ff[var].getTime().asComponentTime()
+            except:
+                first, last = None, None
+            else:
+                first = str(time_comp[0].year).zfill(4) + "-" + str(time_comp[0].month).zfill(2)
+                last = str(time_comp[-1].year).zfill(4) + "-" + str(time_comp[-1].month).zfill(2)
+            list_rows.append((file_name, var, first, last))
+        ff.close()
+        cc.executemany("INSERT OR REPLACE INTO variables VALUES (?, ?, ?, ?)", list_rows)
+        cc.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (file_name, mtime, 1))
+    cc.commit()
+    return
+
+
+def catalog_readable(file_name):
+    """
+    Checks in the catalog if the given file exists and can be opened
+
+    Inputs:
+    ------
+    :param file_name: string
+        path and file name
+
+    Output:
+    ------
+    :return readable: boolean
+    """
+    if file_name is None:
+        return False
+    catalog_refresh([file_name])
+    row = catalog_connect().execute("SELECT readable FROM files WHERE path = ?", (file_name,)).fetchone()
+    return row is not None and row[0] == 1
+
+
+def catalog_variables(file_name):
+    """
+    Lists the variables of the given file from the catalog
+
+    Inputs:
+    ------
+    :param file_name: string
+        path and file name
+
+    Output:
+    ------
+    :return dict_variables: dict
+        {variable: (first month, last month)}, months are None for variables without time axis
+    """
+    catalog_refresh([file_name])
+    rows = catalog_connect().execute("SELECT variable, first, last FROM variables WHERE path = ?", (file_name,))
+    return dict((var, (first, last)) for var, first, last in rows.fetchall())
+
+
+def catalog_lookup(variable, list_files):
+    """
+    Finds the given files containing the given variable, using the variable index of the catalog
+
+    Inputs:
+    ------
+    :param variable: string
+        variable name (e.g., "pr", "tos")
+    :param list_files: list
+        list of path and file names
+
+    Output:
+    ------
+    :return list_found: list
+        path and file names containing the variable, in the given order
+    """
+    list_files = [file_name for file_name in list_files if file_name is not None]
+    if len(list_files) == 0:
+        return list()
+    catalog_refresh(list_files)
+    rows = catalog_connect().execute(
+        "SELECT path FROM variables WHERE variable = ? AND path IN (" + ", ".join(["?"] * len(list_files)) + ")",
+        [variable] + list_files)
+    list_found = [row[0] for row in rows.fetchall()]
+    return [file_name for file_name in list_files if file_name in list_found]
+
+
+def catalog_directories(pathnc):
+    """
+    Lists the modification time of the given directory and of its subdirectories
+
+    Input:
+    -----
+    :param pathnc: string
+        path to the files
+
+    Output:
+    ------
+    :return dict_directories: dict
+        {directory: mtime}, empty if the directory does not exist
+    """
+    dict_directories = dict()
+    for directory, _, _ in OSwalk(pathnc):
+        try:
+            dict_directories[directory] = OSpath__getmtime(directory)
+        except OSError:
+            pass
+    return dict_directories
+
+
+def catalog_find_path_and_files(**kwargs):
+    """
+    Same as find_path_and_files but the result is saved in the catalog and reused as long as the directory found and its
+    subdirectories have not been modified (no file added or removed)
+    A failed search is saved too and is not done again for catalog_failure_lifetime seconds (not saved if it is 0)
+
+    Inputs:
+    ------
+    :param kwargs: keyword arguments of find_path_and_files (ens, exp, fre, mod, pro, rea, var)
+
+    Outputs:
+    -------
+    :return pathnc: string
+        path to the files
+    :return filenc: list
+        list of file names
+    """
+    cc = catalog_connect()
+    query = json.dumps(kwargs, sort_keys=True)
+    row = cc.execute("SELECT path, files, directories, error, time FROM searches WHERE query = ?", (query,)).fetchone()
+    if row is not None:
+        if row[3] is not None:
+            if TIMEtime() - row[4] < catalog_failure_lifetime:
+                raise IOError(row[3])
+        elif catalog_directories(row[0]) == json.loads(row[2]):
+            return row[0], json.loads(row[1])
+    try:
+        pathnc, filenc = find_path_and_files(**kwargs)
+    except Exception as err:
+        if catalog_failure_lifetime > 0:
+            cc.execute("INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?, ?)",
+                       (query, None, None, None, str(err) if str(err) != "" else repr(err), TIMEtime()))
+            cc.commit()
+        raise
+    cc.execute("INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?, ?)",
+               (query, pathnc, json.dumps(list(filenc)), json.dumps(catalog_directories(pathnc)), None, TIMEtime()))
+    cc.commit()
+    return pathnc, filenc
+# ---------------------------------------------------#
+
+
 def find_members(experiment, frequency, model, project, realm, first_only=False):
     """
     Finds member names
@@ -107,22 +343,22 @@ def find_fx(model, experiment='', project='', realm='', ensemble=''):
         else:
             my_ens = deepcopy(ensemble)
         if realm == "A":
-            farea1, farea2 = find_path_and_files(ens=my_ens, exp=experiment, fre="fx", mod=model, pro=project,
-                                                 rea=realm, var="areacella")
-            fland1, fland2 = find_path_and_files(ens=my_ens, exp=experiment, fre="fx", mod=model, pro=project,
-                                                 rea=realm, var="sftlf")
+            farea1, farea2 = catalog_find_path_and_files(ens=my_ens, exp=experiment, fre="fx", mod=model,
+                                                         pro=project, rea=realm, var="areacella")
+            fland1, fland2 = catalog_find_path_and_files(ens=my_ens, exp=experiment, fre="fx", mod=model,
+                                                         pro=project, rea=realm, var="sftlf")
             file_land = OSpath__join(fland1, fland2[0])
         else:
-            farea1, farea2 = find_path_and_files(ens=my_ens, exp=experiment, fre="fx", mod=model, pro=project,
-                                                 rea=realm, var="areacello")
+            farea1, farea2 = catalog_find_path_and_files(ens=my_ens, exp=experiment, fre="fx", mod=model,
+                                                         pro=project, rea=realm, var="areacello")
             file_land = None
         file_area = OSpath__join(farea1, farea2[0])
     else:
         file_area, file_land = find_xml_fx(model, project=project, experiment=experiment, realm=realm)
-    try: CDMS2open(file_area)
-    except: file_area = None
-    try: CDMS2open(file_land)
-    except: file_land = None
+    if catalog_readable(file_area) is False:
+        file_area = None
+    if catalog_readable(file_land) is False:
+        file_land = None
     return file_area, file_land
 
 
@@ -158,16 +394,22 @@ def find_xml_cmip(experiment, frequency, model, project, realm, ensemble, variab
         Path and landmask file name corresponding to the given information (e.g., /path/to/file/landmask.xml)
         Set to None if the file cannot be found
     """
-    try: pathnc, filenc = find_path_and_files(ens=ensemble, exp=experiment, fre=frequency, mod=model, pro=project,
-                                              rea=realm, var=variable)
+    try:
+        pathnc, filenc = catalog_find_path_and_files(ens=ensemble, exp=experiment, fre=frequency, mod=model,
+                                                     pro=project, rea=realm, var=variable)
+        if len(catalog_lookup(variable, [OSpath__join(pathnc, str(filenc[0]))])) == 0:
+            raise IOError("variable " + str(variable) + " not in " + str(filenc[0]))
     except:
         if realm == "O":
             new_realm = "A"
         else:
             new_realm = "O"
         # if var is not in realm 'O' (for ocean), look for it in realm 'A' (for atmosphere), and conversely
-        try: pathnc, filenc = find_path_and_files(ens=ensemble, exp=experiment, fre=frequency, mod=model, pro=project,
-                                                  rea=new_realm, var=variable)
+        try:
+            pathnc, filenc = catalog_find_path_and_files(ens=ensemble, exp=experiment, fre=frequency, mod=model,
+                                                         pro=project, rea=new_realm, var=variable)
+            if len(catalog_lookup(variable, [OSpath__join(pathnc, str(filenc[0]))])) == 0:
+                raise IOError("variable " + str(variable) + " not in " + str(filenc[0]))
         except:
             pathnc, filenc = None, [None]
             # given variable is neither in realm 'A' nor 'O'
@@ -209,9 +451,8 @@ def find_xml_obs(dataset, variable):
         Set to None if the file cannot be found
     """
     file_name = OSpath__join(xmldir, "obs_ENSO_metrics_" + str(dataset) + ".xml")
-    xml = CDMS2open(file_name)
-    listvar1 = sorted(xml.listvariables())
-    if variable not in listvar1:
+    if len(catalog_lookup(variable, [file_name])) == 0:
+        listvar1 = sorted(list(catalog_variables(file_name).keys()))
         print(bcolors.FAIL + "%%%%%     -----     %%%%%")
         print(str().ljust(5) + "obs var " + str(variable) + " cannot be found")
         print(str().ljust(10) + "file_name = " + str(file_name))
@@ -277,7 +518,8 @@ def find_xml_fx(model, experiment='', project='', realm=''):
     return file_area, file_land
 
 
-def get_metric_values(project, metric_collection, dict_json, dict_mod_mem, reduced_set=True, portraitplot=False):
+def get_metric_values(project, metric_collection, dict_json, dict_mod_mem, reduced_set=True, portraitplot=False,
+                      results_file=None):
     """
     Finds fixed variables, here areacell and sftlf (landmask), mostly used for observational dataset
 
@@ -302,6 +544,11 @@ def get_metric_values(project, metric_collection, dict_json, dict_mod_mem, reduc
         more than one metric collection.
         If set to False it removes metrics that are in more than one metric collection.
         Default value is False.
+    :param results_file: string, optional
+        Path and name of a results store (SQLite database, see results_store). If given, the metric values are read
+        from the store and member values are averaged in the store (the json file is read only if the store does not
+        have it yet or if it has been modified), see results_values.
+        Default value is None.
 
     Output:
     ------
@@ -309,6 +556,15 @@ def get_metric_values(project, metric_collection, dict_json, dict_mod_mem, reduc
         Dictionary with every models available and metrics, member values averaged
     """
 
+    # read values averaged in the results store
+    if results_file is not None:
+        dict_out = results_values(results_file, project, metric_collection, dict_json[project][metric_collection],
+                                  dict_mod_mem[project])
+        for mod in list(dict_out.keys()):
+            list_metrics = remove_metrics(list(dict_out[mod].keys()), metric_collection, reduced_set=reduced_set,
+                                          portraitplot=portraitplot)
+            dict_out[mod] = dict((met, dict_out[mod][met]) for met in list_metrics)
+        return dict_out
     # open and read json file
     data_json = read_json(dict_json[project][metric_collection])
     list_models = list(dict_mod_mem[project].keys())
@@ -421,7 +677,7 @@ def get_metric_values_observations(filename_json, obsvation_names, list_met, met
     return dict_out
 
 
-def get_mod_mem_json(projects, metric_collections, dict_json, first_only=False):
+def get_mod_mem_json(projects, metric_collections, dict_json, first_only=False, results_file=None):
     """
     Creates a dictionary with every models available in the given json files, for the given projects and metric
     collections.
@@ -446,6 +702,10 @@ def get_mod_mem_json(projects, metric_collections, dict_json, first_only=False):
     **Optional arguments:**
     :param first_only: boolean, optional
         True to return only the first member
+    :param results_file: string, optional
+        Path and name of a results store (SQLite database, see results_store). If given, the models and members are
+        read from the store.
+        Default value is None.
 
     Output:
     ------
@@ -464,7 +724,10 @@ def get_mod_mem_json(projects, metric_collections, dict_json, first_only=False):
         dict_members = dict()
         for mc in metric_collections:
             # read json files
-            tmp = read_json(dict_json[proj][mc])
+            if results_file is None:
+                tmp = read_json(dict_json[proj][mc])
+            else:
+                tmp = results_query(results_file, proj, mc, dict_json[proj][mc], members_only=True)
             # list models
             list_models += list(tmp.keys())
             # members
@@ -477,16 +740,7 @@ def get_mod_mem_json(projects, metric_collections, dict_json, first_only=False):
                     dict_members[mod] += list(tmp[mod].keys())
             del tmp
         list_models = sorted(list(set(list_models)), key=lambda v: v.upper())
-        list_to_remove = ["EC-EARTH", "FIO-ESM", "GFDL-CM2p1", "HadGEM2-AO", "CIESM", "E3SM-1-1-ECA", "FGOALS-g3",
-                          "MCM-UA-1-0"]
-        # EC-EARTH: incorrect time coordinate
-        # FIO-ESM, HadCM3: grid issues
-        # GFDL-CM2p1: hfls not published
-        # HadGEM2-AO: rlus and rsus not published
-        # E3SM-1-1-ECA: Experimental stage
-        # CIESM, FGOALS-g3: ???
-        # MCM-UA-1-0: unit issue with pr
-        for mod in list_to_remove:
+        for mod in models_to_remove:
             while mod in list_models:
                 list_models.remove(mod)
         for mod in list_models:
@@ -505,10 +759,40 @@ def get_mod_mem_json(projects, metric_collections, dict_json, first_only=False):
                 else:
                     print("this model should not be here")
             del list_members
-        del dict_members, list_models, list_to_remove
+        del dict_members, list_models
     return model_by_proj
 
 
+def get_metric_array(dict_met, list_metrics, list_models):
+    """
+    Puts metric values in a 2D masked array (metrics x models), as used by the portrait and correlation plots
+
+    Inputs:
+    ------
+    :param dict_met: dictionary
+        Dictionary with models and metrics, output of get_metric_values: {model: {metric: value}}
+    :param list_metrics: list of strings
+        list of metrics (first dimension of the array)
+    :param list_models: list of strings
+        list of models (second dimension of the array)
+
+    Output:
+    ------
+    :return tab: masked_array
+        metric values, missing values are masked
+    """
+    tab = NUMPYma__zeros((len(list_metrics), len(list_models)))
+    for ii, met in enumerate(list_metrics):
+        for jj, mod in enumerate(list_models):
+            if mod not in list(dict_met.keys()) or met not in list(dict_met[mod].keys()) or dict_met[mod][met] is None:
+                tab[ii, jj] = 1e20
+            else:
+                tab[ii, jj] = dict_met[mod][met]
+    tab = NUMPYma__masked_invalid(tab)
+    tab = NUMPYma__masked_where(tab == 1e20, tab)
+    return tab
+
+
 def read_json(filename_json):
     """
     Reads given json file (must have usual jiwoo's structure)
@@ -530,23 +814,279 @@ def read_json(filename_json):
     return data
 
 
-def save_json(dict_in, json_name, metric_only=True):
+def results_connect(results_file):
     """
-    Saves given dictionary under given name in a json file
+    Opens (and creates if needed) the results store: a SQLite database with one row per project, metric collection,
+    model, member, metric, reference and type of value (metric or diagnostic)
+
+    Input:
+    -----
+    :param results_file: string
+        Path and name of the SQLite database
+
+    Output:
+    ------
+    :return cc: sqlite3.Connection
+    """
+    cc = sqlite3.connect(results_file)
+    cc.execute("CREATE TABLE IF NOT EXISTS results (project TEXT, collection TEXT, model TEXT, member TEXT, "
+               "metric TEXT, reference TEXT, kind TEXT, value REAL, value_error REAL)")
+    cc.execute("CREATE INDEX IF NOT EXISTS results_collection ON results (project, collection, kind)")
+    cc.execute("CREATE INDEX IF NOT EXISTS results_metric ON results (metric, reference)")
+    cc.execute("CREATE TABLE IF NOT EXISTS members (project TEXT, collection TEXT, model TEXT, member TEXT)")
+    cc.execute("CREATE INDEX IF NOT EXISTS members_collection ON members (project, collection)")
+    cc.execute("CREATE TABLE IF NOT EXISTS sources (project TEXT, collection TEXT, filename TEXT, mtime REAL, "
+               "PRIMARY KEY (project, collection))")
+    cc.commit()
+    return cc
+
+
+def results_store(results_file, project, metric_collection, filename_json):
+    """
+    Saves the values of a json file (output of the CLIVAR PRP ENSO metrics package) in the results store
+    The json file is read only if the store does not have it yet or if it has been modified (mtime)
+
+    Inputs:
+    ------
+    :param results_file: string
+        Path and name of the SQLite database
+    :param project: string
+        project name (e.g., "CMIP5", "CMIP6")
+    :param metric_collection: string
+        metric collection (e.g., "ENSO_perf", "ENSO_proc", "ENSO_tel")
+    :param filename_json: string
+        Path and name of a json file output of the CLIVAR PRP ENSO metrics package.
+
+    Output:
+    ------
+    :return:
+    """
+    cc = results_connect(results_file)
+    mtime = OSpath__getmtime(filename_json)
+    row = cc.execute("SELECT filename, mtime FROM sources WHERE project = ? AND collection = ?",
+                     (project, metric_collection)).fetchone()
+    if row is not None and row[0] == filename_json and row[1] == mtime:
+        cc.close()
+        return
+    data_json = read_json(filename_json)
+    list_rows, list_members = list(), list()
+    for mod in list(data_json.keys()):
+        for mem in list(data_json[mod].keys()):
+            list_members.append((project, metric_collection, mod, mem))
+            try:
+                data_mod = data_json[mod][mem]["value"]
+                list(data_mod.keys())
+            except:
+                continue
+            for met in list(data_mod.keys()):
+                for kind in ["metric", "diagnostic"]:
+                    try:
+                        list_ref = list(data_mod[met][kind].keys())
+                    except:
+                        continue
+                    for ref in list_ref:
+                        dict_val = data_mod[met][kind][ref]
+                        val, err = [dict_val[key] if key in list(dict_val.keys()) and
+                                    isinstance(dict_val[key], (int, float)) else None
+                                    for key in ["value", "value_error"]]
+                        list_rows.append((project, metric_collection, mod, mem, met, ref, kind, val, err))
+    cc.execute("DELETE FROM results WHERE project = ? AND collection = ?", (project, metric_collection))
+    cc.execute("DELETE FROM members WHERE project = ? AND collection = ?", (project, metric_collection))
+    cc.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", list_rows)
+    cc.executemany("INSERT INTO members VALUES (?, ?, ?, ?)", list_members)
+    cc.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)", (project, metric_collection, filename_json, mtime))
+    cc.commit()
+    cc.close()
+    return
+
+
+def results_query(results_file, project, metric_collection, filename_json, members_only=False):
+    """
+    Reads the metric values of the given project and metric collection from the results store (the json file is saved
+    in the store first if needed, see results_store)
+
+    Inputs:
+    ------
+    :param results_file: string
+        Path and name of the SQLite database
+    :param project: string
+        project name (e.g., "CMIP5", "CMIP6")
+    :param metric_collection: string
+        metric collection (e.g., "ENSO_perf", "ENSO_proc", "ENSO_tel")
+    :param filename_json: string
+        Path and name of the json file output of the CLIVAR PRP ENSO metrics package.
+    **Optional arguments:**
+    :param members_only: boolean, optional
+        True to return only the models and members (no metric values)
+
+    Output:
+    ------
+    :return data: dictionary
+        Same structure as read_json, with only the metric values (no diagnostic, no metadata):
+        {model: {member: {'value': {metric: {'metric': {reference: {'value': val, 'value_error': err}}}}}}}
+    """
+    results_store(results_file, project, metric_collection, filename_json)
+    cc = results_connect(results_file)
+    data = dict()
+    rows = cc.execute("SELECT model, member FROM members WHERE project = ? AND collection = ?",
+                      (project, metric_collection))
+    for mod, mem in rows.fetchall():
+        if mod not in list(data.keys()):
+            data[mod] = dict()
+        data[mod][mem] = {"value": dict()}
+    if members_only is False:
+        rows = cc.execute("SELECT model, member, metric, reference, value, value_error FROM results "
+                          "WHERE project = ? AND collection = ? AND kind = 'metric'", (project, metric_collection))
+        for mod, mem, met, ref, val, err in rows.fetchall():
+            dict_mem = data[mod][mem]["value"]
+            if met not in list(dict_mem.keys()):
+                dict_mem[met] = {"metric": dict()}
+            dict_mem[met]["metric"][ref] = {"value": val, "value_error": err}
+    cc.close()
+    return data
+
+
+def results_average(cc, metric_collection, list_metrics, list_members):
+    """
+    Averages the metric values of the given members of each model in the results store (None and 1e20 values are
+    skipped, as in get_metric_values)
+
+    Inputs:
+    ------
+    :param cc: sqlite3.Connection
+        results store (see results_connect)
+    :param metric_collection: string
+        metric collection (e.g., "ENSO_perf", "ENSO_proc", "ENSO_tel")
+    :param list_metrics: list of tuples
+        [(metric index, metric, reference), ...]
+    :param list_members: list of tuples
+        [(model index, project, model, member), ...]
+
+    Output:
+    ------
+    :return rows: list of tuples
+        [(metric index, model index, averaged value), ...], only for the metrics and models with at least one value
+    """
+    cc.execute("CREATE TEMP TABLE IF NOT EXISTS wanted_metrics (idx INTEGER, metric TEXT, reference TEXT)")
+    cc.execute("CREATE TEMP TABLE IF NOT EXISTS wanted_members (idx INTEGER, project TEXT, model TEXT, member TEXT)")
+    cc.execute("DELETE FROM wanted_metrics")
+    cc.execute("DELETE FROM wanted_members")
+    cc.executemany("INSERT INTO wanted_metrics VALUES (?, ?, ?)", list_metrics)
+    cc.executemany("INSERT INTO wanted_members VALUES (?, ?, ?, ?)", list_members)
+    rows = cc.execute(
+        "SELECT wanted_metrics.idx, wanted_members.idx, AVG(results.value) FROM results "
+        "JOIN wanted_metrics ON results.metric = wanted_metrics.metric AND "
+        "results.reference = wanted_metrics.reference "
+        "JOIN wanted_members ON results.project = wanted_members.project AND results.model = wanted_members.model "
+        "AND results.member = wanted_members.member "
+        "WHERE results.collection = ? AND results.kind = 'metric' AND results.value IS NOT NULL AND "
+        "results.value != 1e20 GROUP BY wanted_metrics.idx, wanted_members.idx", (metric_collection,)).fetchall()
+    return rows
+
+
+def results_values(results_file, project, metric_collection, filename_json, dict_mod_mem):
+    """
+    Reads the metric values of the given project and metric collection from the results store, member values averaged
+    in the store (the json file is saved in the store first if needed, see results_store)
+
+    Inputs:
+    ------
+    :param results_file: string
+        Path and name of the SQLite database
+    :param project: string
+        project name (e.g., "CMIP5", "CMIP6")
+    :param metric_collection: string
+        metric collection (e.g., "ENSO_perf", "ENSO_proc", "ENSO_tel")
+    :param filename_json: string
+        Path and name of the json file output of the CLIVAR PRP ENSO metrics package.
+    :param dict_mod_mem: dictionary
+        Dictionary with the models and members to use for the given project: {model: [member1, member2, ...]}
+
+    Output:
+    ------
+    :return dict_out: dictionary
+        {model: {metric: value}}, all given models are listed
+    """
+    results_store(results_file, project, metric_collection, filename_json)
+    cc = results_connect(results_file)
+    list_models = list(dict_mod_mem.keys())
+    rows = cc.execute("SELECT DISTINCT metric FROM results WHERE project = ? AND collection = ? AND kind = 'metric'",
+                      (project, metric_collection))
+    list_metrics = sorted([row[0] for row in rows.fetchall()])
+    rows = results_average(
+        cc, metric_collection,
+        [(ii, met, get_reference(metric_collection, met)) for ii, met in enumerate(list_metrics)],
+        [(jj, project, mod, mem) for jj, mod in enumerate(list_models) for mem in dict_mod_mem[mod]])
+    cc.close()
+    dict_out = dict((mod, dict()) for mod in list_models)
+    for ii, jj, val in rows:
+        dict_out[list_models[jj]][list_metrics[ii]] = float(val)
+    return dict_out
+
+
+def results_array(results_file, metric_collection, dict_json, dict_mod_mem, list_metrics, list_models):
+    """
+    Puts the metric values of the given metric collection in a 2D masked array (metrics x models), as get_metric_array,
+    member values averaged and array indices set in the results store (the json files are saved in the store first if
+    needed, see results_store)
+
+    Inputs:
+    ------
+    :param results_file: string
+        Path and name of the SQLite database
+    :param metric_collection: string
+        metric collection (e.g., "ENSO_perf", "ENSO_proc", "ENSO_tel")
+    :param dict_json: dictionary
+        Dictionary with path and name of json files output of the CLIVAR PRP ENSO metrics package.
+    :param dict_mod_mem: dictionary
+        Dictionary with every models available and members, for the given projects (output of get_mod_mem_json)
+        If a model is in several projects, the last one is used.
+    :param list_metrics: list of strings
+        list of metrics (first dimension of the array)
+    :param list_models: list of strings
+        list of models (second dimension of the array)
+
+    Output:
+    ------
+    :return tab: masked_array
+        metric values, missing values are masked
+    """
+    dict_project = dict()
+    for proj in list(dict_mod_mem.keys()):
+        results_store(results_file, proj, metric_collection, dict_json[proj][metric_collection])
+        for mod in list(dict_mod_mem[proj].keys()):
+            dict_project[mod] = proj
+    cc = results_connect(results_file)
+    rows = results_average(
+        cc, metric_collection,
+        [(ii, met, get_reference(metric_collection, met)) for ii, met in enumerate(list_metrics)],
+        [(jj, dict_project[mod], mod, mem) for jj, mod in enumerate(list_models) if mod in list(dict_project.keys())
+         for mem in dict_mod_mem[dict_project[mod]][mod]])
+    cc.close()
+    tab = NUMPYma__zeros((len(list_metrics), len(list_models))) + 1e20
+    for ii, jj, val in rows:
+        tab[ii, jj] = val
+    tab = NUMPYma__masked_invalid(tab)
+    tab = NUMPYma__masked_where(tab == 1e20, tab)
+    return tab
+
+
+def reshape_json(dict_in, metric_only=True):
+    """
+    Reshapes given dictionary (output of ComputeCollection for one or several members) as saved in json files:
+    {metric: {member: values}}
 
     Inputs:
     ------
     :param dict_in: dictionary
-        data to save in a json file
-    :param json_name: string
-        Path and file name where to save the given data (e.g., /path/to/file/jsonname.json)
+        {member: output of ComputeCollection}
     **Optional arguments:**
     :param metric_only: boolean, optional
-        True to save only the metric values
+        True to keep only the metric values
 
     Output:
     ------
-    :return:
+    :return dict_out: dictionary
     """
     # reshape dictionary
     liste = sorted(dict_in.keys())
@@ -594,9 +1134,128 @@ def save_json(dict_in, json_name, metric_only=True):
             del dict_meta, dict2
         dict_out[met] = dict1
         del dict1
+    return dict_out
+
+
+def save_json(dict_in, json_name, metric_only=True):
+    """
+    Saves given dictionary under given name in a json file
+
+    Inputs:
+    ------
+    :param dict_in: dictionary
+        data to save in a json file
+    :param json_name: string
+        Path and file name where to save the given data (e.g., /path/to/file/jsonname.json)
+    **Optional arguments:**
+    :param metric_only: boolean, optional
+        True to save only the metric values
+
+    Output:
+    ------
+    :return:
+    """
+    dict_out = reshape_json(dict_in, metric_only=metric_only)
     # save as json file
     if ".json" not in json_name:
         json_name += ".json"
     with open(json_name, "w") as outfile:
-        json.dump(dict_out, outfile, sort_keys=True)
+        json_dump_stream(dict_out, outfile, sort_keys=True)
+    return
+
+
+def journal_start(journal_name):
+    """
+    Empties the results journal (see journal_append) at the beginning of a run, so that the members of a previous run
+    are not added to the json file created by journal_compact
+
+    Inputs:
+    ------
+    :param journal_name: string
+        Path and file name of the journal (e.g., /path/to/file/journal.jsonl)
+
+    Output:
+    ------
+    :return:
+    """
+    with open(journal_name, "w"):
+        pass
+    return
+
+
+def journal_append(journal_name, dict_in, metric_only=True):
+    """
+    Appends given dictionary (output of ComputeCollection for one or several members) to a results journal: one line
+    per metric and member, the file is never rewritten
+    The json file is created from the journal by journal_compact
+
+    Inputs:
+    ------
+    :param journal_name: string
+        Path and file name of the journal (e.g., /path/to/file/journal.jsonl)
+    :param dict_in: dictionary
+        {member: output of ComputeCollection}
+    **Optional arguments:**
+    :param metric_only: boolean, optional
+        True to save only the metric values
+
+    Output:
+    ------
+    :return:
+    """
+    dict_out = reshape_json(dict_in, metric_only=metric_only)
+    lines = ""
+    for met in sorted(list(dict_out.keys())):
+        for ens in sorted(list(dict_out[met].keys())):
+            lines += json.dumps({"metric": met, "member": ens, "value": dict_out[met][ens]}, sort_keys=True) + "\n"
+    # one write per call: a member is either completely in the journal or not at all
+    with open(journal_name, "a") as outfile:
+        outfile.write(lines)
+    return
+
+
+def journal_compact(journal_name, json_name):
+    """
+    Creates the json file (same as save_json) from a results journal (see journal_append)
+    The journal is read twice: first to index the lines by metric and member (if a member has been saved several times,
+    the last line is used), then to write the json file one line at a time; only the index is kept in memory
+
+    Inputs:
+    ------
+    :param journal_name: string
+        Path and file name of the journal (e.g., /path/to/file/journal.jsonl)
+    :param json_name: string
+        Path and file name where to save the json file (e.g., /path/to/file/jsonname.json)
+
+    Output:
+    ------
+    :return:
+    """
+    # index: offset of the line of each metric and member
+    dict_index = dict()
+    with open(journal_name, "rb") as ff:
+        offset = ff.tell()
+        line = ff.readline()
+        while line:
+            if line.endswith(b"\n"):  # an incomplete last line (interrupted write) is ignored
+                keys = json.loads(line)
+                if keys["metric"] not in list(dict_index.keys()):
+                    dict_index[keys["metric"]] = dict()
+                dict_index[keys["metric"]][keys["member"]] = offset
+            offset = ff.tell()
+            line = ff.readline()
+    # write the json file (same formatting as json.dump(..., sort_keys=True))
+    if ".json" not in json_name:
+        json_name += ".json"
+    with open(journal_name, "rb") as ff, open(json_name, "w") as outfile:
+        outfile.write("{")
+        for ii, met in enumerate(sorted(list(dict_index.keys()))):
+            outfile.write((", " if ii > 0 else "") + json.dumps(met) + ": {")
+            for jj, ens in enumerate(sorted(list(dict_index[met].keys()))):
+                ff.seek(dict_index[met][ens])
+                value = json.loads(ff.readline())["value"]
+                outfile.write((", " if jj > 0 else "") + json.dumps(ens) + ": " + json.dumps(value, sort_keys=True))
+                del value
+            outfile.write("}")
+        outfile.write("}")
     return
@@ -0,0 +1,35 @@
+import unittest
+import numpy
+from scipy.stats import linregress
+
+from EnsoPlots.EnsoPlotToolsLib import compute_correlation
+
+
+class TestCorrelation(unittest.TestCase):
+
+    def testCorrelation(self):
+        rng = numpy.random.RandomState(1)
+        tab = numpy.ma.masked_array(rng.normal(size=(6, 20)), mask=rng.uniform(size=(6, 20)) < 0.2)
+        # constant series
+        tab[3] = 2.
+        tab.mask[3, :3] = True
+        rval, pval = compute_correlation(tab, nbr_rows=4)
+        for ii in range(len(tab)):
+            for jj in range(len(tab)):
+                if ii == 3 or jj == 3:
+                    # scipy.stats.linregress gives r = 0 and p = 1 for a constant series
+                    self.assertEqual(rval[ii, jj], 0.)
+                    self.assertEqual(pval[ii, jj], 1.)
+                    continue
+                both = ~(tab.mask[ii] | tab.mask[jj])
+                results = linregress(tab[ii].data[both], tab[jj].data[both])
+                self.assertAlmostEqual(rval[ii, jj], results[2])
+                self.assertAlmostEqual(pval[ii, jj], results[3])
+        self.assertFalse(numpy.ma.getmaskarray(rval).any())
+        self.assertFalse(numpy.ma.getmaskarray(pval).any())
+
+    def testCorrelationTooFewValues(self):
+        tab = numpy.ma.masked_array([[1., 2., 3.], [3., 1., 2.]], mask=[[False, False, True], [True, False, False]])
+        rval, pval = compute_correlation(tab)
+        self.assertTrue(rval.mask[0, 1])
+        self.assertTrue(pval.mask[1, 0])
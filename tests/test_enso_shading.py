@@ -0,0 +1,33 @@
+import unittest
+import numpy
+from scipy.stats import scoreatpercentile
+
+from EnsoPlots.EnsoPlotToolsLib import shading_levels_stream
+
+
+class TestShadingLevels(unittest.TestCase):
+
+    def testShadingLevels(self):
+        rng = numpy.random.RandomState(1)
+        tab = rng.normal(size=(50, 4, 7))
+        # one outlier member and one unflagged fill value
+        tab[7] += 100.
+        tab[12, 1, 2] = 1e20
+        list_tab = [numpy.ma.masked_array(tab[ii]) for ii in range(len(tab))]
+        list_tab[3][0, 0] = numpy.ma.masked
+        lev = [5, 25, 75, 95]
+        tab_out = shading_levels_stream(list_tab, lev=lev, nbr_points=5)
+        tab[3, 0, 0] = numpy.nan
+        for ll, levels in zip(lev, tab_out[:-1]):
+            for jj in range(tab.shape[1]):
+                for kk in range(tab.shape[2]):
+                    values = tab[:, jj, kk][numpy.isfinite(tab[:, jj, kk])]
+                    self.assertAlmostEqual(levels[jj, kk], scoreatpercentile(values, ll))
+        self.assertTrue(numpy.allclose(tab_out[-1], numpy.nanmean(tab, axis=0)))
+
+    def testShadingLevelsMean(self):
+        list_tab = [numpy.ma.masked_array([1., 2.], mask=[False, True]), numpy.array([3., numpy.nan])]
+        tab_out = shading_levels_stream(iter(list_tab), lev=[])
+        self.assertEqual(len(tab_out), 1)
+        self.assertEqual(tab_out[0][0], 2.)
+        self.assertTrue(tab_out[0].mask[1])
@@ -0,0 +1,38 @@
+import unittest
+import numpy
+
+from EnsoMetrics.EnsoUvcdatToolsLib import SlabOceanCumulative
+
+
+def slab_ocean_loop(sstA, thfA, mm1, mm2, fraction, tmin):
+    # month by month accumulation (previous version of SlabOcean)
+    myshape = [len(sstA), mm2 - mm1 + 1] + [ss for ss in sstA.shape[2:]]
+    dSST = numpy.ma.zeros(myshape)
+    dSSTthf = numpy.ma.zeros(myshape)
+    for ii in range(mm1, mm2):
+        dSST[:, ii - mm1 + 1] = dSST[:, ii - mm1] + sstA[:, ii + 1] - sstA[:, ii]
+        dSSTthf[:, ii - mm1 + 1] = dSSTthf[:, ii - mm1] + thfA[:, ii + 1]
+    dt = numpy.ma.zeros(dSSTthf.shape).swapaxes(0, 1)
+    dt[:] = dSST[:, -1]
+    dt = dt.swapaxes(0, 1)
+    dt = numpy.ma.masked_where(abs(dt) < tmin, dt)
+    return dSST / dt, fraction * dSSTthf / dt
+
+
+class TestSlabOcean(unittest.TestCase):
+
+    def testSlabOceanCumulative(self):
+        rng = numpy.random.RandomState(1)
+        shape = (6, 24, 40)
+        sstA = numpy.ma.masked_array(rng.normal(size=shape), mask=rng.uniform(size=shape) < 0.02)
+        thfA = numpy.ma.masked_array(10 * rng.normal(size=shape), mask=rng.uniform(size=shape) < 0.02)
+        # event with a SST change smaller than tmin
+        sstA[2, 11] = sstA[2, 5] + 0.05
+        for mm1, mm2 in [(5, 11), (0, 11), (3, 4)]:
+            dSST, dSSTthf = SlabOceanCumulative(sstA, thfA, mm1, mm2, 0.0042, tmin=0.1)
+            ref1, ref2 = slab_ocean_loop(sstA, thfA, mm1, mm2, 0.0042, 0.1)
+            for tab, ref in [(dSST, ref1), (dSSTthf, ref2)]:
+                self.assertEqual(tab.shape, ref.shape)
+                numpy.testing.assert_array_equal(numpy.ma.getmaskarray(tab), numpy.ma.getmaskarray(ref))
+                numpy.testing.assert_allclose(numpy.ma.filled(tab, 0.), numpy.ma.filled(ref, 0.), rtol=1e-10,
+                                              atol=1e-12)